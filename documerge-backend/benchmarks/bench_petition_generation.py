@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Benchmark de geração de petições com teses sintéticas
+
+Cria clientes, modelos de petição, perguntas, vinculações e teses .docx
+sintéticas (parágrafos, tabelas e imagens configuráveis) no armazenamento
+local e mede DocumentService.generate_petition para cada perfil de
+respostas: latência p50/p95, pico de memória e número de consultas SQL por
+geração. Cada perfil roda em um subprocesso separado para que os picos de
+memória não se misturem. O resultado é gravado em JSON e pode ser comparado
+com uma execução anterior (--compare).
+
+Uso:
+    python benchmarks/bench_petition_generation.py --questions 10 --theses-per-answer 3 \\
+        --paragraphs 80 --tables 2 --images 1 --iterations 30 --output resultado.json
+    python benchmarks/bench_petition_generation.py --output novo.json --compare resultado.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def answer_profiles(seed):
+    """Perfis de respostas: função (índice da pergunta) -> True, False ou None (não respondida)"""
+    rng = random.Random(seed)
+    random_answers = {}
+
+    def aleatorio(index):
+        if index not in random_answers:
+            random_answers[index] = rng.choice((True, False, None))
+        return random_answers[index]
+
+    return {
+        'todas-sim': lambda index: True,
+        'todas-nao': lambda index: False,
+        'alternadas': lambda index: index % 2 == 0,
+        'metade-respondida': lambda index: True if index % 2 == 0 else None,
+        'aleatorio': aleatorio,
+    }
+
+
+def build_form_answers(profile, question_ids, seed):
+    answer = answer_profiles(seed)[profile]
+    form_answers = {}
+    for index, question_id in enumerate(question_ids):
+        value = answer(index)
+        if value is not None:
+            form_answers[str(question_id)] = value
+    return form_answers
+
+
+def create_app(workdir):
+    from flask import Flask
+    from src.models.user import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB; macOS em bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def synthetic_png(width, height, seed):
+    """PNG RGB com ruído (não comprimível), sem depender do Pillow"""
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+def synthetic_thesis(index, paragraphs, tables, images, image_px):
+    """Tese .docx com parágrafos formatados, tabelas e imagens distribuídos ao longo do texto"""
+    from docx import Document
+    from docx.shared import Cm
+
+    doc = Document()
+    doc.add_heading(f"Tese sintética {index}", level=2)
+    table_at = {paragraphs * (i + 1) // (tables + 1) for i in range(tables)}
+    image_at = {paragraphs * (i + 1) // (images + 1) for i in range(images)}
+    for j in range(paragraphs):
+        paragraph = doc.add_paragraph(f"Tese {index} parágrafo {j}: " + "texto jurídico sintético " * 10)
+        paragraph.add_run(" fundamento em negrito").bold = True
+        if j in table_at:
+            table = doc.add_table(rows=4, cols=3)
+            for k, cell in enumerate(table._cells):
+                cell.text = f"Tese {index} célula {k}"
+        if j in image_at:
+            image = synthetic_png(image_px, image_px, seed=index * 1000 + j)
+            doc.add_picture(io.BytesIO(image), width=Cm(8))
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def prepare(workdir, args):
+    """Cria os dados sintéticos. Retorna, por cliente, os ids necessários para gerar petições."""
+    from src.models.user import db, User, Client, Thesis, PetitionModel, Question, ThesisQuestionLink
+    from src.services.document_service import DocumentService
+    from src.services.search_index import search_index
+
+    app = create_app(workdir)
+    with app.app_context():
+        db.create_all()
+        search_index.ensure_schema()
+        service = DocumentService()
+
+        user = User(firebase_uid='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        thesis_count = 0
+        thesis_bytes = 0
+        clients = []
+        for c in range(args.clients):
+            client = Client(name=f"Cliente benchmark {c}")
+            db.session.add(client)
+            db.session.flush()
+            model = PetitionModel(client_id=client.id, name=f"Modelo benchmark {c}")
+            db.session.add(model)
+            db.session.flush()
+
+            question_ids = []
+            for q in range(args.questions):
+                question = Question(petition_model_id=model.id, text=f"Pergunta {q}?", order=q + 1)
+                db.session.add(question)
+                db.session.flush()
+                question_ids.append(question.id)
+
+                for answer in ('sim', 'nao'):
+                    for _ in range(args.theses_per_answer):
+                        content = synthetic_thesis(
+                            thesis_count, args.paragraphs, args.tables, args.images, args.image_px
+                        )
+                        thesis_bytes += content.getbuffer().nbytes
+                        gcs_path, content_hash = service.upload_thesis_file(content)
+                        thesis = Thesis(
+                            client_id=client.id, title=f"Tese {thesis_count}",
+                            gcs_path=gcs_path, content_hash=content_hash
+                        )
+                        db.session.add(thesis)
+                        db.session.flush()
+                        search_index.index_thesis(thesis)
+                        db.session.add(ThesisQuestionLink(question_id=question.id, thesis_id=thesis.id, answer=answer))
+                        thesis_count += 1
+            db.session.commit()
+            clients.append({'client_id': client.id, 'petition_model_id': model.id, 'question_ids': question_ids})
+
+        return {
+            'user_id': user.id,
+            'clients': clients,
+            'theses': thesis_count,
+            'thesis_mb': round(thesis_bytes / 1024 / 1024, 2)
+        }
+
+
+class QueryCounter:
+    """Conta as consultas SQL executadas no engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values, fraction):
+    """Percentil com interpolação linear (values não vazio)"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_profile(workdir, profile, data, args):
+    """Executado no subprocesso: gera petições com um perfil de respostas e reporta as métricas"""
+    from src.models.user import db
+    from src.services.document_service import DocumentService, petition_paragraph_cache
+    from src.services.thesis_cache import thesis_content_cache
+    from src.services.thesis_selection import selection_index_cache
+
+    app = create_app(workdir)
+    with app.app_context():
+        service = DocumentService()
+        counter = QueryCounter(db.engine)
+        clients = data['clients']
+        streaming = {'auto': None, 'buffer': False, 'streaming': True}[args.output_mode]
+        sequence = [0]
+
+        def generate():
+            client = clients[sequence[0] % len(clients)]
+            form_answers = build_form_answers(profile, client['question_ids'], args.seed)
+            if args.cold:
+                selection_index_cache.clear()
+                thesis_content_cache.clear()
+                petition_paragraph_cache.clear()
+            # Título único: uma petição idêntica seria apenas copiada (reuse_generated_petition)
+            title = f"Benchmark {profile} {sequence[0]}"
+            sequence[0] += 1
+
+            queries = counter.count
+            started = time.perf_counter()
+            petition = service.generate_petition(
+                petition_model_id=client['petition_model_id'],
+                form_answers=form_answers,
+                user_id=data['user_id'],
+                client_id=client['client_id'],
+                title=title,
+                streaming=streaming
+            )
+            elapsed = time.perf_counter() - started
+            count = counter.count - queries
+            gcs_path = petition.gcs_path
+            db.session.expunge_all()
+            return elapsed, count, gcs_path
+
+        baseline = peak_rss_bytes()
+        first_seconds, first_queries, gcs_path = generate()
+        for _ in range(args.warmup):
+            generate()
+
+        timings = []
+        queries = []
+        for _ in range(args.iterations):
+            elapsed, count, gcs_path = generate()
+            timings.append(elapsed)
+            queries.append(count)
+        peak_rss = peak_rss_bytes()
+
+        # Execução extra com tracemalloc: o rastreamento distorce o tempo, por isso fica fora das medições
+        tracemalloc.start()
+        generate()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        selected_theses = len(selection_index_cache.get(clients[0]['petition_model_id']).select(
+            build_form_answers(profile, clients[0]['question_ids'], args.seed)
+        ))
+        return {
+            'profile': profile,
+            'selected_theses': selected_theses,
+            'iterations': args.iterations,
+            'latency_ms': {
+                'first': round(first_seconds * 1000, 2),
+                'p50': round(percentile(timings, 0.50) * 1000, 2),
+                'p95': round(percentile(timings, 0.95) * 1000, 2),
+                'mean': round(sum(timings) / len(timings) * 1000, 2),
+                'min': round(min(timings) * 1000, 2),
+                'max': round(max(timings) * 1000, 2),
+            },
+            'sql_queries': {
+                'first': first_queries,
+                'mean': round(sum(queries) / len(queries), 2),
+                'max': max(queries),
+            },
+            'memory_mb': {
+                'baseline_rss': round(baseline / 1024 / 1024, 1),
+                'peak_rss': round(peak_rss / 1024 / 1024, 1),
+                'peak_traced': round(traced_peak / 1024 / 1024, 2),
+            },
+            'output_kb': round(service.stat_object(gcs_path).size / 1024, 1),
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """Imprime a variação de cada métrica em relação a um JSON de execução anterior"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {result['profile']: result for result in json.load(f)['results']}
+
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else 'n/d'
+
+    print(f"\nComparação com {baseline_path}:")
+    print(f"{'perfil':<18} {'p50':>9} {'p95':>9} {'consultas':>10} {'RSS pico':>9} {'traced':>9}")
+    for result in results:
+        old = baseline.get(result['profile'])
+        if old is None:
+            print(f"{result['profile']:<18} {'(ausente na referência)':>48}")
+            continue
+        print(f"{result['profile']:<18} "
+              f"{delta(result['latency_ms']['p50'], old['latency_ms']['p50']):>9} "
+              f"{delta(result['latency_ms']['p95'], old['latency_ms']['p95']):>9} "
+              f"{delta(result['sql_queries']['mean'], old['sql_queries']['mean']):>10} "
+              f"{delta(result['memory_mb']['peak_rss'], old['memory_mb']['peak_rss']):>9} "
+              f"{delta(result['memory_mb']['peak_traced'], old['memory_mb']['peak_traced']):>9}")
+
+
+def main():
+    profiles = list(answer_profiles(0))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1)
+    parser.add_argument('--questions', type=int, default=10, help='Perguntas por modelo')
+    parser.add_argument('--theses-per-answer', type=int, default=3, help='Teses vinculadas a cada resposta (sim/não)')
+    parser.add_argument('--paragraphs', type=int, default=60, help='Parágrafos por tese')
+    parser.add_argument('--tables', type=int, default=1, help='Tabelas por tese')
+    parser.add_argument('--images', type=int, default=0, help='Imagens por tese')
+    parser.add_argument('--image-px', type=int, default=256, help='Lado das imagens, em pixels')
+    parser.add_argument('--profiles', default=','.join(profiles), help=f"Perfis de respostas ({', '.join(profiles)})")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--output-mode', choices=['auto', 'buffer', 'streaming'], default='auto')
+    parser.add_argument('--cold', action='store_true', help='Limpa os caches em memória antes de cada geração')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_petition_generation.json', help='Arquivo JSON de resultado')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--workdir', help='Diretório de trabalho (padrão: temporário)')
+    parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.iterations < 1:
+        parser.error('--iterations deve ser ao menos 1')
+    selected_profiles = [profile.strip() for profile in args.profiles.split(',') if profile.strip()]
+    unknown = [profile for profile in selected_profiles if profile not in profiles]
+    if unknown:
+        parser.error(f"Perfis desconhecidos: {', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_generation_')
+    os.environ['DOCUMENT_STORAGE'] = 'local'
+    os.environ['LOCAL_STORAGE_PATH'] = os.path.join(workdir, 'storage')
+
+    if args.run_profile:
+        print(json.dumps(run_profile(workdir, args.run_profile, json.loads(args.data), args)))
+        return
+
+    print(f"Preparando {args.clients} cliente(s) x {args.questions} perguntas x "
+          f"{args.theses_per_answer * 2} teses em {workdir}...")
+    started = time.perf_counter()
+    data = prepare(workdir, args)
+    print(f"{data['theses']} teses ({data['thesis_mb']} MB) criadas em {time.perf_counter() - started:.1f} s")
+
+    passthrough = [
+        '--iterations', str(args.iterations), '--warmup', str(args.warmup),
+        '--output-mode', args.output_mode, '--seed', str(args.seed)
+    ] + (['--cold'] if args.cold else [])
+    results = []
+    for profile in selected_profiles:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--workdir', workdir,
+             '--run-profile', profile, '--data', json.dumps(data)] + passthrough,
+            check=True, capture_output=True, text=True, env=os.environ.copy()
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'perfil':<18} {'teses':>6} {'1ª (ms)':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+          f"{'consultas':>10} {'RSS pico (MB)':>14} {'traced (MB)':>12} {'saída (KB)':>11}")
+    for result in results:
+        print(f"{result['profile']:<18} {result['selected_theses']:>6} {result['latency_ms']['first']:>9} "
+              f"{result['latency_ms']['p50']:>9} {result['latency_ms']['p95']:>9} "
+              f"{result['sql_queries']['mean']:>10} {result['memory_mb']['peak_rss']:>14} "
+              f"{result['memory_mb']['peak_traced']:>12} {result['output_kb']:>11}")
+
+    report = {
+        'benchmark': 'petition_generation',
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            key: getattr(args, key) for key in (
+                'clients', 'questions', 'theses_per_answer', 'paragraphs', 'tables', 'images',
+                'image_px', 'iterations', 'warmup', 'output_mode', 'cold', 'seed'
+            )
+        },
+        'dataset': {'theses': data['theses'], 'thesis_mb': data['thesis_mb']},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultado gravado em {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
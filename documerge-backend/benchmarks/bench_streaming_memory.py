@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória: geração de petição em buffer x streaming
+
+Cria teses sintéticas no armazenamento local e mede o pico de RSS de
+DocumentService.generate_petition em cada modo, cada um em um subprocesso
+separado para que os picos não se misturem.
+
+Uso:
+    python benchmarks/bench_streaming_memory.py --theses 200 --paragraphs 150
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def create_app(workdir):
+    from flask import Flask
+    from src.models.user import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB; macOS em bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def prepare(workdir, theses, paragraphs):
+    """Cria cliente, modelo, pergunta e teses sintéticas (com fragmentos) no storage local"""
+    import io
+    from docx import Document
+    from src.models.user import db, User, Client, Thesis, PetitionModel, Question, ThesisQuestionLink
+    from src.services.document_service import DocumentService
+
+    app = create_app(workdir)
+    with app.app_context():
+        db.create_all()
+        service = DocumentService()
+
+        user = User(firebase_uid='bench', email='bench@example.com')
+        client = Client(name='Benchmark')
+        db.session.add_all([user, client])
+        db.session.commit()
+
+        model = PetitionModel(client_id=client.id, name='Modelo benchmark')
+        db.session.add(model)
+        db.session.commit()
+
+        question = Question(petition_model_id=model.id, text='Incluir todas as teses?', order=1)
+        db.session.add(question)
+        db.session.commit()
+
+        for i in range(theses):
+            doc = Document()
+            for j in range(paragraphs):
+                doc.add_paragraph(f"Tese {i} parágrafo {j}: " + "texto jurídico sintético " * 12)
+            buffer = io.BytesIO()
+            doc.save(buffer)
+            buffer.seek(0)
+
+            gcs_path, content_hash = service.upload_thesis_file(buffer)
+            thesis = Thesis(client_id=client.id, title=f"Tese {i}", gcs_path=gcs_path, content_hash=content_hash)
+            db.session.add(thesis)
+            db.session.flush()
+            db.session.add(ThesisQuestionLink(question_id=question.id, thesis_id=thesis.id, answer='sim'))
+        db.session.commit()
+
+        return {
+            'user_id': user.id,
+            'client_id': client.id,
+            'petition_model_id': model.id,
+            'question_id': question.id
+        }
+
+
+def run_mode(workdir, mode, ids):
+    """Executado no subprocesso: gera uma petição e reporta pico de RSS e tempo"""
+    from src.services.document_service import DocumentService
+
+    app = create_app(workdir)
+    with app.app_context():
+        service = DocumentService()
+        baseline = peak_rss_bytes()
+        started = time.perf_counter()
+        petition = service.generate_petition(
+            petition_model_id=ids['petition_model_id'],
+            form_answers={str(ids['question_id']): True},
+            user_id=ids['user_id'],
+            client_id=ids['client_id'],
+            title=f"Benchmark {mode}",
+            streaming=(mode == 'streaming')
+        )
+        elapsed = time.perf_counter() - started
+
+        return {
+            'mode': mode,
+            'seconds': round(elapsed, 3),
+            'baseline_rss_mb': round(baseline / 1024 / 1024, 1),
+            'peak_rss_mb': round(peak_rss_bytes() / 1024 / 1024, 1),
+            'output_mb': round(service.stat_object(petition.gcs_path).size / 1024 / 1024, 2)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--theses', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, default=150)
+    parser.add_argument('--workdir', help='Diretório de trabalho (padrão: temporário)')
+    parser.add_argument('--run-mode', choices=['buffer', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--ids', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_streaming_')
+    os.environ['DOCUMENT_STORAGE'] = 'local'
+    os.environ['LOCAL_STORAGE_PATH'] = os.path.join(workdir, 'storage')
+
+    if args.run_mode:
+        print(json.dumps(run_mode(workdir, args.run_mode, json.loads(args.ids))))
+        return
+
+    print(f"Preparando {args.theses} teses x {args.paragraphs} parágrafos em {workdir}...")
+    ids = prepare(workdir, args.theses, args.paragraphs)
+
+    results = []
+    for mode in ('buffer', 'streaming'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--workdir', workdir,
+             '--run-mode', mode, '--ids', json.dumps(ids)],
+            check=True, capture_output=True, text=True, env=os.environ.copy()
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'modo':<10} {'tempo (s)':>10} {'RSS base (MB)':>14} {'RSS pico (MB)':>14} {'saída (MB)':>11}")
+    for result in results:
+        print(f"{result['mode']:<10} {result['seconds']:>10} {result['baseline_rss_mb']:>14} "
+              f"{result['peak_rss_mb']:>14} {result['output_mb']:>11}")
+
+
+if __name__ == '__main__':
+    main()
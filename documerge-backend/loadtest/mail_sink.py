@@ -0,0 +1,91 @@
+"""
+Receptor de emails falso para os testes de carga
+
+Servidor HTTP local compatível com o endpoint /v3/mail/send do SendGrid: a
+aplicação aponta SENDGRID_API_HOST para ele e os emails de 2FA ficam em
+memória, de onde os cenários leem o código enviado a cada usuário.
+"""
+
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CODE_PATTERN = re.compile(r'<strong>(\d{6})</strong>')
+
+
+class FakeMailSink:
+    """Guarda os emails recebidos por destinatário e entrega os códigos 2FA"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._codes = {}  # email -> códigos ainda não consumidos
+        self._condition = threading.Condition()
+        self.received = 0
+        self.rejected = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mail-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_for_code(self, email, timeout=10):
+        """Consome o código 2FA mais recente enviado para email (None se não chegar a tempo)"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._codes.get(email), timeout=timeout):
+                return None
+            codes = self._codes.pop(email)
+            return codes[-1]
+
+    def deliver(self, message):
+        """Registra uma mensagem no formato da API v3 do SendGrid"""
+        recipients = [
+            recipient['email']
+            for personalization in message.get('personalizations', [])
+            for recipient in personalization.get('to', [])
+        ]
+        body = ' '.join(content.get('value', '') for content in message.get('content', []))
+        match = CODE_PATTERN.search(body)
+        with self._condition:
+            self.received += 1
+            if match:
+                for email in recipients:
+                    self._codes.setdefault(email, []).append(match.group(1))
+                self._condition.notify_all()
+
+    def _handler_class(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                try:
+                    if not self.path.endswith('/mail/send'):
+                        raise ValueError(self.path)
+                    sink.deliver(json.loads(body))
+                    status = 202
+                except ValueError:
+                    with sink._condition:
+                        sink.rejected += 1
+                    status = 400
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
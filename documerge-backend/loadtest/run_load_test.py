@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Teste de carga local da aplicação completa (create_app, decorators e blueprints)
+
+Prepara um banco e um storage descartáveis com usuários, cliente, modelo e
+teses sintéticas, sobe a aplicação sob gunicorn sem depender do Firebase
+(tokens HS256 locais, ou --auth firebase-keys: ID tokens RS256 verificados
+pelo FirebaseKeyManager com chaves de teste em arquivo) e com o SendGrid
+apontado para um receptor de emails falso, e executa um cenário com N
+usuários virtuais simultâneos. Reporta vazão e latências (p50/p95/p99) por
+endpoint e grava o resultado em JSON.
+
+Cenários (loadtest/scenarios.py):
+    completo   login -> verify-2fa -> listagem -> geração -> download a cada iteração
+    sessao     login e 2FA uma vez; depois listagem -> geração -> download
+    listagem   login e 2FA uma vez; depois apenas listagens
+
+Uso:
+    python loadtest/run_load_test.py --scenario completo --concurrency 20 --iterations 10 \\
+        --workers 4 --threads 4 --output carga.json
+"""
+
+import argparse
+import io
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import http.client
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from loadtest.mail_sink import FakeMailSink
+from loadtest.scenarios import SCENARIOS, Metrics, ScenarioError, VirtualUser
+from loadtest.signing_keys import FirebaseTestKeys
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def configure_environment(workdir, mail_sink, auth_mode):
+    """Variáveis lidas pela aplicação (no gunicorn) e pela preparação dos dados (neste processo).
+    Retorna (variáveis, emissor de tokens dos usuários virtuais).
+    """
+    env = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'DOCUMENT_STORAGE': 'local',
+        'LOCAL_STORAGE_PATH': os.path.join(workdir, 'storage'),
+        'SENDGRID_API_KEY': 'loadtest',
+        'SENDGRID_API_HOST': mail_sink.url,
+        'PETITION_JOB_WORKERS': '0',
+        'TWO_FACTOR_SESSION_SECRET': secrets.token_urlsafe(48),
+    }
+    if auth_mode == 'firebase-keys':
+        # Verificação RS256 real (FirebaseKeyManager) com chaves de teste lidas de arquivo
+        keys = FirebaseTestKeys(os.getenv('FIREBASE_PROJECT_ID', 'projeto-advocacia-tales'))
+        env.update({
+            'AUTH_TOKEN_VERIFIER': 'firebase',
+            'FIREBASE_PROJECT_ID': keys.project_id,
+            'FIREBASE_KEYS_FILE': keys.write_keys_file(os.path.join(workdir, 'firebase_keys.json')),
+        })
+        issuer = keys
+    else:
+        env.update({'AUTH_TOKEN_VERIFIER': 'local', 'LOCAL_AUTH_SECRET': secrets.token_urlsafe(48)})
+        issuer = None
+    os.environ.update(env)
+
+    if issuer is None:
+        # Importado depois do ambiente configurado: o módulo lê as variáveis ao ser carregado
+        from src.services.token_verifier import LocalTokenVerifier
+        issuer = LocalTokenVerifier(env['LOCAL_AUTH_SECRET'])
+    return env, issuer
+
+
+def synthetic_thesis(index, paragraphs):
+    from docx import Document
+
+    doc = Document()
+    for j in range(paragraphs):
+        doc.add_paragraph(f"Tese {index} parágrafo {j}: " + "texto jurídico sintético " * 10)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def prepare(args):
+    """Cria usuários (2FA habilitado), cliente, modelo, perguntas e teses. Retorna a carga de cada usuário."""
+    from flask import Flask
+    from src.models.user import db, User, Client, Thesis, PetitionModel, Question, ThesisQuestionLink
+    from src.services.document_service import DocumentService
+    from src.services.search_index import search_index
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        search_index.ensure_schema()
+        service = DocumentService()
+
+        client = Client(name='Cliente carga')
+        db.session.add(client)
+        db.session.flush()
+        model = PetitionModel(client_id=client.id, name='Modelo carga')
+        db.session.add(model)
+        db.session.flush()
+
+        form_answers = {}
+        for q in range(args.questions):
+            question = Question(petition_model_id=model.id, text=f"Pergunta {q}?", order=q + 1)
+            db.session.add(question)
+            db.session.flush()
+            form_answers[str(question.id)] = True
+            for t in range(args.theses_per_question):
+                index = q * args.theses_per_question + t
+                gcs_path, content_hash = service.upload_thesis_file(synthetic_thesis(index, args.paragraphs))
+                thesis = Thesis(client_id=client.id, title=f"Tese {index}", gcs_path=gcs_path, content_hash=content_hash)
+                db.session.add(thesis)
+                db.session.flush()
+                search_index.index_thesis(thesis)
+                db.session.add(ThesisQuestionLink(question_id=question.id, thesis_id=thesis.id, answer='sim'))
+
+        # Usuários criados antes da carga: o primeiro acesso não disputa a criação automática
+        users = []
+        for i in range(args.concurrency):
+            email = f"carga{i}@example.com"
+            db.session.add(User(
+                firebase_uid=f"loadtest-{i}", email=email, display_name=f"Carga {i}", two_factor_enabled=True
+            ))
+            users.append({'uid': f"loadtest-{i}", 'email': email})
+        db.session.commit()
+
+        workload = {'client_id': client.id, 'petition_model_id': model.id, 'form_answers': form_answers}
+        return users, workload
+
+
+def start_server(args, env, workdir):
+    """Sobe a aplicação sob gunicorn e aguarda até ela responder"""
+    port = args.port or free_port()
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f"127.0.0.1:{port}",
+        '--workers', str(args.workers),
+        '--threads', str(args.threads),
+        '--timeout', str(args.request_timeout),
+        '--chdir', BACKEND_DIR,
+        'src.main:create_app()',
+    ]
+    log = open(log_path, 'ab')
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env={**os.environ, **env})
+    log.close()
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"gunicorn encerrou ao iniciar (código {process.returncode}); veja {log_path}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            # Sem token: 401 confirma que create_app e os blueprints estão de pé
+            connection.request('GET', '/api/auth/profile')
+            if connection.getresponse().status == 401:
+                connection.close()
+                return process, f"http://127.0.0.1:{port}", log_path
+            connection.close()
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise Exception(f"gunicorn não respondeu em {args.startup_timeout} s; veja {log_path}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_users(args, base_url, users, workload, mail_sink, issuer):
+    """Executa o cenário com um thread por usuário virtual. Retorna (métricas, duração, iterações, falhas)."""
+    scenario = SCENARIOS[args.scenario]
+    metrics = Metrics()
+    counters = {'iterations': 0, 'failed': 0}
+    failures = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+
+    def worker(index, user):
+        virtual_user = VirtualUser(
+            base_url, issuer.issue(user['uid'], email=user['email']), user['email'],
+            metrics, mail_sink, workload, timeout=args.request_timeout
+        )
+        # Distribui a entrada dos usuários ao longo do ramp-up
+        if args.ramp_up:
+            time.sleep(args.ramp_up * index / len(users))
+        iteration = 0
+        try:
+            while (deadline is None and iteration < args.iterations) or (deadline and time.perf_counter() < deadline):
+                iteration += 1
+                try:
+                    scenario(virtual_user)
+                    failed = False
+                except ScenarioError as e:
+                    failed = True
+                    with lock:
+                        if len(failures) < 20:
+                            failures.append(str(e))
+                with lock:
+                    counters['iterations'] += 1
+                    counters['failed'] += failed
+        finally:
+            virtual_user.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(i, user), name=f"usuario-{i}", daemon=True)
+        for i, user in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return metrics, time.perf_counter() - started, counters, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=list(SCENARIOS), default='completo')
+    parser.add_argument('--auth', choices=['local', 'firebase-keys'], default='local',
+                        help='Tokens HS256 locais ou ID tokens RS256 verificados com chaves de teste em arquivo')
+    parser.add_argument('--concurrency', type=int, default=10, help='Usuários virtuais simultâneos')
+    parser.add_argument('--iterations', type=int, default=5, help='Iterações do cenário por usuário')
+    parser.add_argument('--duration', type=float, help='Duração (s); substitui --iterations')
+    parser.add_argument('--ramp-up', type=float, default=0, help='Segundos para todos os usuários começarem')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='Threads por worker do gunicorn')
+    parser.add_argument('--request-timeout', type=int, default=120)
+    parser.add_argument('--startup-timeout', type=int, default=60)
+    parser.add_argument('--questions', type=int, default=4)
+    parser.add_argument('--theses-per-question', type=int, default=2)
+    parser.add_argument('--paragraphs', type=int, default=40, help='Parágrafos por tese')
+    parser.add_argument('--port', type=int, help='Porta do gunicorn (padrão: livre)')
+    parser.add_argument('--output', default='loadtest_result.json', help='Arquivo JSON de resultado')
+    parser.add_argument('--workdir', help='Diretório de trabalho (padrão: temporário)')
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or args.iterations < 1:
+        parser.error('--concurrency e --iterations devem ser ao menos 1')
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='loadtest_')
+    mail_sink = FakeMailSink().start()
+    env, issuer = configure_environment(workdir, mail_sink, args.auth)
+
+    print(f"Preparando dados em {workdir}...")
+    users, workload = prepare(args)
+
+    process, base_url, log_path = start_server(args, env, workdir)
+    print(f"gunicorn em {base_url} ({args.workers} workers x {args.threads} threads); log em {log_path}")
+    try:
+        print(f"Cenário '{args.scenario}' com {args.concurrency} usuários...")
+        metrics, duration, counters, failures = run_users(args, base_url, users, workload, mail_sink, issuer)
+    finally:
+        stop_server(process)
+        mail_sink.stop()
+
+    endpoints = metrics.summary(duration)
+    total_requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+
+    print(f"\n{'endpoint':<14} {'req':>7} {'erros':>6} {'req/s':>8} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9}")
+    for name, endpoint in endpoints.items():
+        latency = endpoint['latency_ms']
+        print(f"{name:<14} {endpoint['requests']:>7} {endpoint['errors']:>6} {endpoint['throughput_rps']:>8} "
+              f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {latency['max']:>9}")
+    print(f"\n{total_requests} requisições em {duration:.1f} s ({total_requests / duration:.1f} req/s); "
+          f"{counters['iterations']} iterações, {counters['failed']} com falha; "
+          f"{mail_sink.received} emails recebidos")
+    for failure in failures[:5]:
+        print(f"  falha: {failure}")
+
+    report = {
+        'benchmark': 'loadtest',
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            key: getattr(args, key) for key in (
+                'scenario', 'auth', 'concurrency', 'iterations', 'duration', 'ramp_up', 'workers', 'threads',
+                'questions', 'theses_per_question', 'paragraphs'
+            )
+        },
+        'duration_seconds': round(duration, 3),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / duration, 2),
+        'iterations': counters['iterations'],
+        'failed_iterations': counters['failed'],
+        'emails_received': mail_sink.received,
+        'endpoints': endpoints,
+        'failures': failures,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultado gravado em {args.output}")
+
+
+if __name__ == '__main__':
+    main()
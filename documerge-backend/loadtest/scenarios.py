@@ -0,0 +1,194 @@
+"""
+Cenários dos testes de carga
+
+Cada usuário virtual tem uma conexão HTTP persistente (VirtualUser) e executa
+um cenário repetidamente; toda requisição é registrada em Metrics pelo nome
+do endpoint, com status e latência.
+"""
+
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class ScenarioError(Exception):
+    """Passo do cenário falhou; a iteração é interrompida e a próxima começa do início"""
+
+
+class Metrics:
+    """Latências e erros por endpoint, compartilhados entre os usuários virtuais"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}  # endpoint -> [segundos]
+        self.errors = {}     # endpoint -> {status: quantidade}
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not 200 <= status < 300:
+                by_status = self.errors.setdefault(endpoint, {})
+                by_status[status] = by_status.get(status, 0) + 1
+
+    def summary(self, duration):
+        """Vazão (req/s) e latências (ms) por endpoint, na ordem da primeira requisição"""
+        with self._lock:
+            latencies = {endpoint: list(values) for endpoint, values in self.latencies.items()}
+            errors = {endpoint: dict(by_status) for endpoint, by_status in self.errors.items()}
+
+        endpoints = {}
+        for endpoint, values in latencies.items():
+            failed = sum(errors.get(endpoint, {}).values())
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': failed,
+                'error_statuses': {str(status): count for status, count in errors.get(endpoint, {}).items()},
+                'throughput_rps': round(len(values) / duration, 2) if duration else None,
+                'latency_ms': {
+                    'p50': round(percentile(values, 0.50) * 1000, 2),
+                    'p95': round(percentile(values, 0.95) * 1000, 2),
+                    'p99': round(percentile(values, 0.99) * 1000, 2),
+                    'max': round(max(values) * 1000, 2),
+                    'mean': round(sum(values) / len(values) * 1000, 2),
+                },
+            }
+        return endpoints
+
+
+def percentile(values, fraction):
+    """Percentil com interpolação linear (values não vazio)"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class VirtualUser:
+    """Usuário simulado: token local, conexão keep-alive e dados do cenário"""
+
+    def __init__(self, base_url, token, email, metrics, mail_sink, workload, timeout=120):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.token = token
+        self.email = email
+        self.metrics = metrics
+        self.mail_sink = mail_sink
+        self.workload = workload  # client_id, petition_model_id, form_answers
+        self.iteration = 0
+        self.verified = False  # login e 2FA concluídos
+        self.two_factor_token = None  # sessão 2FA emitida pelo verify-2fa
+        self._connection = None
+
+    def request(self, endpoint, method, path, body=None, expect=(200,)):
+        """Executa e registra uma requisição. Retorna o corpo (JSON decodificado ou bytes)."""
+        headers = {'Authorization': f"Bearer {self.token}"}
+        if self.two_factor_token:
+            headers['X-2FA-Session'] = self.two_factor_token
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        try:
+            connection = self._connect()
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as e:
+            # Conexão perdida (ex.: worker reiniciado): registra como status 0 e reconecta na próxima
+            self.close()
+            self.metrics.record(endpoint, 0, time.perf_counter() - started)
+            raise ScenarioError(f"{endpoint}: {e}")
+        self.metrics.record(endpoint, status, time.perf_counter() - started)
+
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        if status not in expect:
+            raise ScenarioError(f"{endpoint}: HTTP {status} {data[:200]!r}")
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            return json.loads(data)
+        return data
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+
+# ===== Passos =====
+
+def login_with_2fa(user):
+    """Login (dispara o email de 2FA) e verificação do código recebido pelo receptor falso"""
+    response = user.request('login', 'POST', '/api/auth/login', {})
+    if response.get('requires_2fa'):
+        code = user.mail_sink.wait_for_code(user.email)
+        if code is None:
+            raise ScenarioError(f"Código 2FA não recebido para {user.email}")
+        verified = user.request('verify-2fa', 'POST', '/api/auth/verify-2fa', {'code': code})
+        user.two_factor_token = verified['two_factor_token']
+    user.verified = True
+
+
+def list_petitions(user):
+    return user.request('my-petitions', 'GET', '/api/petitions/my-petitions')['petitions']
+
+
+def generate_petition(user):
+    user.iteration += 1
+    response = user.request('generate', 'POST', '/api/petitions/generate', {
+        'petition_model_id': user.workload['petition_model_id'],
+        'client_id': user.workload['client_id'],
+        'form_answers': user.workload['form_answers'],
+        # Título único: petições idênticas seriam apenas copiadas
+        'title': f"Carga {user.email} {user.iteration}",
+    }, expect=(201,))
+    return response['petition']['id']
+
+
+def download_petition(user, petition_id):
+    data = user.request('download', 'GET', f"/api/petitions/{petition_id}/download")
+    if not data.startswith(b'PK'):
+        raise ScenarioError("download: resposta não é um .docx")
+
+
+# ===== Cenários =====
+
+def full_flow(user):
+    """login -> verify-2fa -> listagem -> geração -> download, a cada iteração"""
+    login_with_2fa(user)
+    list_petitions(user)
+    download_petition(user, generate_petition(user))
+
+
+def session_flow(user):
+    """login e 2FA só até concluírem uma vez; depois listagem -> geração -> download"""
+    if not user.verified:
+        login_with_2fa(user)
+    list_petitions(user)
+    download_petition(user, generate_petition(user))
+
+
+def browse_flow(user):
+    """login e 2FA só até concluírem uma vez; depois apenas listagens (leitura)"""
+    if not user.verified:
+        login_with_2fa(user)
+    list_petitions(user)
+
+
+SCENARIOS = {
+    'completo': full_flow,
+    'sessao': session_flow,
+    'listagem': browse_flow,
+}
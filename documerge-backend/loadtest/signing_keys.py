@@ -0,0 +1,71 @@
+"""
+Chaves de assinatura de teste no formato do Firebase Authentication
+
+Gera um par RSA com certificado autoassinado, grava o arquivo de chaves lido
+por FIREBASE_KEYS_FILE (kid -> certificado PEM, como o endpoint do Google) e
+emite ID tokens RS256 com as claims do Firebase. Assim o teste de carga
+exercita a verificação real (FirebaseKeyManager) sem rede.
+"""
+
+import base64
+import datetime
+import json
+import secrets
+import time
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+
+class FirebaseTestKeys:
+    """Par de chaves de teste e emissor de ID tokens do projeto project_id"""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.kid = secrets.token_hex(20)
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'securetoken.loadtest')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(self._private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(self._private_key, hashes.SHA256())
+        )
+        self.certificate_pem = certificate.public_bytes(serialization.Encoding.PEM).decode('ascii')
+
+    def write_keys_file(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({self.kid: self.certificate_pem}, f)
+        return path
+
+    def issue(self, uid, email=None, name=None, ttl=3600, **overrides):
+        """ID token assinado; overrides substitui claims (ex.: aud, iat) para testar rejeições"""
+        now = int(time.time())
+        claims = {
+            'iss': f"https://securetoken.google.com/{self.project_id}",
+            'aud': self.project_id,
+            'auth_time': now,
+            'user_id': uid,
+            'sub': uid,
+            'iat': now,
+            'exp': now + ttl,
+        }
+        if email:
+            claims['email'] = email
+        if name:
+            claims['name'] = name
+        claims.update(overrides)
+        signing_input = _b64encode_json({'alg': 'RS256', 'kid': self.kid, 'typ': 'JWT'}) + '.' + _b64encode_json(claims)
+        signature = self._private_key.sign(signing_input.encode('ascii'), padding.PKCS1v15(), hashes.SHA256())
+        return signing_input + '.' + base64.urlsafe_b64encode(signature).rstrip(b'=').decode('ascii')
+
+
+def _b64encode_json(value):
+    return base64.urlsafe_b64encode(json.dumps(value, separators=(',', ':')).encode('utf-8')).rstrip(b'=').decode('ascii')
@@ -9,7 +9,7 @@ import sys
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
 
-from models.user import db, User, Client, Thesis, PetitionModel, Question, ThesisQuestionLink, GeneratedPetition, TwoFactorCode, TwoFactorSession
+from models.user import db, User, Client, Thesis, PetitionModel, Question, ThesisQuestionLink, GeneratedPetition, PetitionRevision, PetitionJob, TwoFactorCode, TwoFactorRevocation
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
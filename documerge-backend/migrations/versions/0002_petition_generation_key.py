@@ -0,0 +1,20 @@
+"""Add generation_key to generated_petitions for content-addressed dedup"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_petition_generation_key'
+down_revision = '0001_init_2fa_password'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('generated_petitions') as batch_op:
+        batch_op.add_column(sa.Column('generation_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_generated_petitions_generation_key', ['generation_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('generated_petitions') as batch_op:
+        batch_op.drop_index('ix_generated_petitions_generation_key')
+        batch_op.drop_column('generation_key')
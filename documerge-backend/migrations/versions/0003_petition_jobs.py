@@ -0,0 +1,37 @@
+"""Create petition_jobs table for asynchronous petition generation"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_petition_jobs'
+down_revision = '0002_petition_generation_key'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'petition_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('client_id', sa.Integer(), sa.ForeignKey('clients.id'), nullable=False),
+        sa.Column('petition_model_id', sa.Integer(), sa.ForeignKey('petition_models.id'), nullable=False),
+        sa.Column('title', sa.String(length=300), nullable=False),
+        sa.Column('process_number', sa.String(length=100), nullable=True),
+        sa.Column('form_data', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('petition_id', sa.Integer(), sa.ForeignKey('generated_petitions.id'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_petition_jobs_status', 'petition_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_petition_jobs_status', table_name='petition_jobs')
+    op.drop_table('petition_jobs')
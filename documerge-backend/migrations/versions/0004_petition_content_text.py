@@ -0,0 +1,20 @@
+"""Add cached extracted text to generated_petitions"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_petition_content_text'
+down_revision = '0003_petition_jobs'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('generated_petitions') as batch_op:
+        batch_op.add_column(sa.Column('content_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('content_text_path', sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('generated_petitions') as batch_op:
+        batch_op.drop_column('content_text_path')
+        batch_op.drop_column('content_text')
@@ -0,0 +1,33 @@
+"""Create petition_revisions table for delta-based petition history"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_petition_revisions'
+down_revision = '0004_petition_content_text'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'petition_revisions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('petition_id', sa.Integer(), sa.ForeignKey('generated_petitions.id'), nullable=False),
+        sa.Column('number', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('gcs_path', sa.String(length=500), nullable=True),
+        sa.Column('content_text', sa.Text(), nullable=True),
+        sa.Column('edits', sa.Text(), nullable=True),
+        sa.Column('text_edits', sa.Text(), nullable=True),
+        sa.Column('title', sa.String(length=300), nullable=False),
+        sa.Column('paragraph_count', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('petition_id', 'number', name='uq_petition_revisions_number'),
+    )
+    op.create_index('ix_petition_revisions_petition_id', 'petition_revisions', ['petition_id'])
+
+
+def downgrade():
+    op.drop_index('ix_petition_revisions_petition_id', table_name='petition_revisions')
+    op.drop_table('petition_revisions')
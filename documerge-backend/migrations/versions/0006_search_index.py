@@ -0,0 +1,30 @@
+"""Create FTS5 search index tables for theses and generated petitions"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0006_search_index'
+down_revision = '0005_petition_revisions'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # FTS5 é específico do SQLite; em outros bancos a busca fica indisponível
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS theses_fts USING fts5("
+        "title, description, body, client_id UNINDEXED, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS petitions_fts USING fts5("
+        "title, process_number, body, client_id UNINDEXED, user_id UNINDEXED, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    # Tabelas criadas vazias: popular com python -m src.rebuild_search_index
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS petitions_fts")
+    op.execute("DROP TABLE IF EXISTS theses_fts")
@@ -0,0 +1,21 @@
+"""Add content hash to theses for content-addressed storage"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_thesis_content_hash'
+down_revision = '0006_search_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Teses existentes ficam sem hash e mantêm o caminho antigo até serem reenviadas
+    with op.batch_alter_table('theses') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_theses_content_hash', ['content_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('theses') as batch_op:
+        batch_op.drop_index('ix_theses_content_hash')
+        batch_op.drop_column('content_hash')
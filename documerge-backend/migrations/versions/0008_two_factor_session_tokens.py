@@ -0,0 +1,34 @@
+"""Replace stored 2FA sessions with signed session tokens and a revocation list"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_two_factor_session_tokens'
+down_revision = '0007_thesis_content_hash'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Sessões 2FA passam a ser tokens assinados; as sessões gravadas deixam de valer
+    op.drop_table('two_factor_sessions')
+    op.create_table(
+        'two_factor_revocations',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('session_id', sa.String(length=32), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_two_factor_revocations_expires_at', 'two_factor_revocations', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_two_factor_revocations_expires_at', table_name='two_factor_revocations')
+    op.drop_table('two_factor_revocations')
+    op.create_table(
+        'two_factor_sessions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('valid_until', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
@@ -1,15 +1,7 @@
-import os
 import firebase_admin
 from firebase_admin import credentials, storage
-
-# Caminho absoluto para o arquivo de credenciais
-# Recomendo usar variável de ambiente, mas você também pode usar o nome diretamente
-BASE_DIR = os.path.dirname(__file__)
-SERVICE_ACCOUNT_KEY_PATH = os.path.join(BASE_DIR, 'projeto-advocacia-tales-firebase-adminsdk-fbsvc-969b4fefcf.json')
-
-# Identificador do projeto e bucket (ajuste conforme seu Firebase)
-FIREBASE_PROJECT_ID = 'projeto-advocacia-tales'
-STORAGE_BUCKET = 'projeto-advocacia-tales.appspot.com'
+# Caminho das credenciais, projeto e bucket (o verificador local de tokens usa os mesmos)
+from src.config.firebase_settings import SERVICE_ACCOUNT_KEY_PATH, FIREBASE_PROJECT_ID, STORAGE_BUCKET
 
 # Inicialização do Firebase Admin SDK (evita reinicializações múltiplas)
 if not firebase_admin._apps:
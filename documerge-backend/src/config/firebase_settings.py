@@ -0,0 +1,13 @@
+import os
+
+# Configuração do projeto Firebase sem efeitos colaterais: pode ser importada
+# sem inicializar o SDK (firebase_config.py o inicializa ao ser importado)
+
+# Caminho absoluto para o arquivo de credenciais
+# Recomendo usar variável de ambiente, mas você também pode usar o nome diretamente
+BASE_DIR = os.path.dirname(__file__)
+SERVICE_ACCOUNT_KEY_PATH = os.path.join(BASE_DIR, 'projeto-advocacia-tales-firebase-adminsdk-fbsvc-969b4fefcf.json')
+
+# Identificador do projeto e bucket (ajuste conforme seu Firebase)
+FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID', 'projeto-advocacia-tales')
+STORAGE_BUCKET = 'projeto-advocacia-tales.appspot.com'
@@ -12,8 +12,12 @@ from src.routes.auth import auth_bp
 from src.routes.legal_content import legal_content_bp
 from src.routes.petitions import petitions_bp
 from src.routes.admin_tools import admin_bp
+from src.services.petition_jobs import start_job_workers
+from src.services.search_index import search_index
+from src.services.token_verifier import start_token_verifier
+from src.services.two_factor_tokens import two_factor_session_tokens
 
-def create_app():
+def create_app(start_workers=True):
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
     app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
@@ -29,7 +33,10 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
     # Database configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    # DATABASE_URL permite outro banco (ex.: bancos descartáveis dos testes de carga)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(app)
 
@@ -39,6 +46,19 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        # Tabelas virtuais FTS5 não são criadas pelo create_all
+        search_index.ensure_schema()
+
+    # Chaves de verificação dos ID tokens: a primeira requisição autenticada não espera pela busca
+    start_token_verifier()
+
+    # Sessões 2FA só são assinadas com o segredo próprio; sem ele a verificação 2FA é recusada
+    if not two_factor_session_tokens.configured():
+        print("Aviso: TWO_FACTOR_SESSION_SECRET ausente ou curto; sessões 2FA não serão emitidas")
+
+    # Workers da fila de petições no próprio processo (PETITION_JOB_WORKERS > 0)
+    if start_workers:
+        start_job_workers(app)
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g
 from src.services.firebase_service import firebase_service
 
 def require_auth(f):
@@ -39,5 +39,9 @@ def get_current_user():
     Get current user from request context
     Returns user_id if authenticated, None otherwise
     """
-    return getattr(request, 'user_id', None)
+    user_id = getattr(request, 'user_id', None)
+    # Routes protected by auth_middleware.require_auth keep the decoded token in g
+    if user_id is None and getattr(g, 'firebase_token', None):
+        user_id = g.firebase_token.get('uid')
+    return user_id
 
@@ -2,6 +2,9 @@ import functools
 from flask import request, jsonify, g
 from firebase_admin import auth
 from src.services.auth_service import AuthService
+from src.services.token_verifier import verified_token_cache
+from src.services.identity_cache import user_identity_cache
+from src.services.two_factor_tokens import TWO_FACTOR_TOKEN_HEADER
 
 auth_service = AuthService()
 
@@ -22,20 +25,27 @@ def require_auth(f):
             # Remove "Bearer " do início do token
             token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
             
-            # Verifica o token com Firebase
-            decoded_token = auth.verify_id_token(token)
+            # Verifica o token com Firebase (ou com o verificador local, em testes de carga);
+            # tokens já verificados vêm do cache até perto do exp
+            decoded_token = verified_token_cache.verify(token)
             firebase_uid = decoded_token['uid']
             
-            # Busca o usuário no banco local
-            user = auth_service.get_user_by_firebase_uid(firebase_uid)
-            if not user:
-                # Se o usuário não existe no banco local, cria automaticamente
-                email = decoded_token.get('email')
-                display_name = decoded_token.get('name')
-                user = auth_service.create_user(firebase_uid, email, display_name)
+            def load_user(firebase_uid):
+                user = auth_service.get_user_by_firebase_uid(firebase_uid)
+                if not user:
+                    # Se o usuário não existe no banco local, cria automaticamente
+                    email = decoded_token.get('email')
+                    display_name = decoded_token.get('name')
+                    user = auth_service.create_user(firebase_uid, email, display_name)
+                return user
+            
+            # Busca o usuário no banco local (papel, ativação e 2FA vêm do cache de identidades)
+            user = user_identity_cache.get_user(firebase_uid, load_user)
             
-            # Verifica se o usuário está ativo
+            # Verifica se o usuário está ativo (e descarta os tokens e a identidade dele em cache neste processo)
             if not user.is_active:
+                verified_token_cache.invalidate_user(firebase_uid)
+                user_identity_cache.invalidate(firebase_uid)
                 return jsonify({'error': 'Usuário desativado'}), 403
             
             # Adiciona o usuário ao contexto da requisição
@@ -89,9 +99,9 @@ def require_2fa_verified(f):
         
         user = g.current_user
         
-        # Se 2FA está habilitado, verifica sessão válida
+        # Se 2FA está habilitado, verifica o token de sessão 2FA (assinatura e validade, sem banco)
         if user.two_factor_enabled:
-            if not auth_service.has_valid_2fa_session(user.id):
+            if not auth_service.has_valid_2fa_session(user.id, request.headers.get(TWO_FACTOR_TOKEN_HEADER)):
                 return jsonify({
                     'error': 'Verificação 2FA necessária',
                     'requires_2fa': True
@@ -111,10 +121,10 @@ def optional_auth(f):
         if auth_header:
             try:
                 token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else auth_header
-                decoded_token = auth.verify_id_token(token)
+                decoded_token = verified_token_cache.verify(token)
                 firebase_uid = decoded_token['uid']
                 
-                user = auth_service.get_user_by_firebase_uid(firebase_uid)
+                user = user_identity_cache.get_user(firebase_uid, auth_service.get_user_by_firebase_uid)
                 if user and user.is_active:
                     g.current_user = user
                     g.firebase_token = decoded_token
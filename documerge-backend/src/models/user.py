@@ -71,6 +71,7 @@ class Thesis(db.Model):
     title = db.Column(db.String(300), nullable=False)
     description = db.Column(db.Text, nullable=True)
     gcs_path = db.Column(db.String(500), nullable=False)  # Caminho no Google Cloud Storage
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 do .docx (conteúdo compartilhado)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -87,6 +88,7 @@ class Thesis(db.Model):
             'title': self.title,
             'description': self.description,
             'gcs_path': self.gcs_path,
+            'content_hash': self.content_hash,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -178,6 +180,9 @@ class GeneratedPetition(db.Model):
     process_number = db.Column(db.String(100), nullable=True)
     gcs_path = db.Column(db.String(500), nullable=False)  # Caminho no Google Cloud Storage
     form_data = db.Column(db.Text, nullable=True)  # JSON com as respostas do formulário
+    generation_key = db.Column(db.String(64), nullable=True, index=True)  # Hash determinístico da geração (None após edição)
+    content_text = db.deferred(db.Column(db.Text, nullable=True))  # Texto extraído (carregado só quando usado)
+    content_text_path = db.Column(db.String(500), nullable=True)  # gcs_path de onde content_text foi extraído
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -196,10 +201,88 @@ class GeneratedPetition(db.Model):
             'process_number': self.process_number,
             'gcs_path': self.gcs_path,
             'form_data': self.form_data,
+            'generation_key': self.generation_key,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class PetitionRevision(db.Model):
+    __tablename__ = 'petition_revisions'
+    __table_args__ = (db.UniqueConstraint('petition_id', 'number', name='uq_petition_revisions_number'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    petition_id = db.Column(db.Integer, db.ForeignKey('generated_petitions.id'), nullable=False, index=True)
+    number = db.Column(db.Integer, nullable=False)  # 1, 2, 3... por petição
+    kind = db.Column(db.String(10), nullable=False)  # 'base' (cópia completa) ou 'delta'
+    gcs_path = db.Column(db.String(500), nullable=True)  # Cópia do .docx (apenas base)
+    content_text = db.Column(db.Text, nullable=True)  # Texto completo (apenas base)
+    edits = db.Column(db.Text, nullable=True)  # JSON [[start, end, lines]] sobre a revisão anterior (apenas delta)
+    text_edits = db.Column(db.Text, nullable=True)  # JSON do efeito no texto, quando difere de edits
+    title = db.Column(db.String(300), nullable=False)
+    paragraph_count = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Autor da edição
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PetitionRevision {self.petition_id}#{self.number} {self.kind}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'petition_id': self.petition_id,
+            'number': self.number,
+            'kind': self.kind,
+            'title': self.title,
+            'paragraph_count': self.paragraph_count,
+            'user_id': self.user_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class PetitionJob(db.Model):
+    __tablename__ = 'petition_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    petition_model_id = db.Column(db.Integer, db.ForeignKey('petition_models.id'), nullable=False)
+    title = db.Column(db.String(300), nullable=False)
+    process_number = db.Column(db.String(100), nullable=True)
+    form_data = db.Column(db.Text, nullable=False)  # JSON com as respostas do formulário
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker que processa o job
+    locked_until = db.Column(db.DateTime, nullable=True)  # Fim da reserva; depois disso o job volta à fila
+    petition_id = db.Column(db.Integer, db.ForeignKey('generated_petitions.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relacionamentos
+    petition = db.relationship('GeneratedPetition')
+    
+    def __repr__(self):
+        return f'<PetitionJob {self.id} {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'client_id': self.client_id,
+            'petition_model_id': self.petition_model_id,
+            'title': self.title,
+            'process_number': self.process_number,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'petition_id': self.petition_id,
+            'petition': self.petition.to_dict() if self.petition else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 class TwoFactorCode(db.Model):
     __tablename__ = 'two_factor_codes'
     
@@ -226,16 +309,18 @@ class TwoFactorCode(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
-class TwoFactorSession(db.Model):
-    __tablename__ = 'two_factor_sessions'
+class TwoFactorRevocation(db.Model):
+    """Sessão 2FA revogada antes do vencimento (logout) ou todas as de um usuário (desativação).
+    A linha só é necessária até expires_at, quando os tokens afetados já venceram.
+    """
+    __tablename__ = 'two_factor_revocations'
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    valid_until = db.Column(db.DateTime, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    user = db.relationship('User', backref='two_factor_sessions')
+    # Sessão revogada; nulo revoga as sessões do usuário emitidas até revoked_at
+    session_id = db.Column(db.String(32), nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
     def __repr__(self):
-        return f'<TwoFactorSession user={self.user_id} until={self.valid_until.isoformat()}>'
-
+        return f'<TwoFactorRevocation user={self.user_id} session={self.session_id}>'
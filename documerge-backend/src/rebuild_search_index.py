@@ -0,0 +1,31 @@
+import os
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.services.search_index import search_index
+
+def main():
+    """Reconstrói o índice de busca de teses e petições a partir dos dados existentes.
+
+    Uso:
+        python -m src.rebuild_search_index
+        python -m src.rebuild_search_index --client-id 3
+    """
+    parser = argparse.ArgumentParser(description='Reconstrução do índice de busca (FTS5)')
+    parser.add_argument('--client-id', type=int, help='Reindexa apenas as teses e petições deste cliente')
+    args = parser.parse_args()
+
+    app = create_app(start_workers=False)
+    with app.app_context():
+        result = search_index.rebuild(client_id=args.client_id)
+
+    indexed = result['indexed']
+    print(f"Indexadas {indexed['theses']} tese(s) e {indexed['petitions']} petição(ões)")
+    for failure in result['failed']:
+        print(f"Falha: {failure}")
+    sys.exit(1 if result['failed'] else 0)
+
+if __name__ == '__main__':
+    main()
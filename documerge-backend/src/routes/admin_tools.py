@@ -2,7 +2,13 @@ from flask import Blueprint, jsonify, request
 from src.middleware.auth_middleware import require_auth, require_role
 from src.services.auth_service import AuthService
 from src.models.user import db, User, Client, Thesis
-from src.services.document_service import DocumentService
+from src.services.document_service import DocumentService, petition_paragraph_cache
+from src.services.thesis_cache import thesis_content_cache
+from src.services.search_index import search_index
+from src.services.token_verifier import verified_token_cache
+from src.services.firebase_keys import firebase_key_manager
+from src.services.identity_cache import user_identity_cache
+from src.services.two_factor_tokens import two_factor_session_tokens
 import os
 
 admin_bp = Blueprint('admin_tools', __name__)
@@ -40,6 +46,7 @@ def promote_to_dev():
         
         user.role = 'dev'
         db.session.commit()
+        user_identity_cache.invalidate(user.firebase_uid)
         
         return jsonify({'message': f'Usuário {email} promovido a dev', 'user': user.to_dict()}), 200
     except Exception as e:
@@ -52,6 +59,8 @@ def promote_to_dev():
 def import_theses():
     """Importa .docx de um diretório local como Teses de um cliente.
     Body: {"client_name": "...", "directory": "C:\\caminho\\para\\Teses"}
+    Reimportar o mesmo diretório não duplica arquivos nem teses já existentes
+    (mesmo título e conteúdo).
     """
     try:
         data = request.get_json() or {}
@@ -70,19 +79,79 @@ def import_theses():
             db.session.commit()
         
         # Itera arquivos .docx
-        created = []
+        created, skipped, uploaded = [], [], []
         for entry in os.listdir(directory):
             if entry.lower().endswith('.docx'):
                 path = os.path.join(directory, entry)
                 title = os.path.splitext(entry)[0]
-                gcs_path = document_service.upload_thesis_file(path, client.id, title)
-                thesis = Thesis(client_id=client.id, title=title, description='', gcs_path=gcs_path)
+                gcs_path, content_hash = document_service.upload_thesis_file(path)
+                if Thesis.query.filter_by(client_id=client.id, title=title, content_hash=content_hash).first():
+                    skipped.append(title)
+                    continue
+                thesis = Thesis(
+                    client_id=client.id, title=title, description='',
+                    gcs_path=gcs_path, content_hash=content_hash
+                )
                 db.session.add(thesis)
+                db.session.flush()
+                search_index.index_thesis(thesis)
                 created.append(title)
+                uploaded.append((gcs_path, path))
         db.session.commit()
         
-        return jsonify({'message': 'Teses importadas', 'count': len(created), 'titles': created}), 200
+        # Conteúdo reaproveitado pode ter sido removido por uma exclusão concorrente
+        for gcs_path, path in uploaded:
+            document_service.ensure_thesis_file(gcs_path, path)
+        
+        return jsonify({
+            'message': 'Teses importadas', 'count': len(created), 'titles': created, 'skipped': skipped
+        }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/fragments/rebuild', methods=['POST'])
+@require_auth
+@require_role('advogado_administrador')
+def rebuild_fragments():
+    """Recompila os fragmentos de teses ausentes ou de versão antiga.
+    Body opcional: {"force": true} para recompilar todos.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        result = document_service.rebuild_thesis_fragments(force=bool(data.get('force')))
+        return jsonify({'message': 'Fragmentos recompilados', **result}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/search/rebuild', methods=['POST'])
+@require_auth
+@require_role('advogado_administrador')
+def rebuild_search_index():
+    """Reconstrói o índice de busca a partir dos dados existentes.
+    Body opcional: {"client_id": 1} para reindexar apenas um cliente.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        result = search_index.rebuild(client_id=data.get('client_id'))
+        return jsonify({'message': 'Índice de busca reconstruído', **result}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@require_auth
+@require_role('advogado_administrador')
+def cache_stats():
+    """Retorna contadores dos caches em memória deste processo"""
+    try:
+        return jsonify({
+            'thesis_content': thesis_content_cache.stats(),
+            'petition_paragraphs': petition_paragraph_cache.stats(),
+            'id_tokens': verified_token_cache.stats(),
+            'firebase_keys': firebase_key_manager.stats(),
+            'user_identities': user_identity_cache.stats(),
+            'two_factor_sessions': two_factor_session_tokens.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
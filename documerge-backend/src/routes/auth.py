@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, g
 from src.middleware.auth_middleware import require_auth, require_role
 from src.services.auth_service import AuthService
+from src.services.two_factor_tokens import TWO_FACTOR_TOKEN_HEADER
 from src.models.user import db
 from datetime import datetime
 from firebase_admin import auth as fb_auth
@@ -39,7 +40,9 @@ def login():
 @auth_bp.route('/verify-2fa', methods=['POST'])
 @require_auth
 def verify_2fa():
-    """Verifica código 2FA e registra sessão 2FA"""
+    """Verifica código 2FA e emite o token de sessão 2FA.
+    O cliente envia o token no header X-2FA-Session nas rotas que exigem 2FA.
+    """
     try:
         data = request.get_json()
         code = data.get('code')
@@ -50,19 +53,36 @@ def verify_2fa():
         user = g.current_user
         
         # Verifica o código
-        is_valid = auth_service.verify_2fa_code(user.id, code)
+        session = auth_service.verify_2fa_code(user.id, code)
         
-        if not is_valid:
+        if not session:
             return jsonify({'error': 'Código inválido ou expirado'}), 400
         
+        session_token, valid_until = session
         return jsonify({
             'message': '2FA verificado com sucesso',
-            'user': user.to_dict()
+            'user': user.to_dict(),
+            'two_factor_token': session_token,
+            'two_factor_valid_until': valid_until.isoformat()
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Erro na verificação 2FA: {str(e)}'}), 500
 
+@auth_bp.route('/logout', methods=['POST'])
+@require_auth
+def logout():
+    """Encerra a sessão 2FA do header X-2FA-Session (o login no Firebase é encerrado pelo cliente)"""
+    try:
+        session_token = request.headers.get(TWO_FACTOR_TOKEN_HEADER)
+        if session_token:
+            auth_service.end_2fa_session(g.current_user.id, session_token)
+        
+        return jsonify({'message': 'Logout realizado com sucesso'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro no logout: {str(e)}'}), 500
+
 @auth_bp.route('/profile', methods=['GET'])
 @require_auth
 def get_profile():
@@ -71,6 +71,11 @@ def merge_documents():
     if not document_paths or len(document_paths) < 2:
         return jsonify({'error': 'At least 2 documents are required for merging'}), 400
     
+    # Same ownership rule as downloads (the service checks again before fetching anything)
+    prefix = f'users/{user_id}/'
+    if not all(isinstance(path, str) and path.startswith(prefix) and '..' not in path.split('/') for path in document_paths):
+        return jsonify({'error': 'Access denied'}), 403
+    
     try:
         # Merge documents
         merged_stream = document_service.merge_documents(document_paths, user_id)
@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, g
 from src.middleware.auth_middleware import require_auth, require_role, require_2fa_verified
 from src.models.user import db, Client, Thesis, PetitionModel, Question, ThesisQuestionLink
-from src.services.document_service import DocumentService
+from src.services.document_service import DocumentService, THESIS_HASH_PATTERN
+from src.services.thesis_selection import selection_index_cache
+from src.services.thesis_cache import thesis_content_cache
+from src.services.search_index import SEARCH_MAX_LIMIT, SearchUnavailable, build_match_query, search_index
 
 legal_content_bp = Blueprint('legal_content', __name__)
 document_service = DocumentService()
@@ -94,8 +97,17 @@ def delete_client(client_id):
         if not client:
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
+        files = [(thesis.gcs_path, thesis.content_hash) for thesis in client.theses]
+        
         db.session.delete(client)
+        search_index.remove_client(client_id)
         db.session.commit()
+        selection_index_cache.clear()
+        thesis_content_cache.clear()
+        
+        # Arquivos das teses removidas em cascata (conteúdo compartilhado é mantido)
+        for gcs_path, content_hash in files:
+            document_service.release_thesis_file(gcs_path, content_hash)
         
         return jsonify({'message': 'Cliente removido com sucesso'}), 200
         
@@ -124,46 +136,70 @@ def list_theses(client_id):
 @require_role('advogado_administrador')
 @require_2fa_verified
 def create_thesis(client_id):
-    """Cria uma nova tese (UC-04)"""
+    """Cria uma nova tese (UC-04).
+    Em vez do arquivo, aceita content_hash (SHA-256 do .docx): se o conteúdo já
+    estiver armazenado, a tese é criada sem transferir o arquivo.
+    """
     try:
         # Verifica se o cliente existe
         client = Client.query.get(client_id)
         if not client:
             return jsonify({'error': 'Cliente não encontrado'}), 404
         
-        # Verifica se há arquivo
-        if 'file' not in request.files:
-            return jsonify({'error': 'Arquivo .docx é obrigatório'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
-        
-        # Verifica extensão
-        if not file.filename.lower().endswith('.docx'):
-            return jsonify({'error': 'Apenas arquivos .docx são permitidos'}), 400
-        
         # Dados do formulário
         title = request.form.get('title')
         description = request.form.get('description', '')
+        content_hash = (request.form.get('content_hash') or '').lower()
         
         if not title:
             return jsonify({'error': 'Título é obrigatório'}), 400
         
-        # Faz upload do arquivo
-        gcs_path = document_service.upload_thesis_file(file, client_id, title)
+        file = None
+        if 'file' not in request.files and content_hash:
+            if not THESIS_HASH_PATTERN.match(content_hash):
+                return jsonify({'error': 'content_hash deve ser um SHA-256 em hexadecimal'}), 400
+            
+            # Conteúdo já conhecido: dispensa o upload
+            gcs_path = document_service.find_thesis_blob(content_hash)
+            if not gcs_path:
+                return jsonify({'error': 'Conteúdo não encontrado; envie o arquivo .docx'}), 404
+        else:
+            # Verifica se há arquivo
+            if 'file' not in request.files:
+                return jsonify({'error': 'Arquivo .docx é obrigatório'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+            
+            # Verifica extensão
+            if not file.filename.lower().endswith('.docx'):
+                return jsonify({'error': 'Apenas arquivos .docx são permitidos'}), 400
+            
+            # Faz upload do arquivo (ignorado se o conteúdo já estiver armazenado)
+            gcs_path, content_hash = document_service.upload_thesis_file(file)
         
         # Cria a tese no banco
         thesis = Thesis(
             client_id=client_id,
             title=title,
             description=description,
-            gcs_path=gcs_path
+            gcs_path=gcs_path,
+            content_hash=content_hash
         )
         
         db.session.add(thesis)
+        db.session.flush()
+        search_index.index_thesis(thesis)
         db.session.commit()
         
+        # Conteúdo reaproveitado pode ter sido removido por uma exclusão concorrente
+        if not document_service.ensure_thesis_file(gcs_path, file):
+            db.session.delete(thesis)
+            search_index.remove_thesis(thesis.id)
+            db.session.commit()
+            return jsonify({'error': 'Conteúdo não encontrado; envie o arquivo .docx'}), 404
+        
         return jsonify({
             'message': 'Tese criada com sucesso',
             'thesis': thesis.to_dict()
@@ -184,15 +220,17 @@ def update_thesis(thesis_id):
         if not thesis:
             return jsonify({'error': 'Tese não encontrada'}), 404
         
-        # Se há arquivo novo
+        old_path, old_hash = thesis.gcs_path, thesis.content_hash
+        
+        # Se há arquivo novo (mesmo conteúdo mantém o caminho atual)
+        uploaded = None
         if 'file' in request.files:
             file = request.files['file']
             if file.filename != '' and file.filename.lower().endswith('.docx'):
-                # Remove arquivo antigo e faz upload do novo
-                document_service.delete_file(thesis.gcs_path)
-                thesis.gcs_path = document_service.upload_thesis_file(
-                    file, thesis.client_id, thesis.title
+                thesis.gcs_path, thesis.content_hash = document_service.upload_thesis_file(
+                    file, thesis_id=thesis.id
                 )
+                uploaded = file
         
         # Atualiza metadados
         if 'title' in request.form:
@@ -200,7 +238,18 @@ def update_thesis(thesis_id):
         if 'description' in request.form:
             thesis.description = request.form['description']
         
+        search_index.index_thesis(thesis)
         db.session.commit()
+        selection_index_cache.invalidate_thesis(thesis.id)
+        thesis_content_cache.invalidate(thesis.id)
+        
+        # Conteúdo reaproveitado pode ter sido removido por uma exclusão concorrente
+        if uploaded is not None:
+            document_service.ensure_thesis_file(thesis.gcs_path, uploaded)
+        
+        # Arquivo anterior só é apagado se nenhuma outra tese o referencia
+        if thesis.gcs_path != old_path:
+            document_service.release_thesis_file(old_path, old_hash)
         
         return jsonify({
             'message': 'Tese atualizada com sucesso',
@@ -222,12 +271,17 @@ def delete_thesis(thesis_id):
         if not thesis:
             return jsonify({'error': 'Tese não encontrada'}), 404
         
-        # Remove arquivo do GCS
-        document_service.delete_file(thesis.gcs_path)
+        gcs_path, content_hash = thesis.gcs_path, thesis.content_hash
         
-        # Remove do banco
+        # Remove do banco e do índice de busca
         db.session.delete(thesis)
+        search_index.remove_thesis(thesis_id)
         db.session.commit()
+        selection_index_cache.invalidate_thesis(thesis_id)
+        thesis_content_cache.invalidate(thesis_id)
+        
+        # Remove o arquivo do GCS se nenhuma outra tese o referencia
+        document_service.release_thesis_file(gcs_path, content_hash)
         
         return jsonify({'message': 'Tese removida com sucesso'}), 200
         
@@ -235,6 +289,57 @@ def delete_thesis(thesis_id):
         db.session.rollback()
         return jsonify({'error': f'Erro ao remover tese: {str(e)}'}), 500
 
+# ===== BUSCA =====
+
+@legal_content_bp.route('/clients/<int:client_id>/search', methods=['GET'])
+@require_auth
+@require_2fa_verified
+def search_client_content(client_id):
+    """Busca textual em teses e petições de um cliente, com ranking e trechos destacados.
+    Query: q (obrigatório), type=all|theses|petitions, limit, offset.
+    Usuários não administradores veem apenas as próprias petições.
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+        if build_match_query(query) is None:
+            return jsonify({'error': 'Parâmetro q deve conter ao menos uma palavra'}), 400
+        
+        search_type = request.args.get('type', 'all')
+        if search_type not in ('all', 'theses', 'petitions'):
+            return jsonify({'error': 'type deve ser all, theses ou petitions'}), 400
+        
+        try:
+            limit = int(request.args.get('limit', 20))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'limit e offset devem ser inteiros'}), 400
+        if not 0 < limit <= SEARCH_MAX_LIMIT or offset < 0:
+            return jsonify({
+                'error': f'limit deve estar entre 1 e {SEARCH_MAX_LIMIT} e offset não pode ser negativo'
+            }), 400
+        
+        if not Client.query.get(client_id):
+            return jsonify({'error': 'Cliente não encontrado'}), 404
+        
+        user = g.current_user
+        response = {'query': query}
+        if search_type in ('all', 'theses'):
+            response['theses'] = search_index.search_theses(client_id, query, limit=limit, offset=offset)
+        if search_type in ('all', 'petitions'):
+            owner_id = None if user.role in ['advogado_administrador', 'dev'] else user.id
+            response['petitions'] = search_index.search_petitions(
+                client_id, query, user_id=owner_id, limit=limit, offset=offset
+            )
+        
+        return jsonify(response), 200
+        
+    except SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'Erro na busca: {str(e)}'}), 500
+
 # ===== MODELOS DE PETIÇÃO =====
 
 @legal_content_bp.route('/clients/<int:client_id>/petition-models', methods=['GET'])
@@ -330,6 +435,7 @@ def delete_petition_model(model_id):
         
         db.session.delete(model)
         db.session.commit()
+        selection_index_cache.invalidate_model(model_id)
         
         return jsonify({'message': 'Modelo removido com sucesso'}), 200
         
@@ -381,6 +487,7 @@ def create_question(model_id):
         
         db.session.add(question)
         db.session.commit()
+        selection_index_cache.invalidate_model(model_id)
         
         return jsonify({
             'message': 'Pergunta criada com sucesso',
@@ -412,6 +519,7 @@ def update_question(question_id):
             question.hierarchy_level = data['hierarchy_level']
         
         db.session.commit()
+        selection_index_cache.invalidate_model(question.petition_model_id)
         
         return jsonify({
             'message': 'Pergunta atualizada com sucesso',
@@ -433,8 +541,10 @@ def delete_question(question_id):
         if not question:
             return jsonify({'error': 'Pergunta não encontrada'}), 404
         
+        model_id = question.petition_model_id
         db.session.delete(question)
         db.session.commit()
+        selection_index_cache.invalidate_model(model_id)
         
         return jsonify({'message': 'Pergunta removida com sucesso'}), 200
         
@@ -502,6 +612,7 @@ def create_thesis_link(question_id):
         
         db.session.add(link)
         db.session.commit()
+        selection_index_cache.invalidate_model(question.petition_model_id)
         
         return jsonify({
             'message': 'Vinculação criada com sucesso',
@@ -523,8 +634,10 @@ def delete_thesis_link(link_id):
         if not link:
             return jsonify({'error': 'Vinculação não encontrada'}), 404
         
+        question_id = link.question_id
         db.session.delete(link)
         db.session.commit()
+        selection_index_cache.invalidate_question(question_id)
         
         return jsonify({'message': 'Vinculação removida com sucesso'}), 200
         
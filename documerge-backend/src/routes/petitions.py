@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify, g, send_file
 from src.middleware.auth_middleware import require_auth, require_role, require_2fa_verified
 from src.models.user import db, PetitionModel, GeneratedPetition
 from src.services.document_service import DocumentService
+from src.services.petition_jobs import petition_job_queue, job_workers_available
+from src.services.petition_revisions import petition_revision_store
+from src.services.search_index import search_index
 
 petitions_bp = Blueprint('petitions', __name__)
 document_service = DocumentService()
@@ -37,6 +40,25 @@ def generate_petition():
         
         user = g.current_user
         
+        # Modo assíncrono: enfileira e retorna o job para consulta posterior.
+        # Sem workers configurados a petição é gerada na própria requisição (201)
+        async_requested = data.get('async') or request.args.get('async') in ('1', 'true')
+        if async_requested and job_workers_available():
+            job = petition_job_queue.enqueue(
+                petition_model_id=petition_model_id,
+                form_answers=form_answers,
+                user_id=user.id,
+                client_id=client_id,
+                title=title,
+                process_number=process_number
+            )
+            response = jsonify({
+                'message': 'Geração de petição enfileirada',
+                'job': job.to_dict()
+            })
+            response.headers['Location'] = f"/api/petitions/jobs/{job.id}"
+            return response, 202
+        
         # Gera a petição
         petition = document_service.generate_petition(
             petition_model_id=petition_model_id,
@@ -55,6 +77,76 @@ def generate_petition():
     except Exception as e:
         return jsonify({'error': f'Erro ao gerar petição: {str(e)}'}), 500
 
+@petitions_bp.route('/generate/batch', methods=['POST'])
+@require_auth
+@require_2fa_verified
+def generate_petitions_batch():
+    """Gera várias petições do mesmo modelo a partir de uma lista de respostas.
+    Body: {"petition_model_id", "client_id", "rows": [{"form_answers", "title", "process_number"}]}
+    """
+    try:
+        data = request.get_json()
+        
+        petition_model_id = data.get('petition_model_id')
+        client_id = data.get('client_id')
+        rows = data.get('rows')
+        
+        # Validações
+        if not petition_model_id or not client_id or not isinstance(rows, list) or not rows:
+            return jsonify({
+                'error': 'petition_model_id, client_id e rows (lista não vazia) são obrigatórios'
+            }), 400
+        
+        # Verifica se o modelo existe
+        model = PetitionModel.query.get(petition_model_id)
+        if not model:
+            return jsonify({'error': 'Modelo de petição não encontrado'}), 404
+        
+        # Verifica se o cliente do modelo corresponde
+        if model.client_id != client_id:
+            return jsonify({'error': 'Cliente não corresponde ao modelo'}), 400
+        
+        user = g.current_user
+        
+        results = document_service.generate_petitions_batch(
+            petition_model_id=petition_model_id,
+            rows=rows,
+            user_id=user.id,
+            client_id=client_id
+        )
+        succeeded = sum(1 for result in results if result['status'] == 'ok')
+        
+        return jsonify({
+            'message': f'{succeeded} de {len(results)} petições geradas',
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao gerar petições em lote: {str(e)}'}), 500
+
+@petitions_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@require_auth
+@require_2fa_verified
+def get_petition_job(job_id):
+    """Consulta o status de uma geração assíncrona (queued, running, done, failed)"""
+    try:
+        job = petition_job_queue.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        user = g.current_user
+        
+        # Verifica permissões
+        if job.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
+            return jsonify({'error': 'Sem permissão para acessar este job'}), 403
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar job: {str(e)}'}), 500
+
 @petitions_bp.route('/<int:petition_id>/content', methods=['GET'])
 @require_auth
 @require_2fa_verified
@@ -78,6 +170,33 @@ def get_petition_content(petition_id):
     except Exception as e:
         return jsonify({'error': f'Erro ao obter conteúdo: {str(e)}'}), 500
 
+@petitions_bp.route('/<int:petition_id>/paragraphs', methods=['GET'])
+@require_auth
+@require_2fa_verified
+def get_petition_paragraphs(petition_id):
+    """Obtém um intervalo de parágrafos da petição (?offset=0&limit=100)"""
+    try:
+        petition = GeneratedPetition.query.get(petition_id)
+        if not petition:
+            return jsonify({'error': 'Petição não encontrada'}), 404
+        
+        user = g.current_user
+        
+        # Verifica se o usuário tem permissão para ver esta petição
+        if petition.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
+            return jsonify({'error': 'Sem permissão para acessar esta petição'}), 403
+        
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            return jsonify({'error': 'offset e limit devem ser inteiros'}), 400
+        
+        return jsonify(document_service.get_petition_paragraphs(petition_id, offset, limit)), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao obter parágrafos: {str(e)}'}), 500
+
 @petitions_bp.route('/<int:petition_id>/content', methods=['PUT'])
 @require_auth
 @require_2fa_verified
@@ -97,12 +216,16 @@ def update_petition_content(petition_id):
         data = request.get_json()
         new_content = data.get('content')
         new_title = data.get('title')
+        # Edição incremental: [{"start", "end", "lines"}] com só os parágrafos alterados
+        edits = data.get('edits')
         
-        if not new_content:
-            return jsonify({'error': 'Conteúdo é obrigatório'}), 400
+        if not new_content and edits is None:
+            return jsonify({'error': 'Conteúdo ou edições são obrigatórios'}), 400
+        if edits is not None and not isinstance(edits, list):
+            return jsonify({'error': 'edits deve ser uma lista'}), 400
         
         updated_petition = document_service.update_petition_content(
-            petition_id, new_content, new_title
+            petition_id, new_content, new_title, edits=edits, user_id=user.id
         )
         
         return jsonify({
@@ -113,6 +236,65 @@ def update_petition_content(petition_id):
     except Exception as e:
         return jsonify({'error': f'Erro ao atualizar petição: {str(e)}'}), 500
 
+@petitions_bp.route('/<int:petition_id>/revisions', methods=['GET'])
+@require_auth
+@require_2fa_verified
+def list_petition_revisions(petition_id):
+    """Lista o histórico de revisões de uma petição"""
+    try:
+        petition = GeneratedPetition.query.get(petition_id)
+        if not petition:
+            return jsonify({'error': 'Petição não encontrada'}), 404
+        
+        user = g.current_user
+        
+        # Verifica permissões
+        if petition.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
+            return jsonify({'error': 'Sem permissão para acessar esta petição'}), 403
+        
+        revisions = petition_revision_store.list_revisions(petition_id)
+        
+        return jsonify({'revisions': [revision.to_dict() for revision in revisions]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao listar revisões: {str(e)}'}), 500
+
+@petitions_bp.route('/<int:petition_id>/revisions/<int:number>', methods=['GET'])
+@require_auth
+@require_2fa_verified
+def get_petition_revision(petition_id, number):
+    """Obtém o texto de uma revisão; ?format=docx baixa o documento reconstruído"""
+    try:
+        petition = GeneratedPetition.query.get(petition_id)
+        if not petition:
+            return jsonify({'error': 'Petição não encontrada'}), 404
+        
+        user = g.current_user
+        
+        # Verifica permissões
+        if petition.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
+            return jsonify({'error': 'Sem permissão para acessar esta petição'}), 403
+        
+        revision = petition_revision_store.get_revision(petition_id, number)
+        if not revision:
+            return jsonify({'error': 'Revisão não encontrada'}), 404
+        
+        if request.args.get('format') == 'docx':
+            return send_file(
+                petition_revision_store.revision_document(petition_id, number),
+                as_attachment=True,
+                download_name=f"{revision.title} (revisão {number}).docx",
+                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            )
+        
+        return jsonify({
+            'revision': revision.to_dict(),
+            'content': petition_revision_store.revision_text(petition_id, number)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao obter revisão: {str(e)}'}), 500
+
 @petitions_bp.route('/<int:petition_id>/save', methods=['POST'])
 @require_auth
 @require_2fa_verified
@@ -138,6 +320,7 @@ def save_petition(petition_id):
             petition.process_number = data['process_number']
         
         petition.updated_at = datetime.utcnow()
+        search_index.index_petition(petition)
         db.session.commit()
         
         return jsonify({
@@ -194,10 +377,10 @@ def download_petition(petition_id):
         if petition.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
             return jsonify({'error': 'Sem permissão para baixar esta petição'}), 403
         
-        file_path = document_service.get_petition_file(petition_id)
+        file_stream = document_service.get_petition_file(petition_id)
         
         return send_file(
-            file_path,
+            file_stream,
             as_attachment=True,
             download_name=f"{petition.title}.docx",
             mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
@@ -222,11 +405,13 @@ def delete_petition(petition_id):
         if petition.user_id != user.id and not user.role in ['advogado_administrador', 'dev']:
             return jsonify({'error': 'Sem permissão para remover esta petição'}), 403
         
-        # Remove arquivo
+        # Remove arquivo e histórico de revisões
         document_service.delete_file(petition.gcs_path)
+        petition_revision_store.delete_revisions(petition.id)
         
         # Remove do banco
         db.session.delete(petition)
+        search_index.remove_petition(petition_id)
         db.session.commit()
         
         return jsonify({'message': 'Petição removida com sucesso'}), 200
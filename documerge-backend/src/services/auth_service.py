@@ -6,11 +6,16 @@ from datetime import datetime, timedelta
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from firebase_admin import auth
-from src.models.user import db, User, TwoFactorCode, TwoFactorSession
+from src.models.user import db, User, TwoFactorCode
+from src.services.token_verifier import verified_token_cache
+from src.services.identity_cache import user_identity_cache
+from src.services.two_factor_tokens import two_factor_session_tokens
 
 class AuthService:
     def __init__(self):
         self.sendgrid_api_key = os.getenv('SENDGRID_API_KEY')
+        # Endpoint da API do SendGrid (testes de carga apontam para um receptor de emails local)
+        self.sendgrid_api_host = os.getenv('SENDGRID_API_HOST', 'https://api.sendgrid.com')
         self.from_email = os.getenv('FROM_EMAIL', 'noreply@advocacia.com')
         
     def create_user(self, firebase_uid, email, display_name=None, role='advogado_redator', must_change_password=False, two_factor_enabled=True):
@@ -92,6 +97,9 @@ class AuthService:
             
             db.session.commit()
             
+            # Identidade em cache (papel, ativação, 2FA) deixa de valer neste processo
+            user_identity_cache.invalidate(user.firebase_uid)
+            
             return user
         except Exception as e:
             db.session.rollback()
@@ -110,6 +118,9 @@ class AuthService:
             
             db.session.commit()
             
+            # Identidade em cache (papel, ativação, 2FA) deixa de valer neste processo
+            user_identity_cache.invalidate(user.firebase_uid)
+            
             return user
         except Exception as e:
             db.session.rollback()
@@ -147,7 +158,9 @@ class AuthService:
             raise e
     
     def verify_2fa_code(self, user_id, code):
-        """Verifica um código 2FA e cria sessão de 2FA se válido"""
+        """Verifica um código 2FA e emite um token de sessão 2FA se válido.
+        Retorna (token, valid_until) ou None.
+        """
         try:
             # Busca código válido não usado
             two_factor_code = TwoFactorCode.query.filter_by(
@@ -159,33 +172,30 @@ class AuthService:
             ).first()
             
             if not two_factor_code:
-                return False
+                return None
             
             # Marca como usado
             two_factor_code.used = True
-            
-            # Cria uma sessão de 2FA válida por 12 horas
-            session = TwoFactorSession(
-                user_id=user_id,
-                valid_until=datetime.utcnow() + timedelta(hours=12)
-            )
-            db.session.add(session)
             db.session.commit()
             
-            return True
+            # Sessão 2FA assinada (válida por TWO_FACTOR_SESSION_HOURS), sem registro no banco
+            return two_factor_session_tokens.issue(user_id)
         except Exception as e:
             db.session.rollback()
             raise e
     
-    def has_valid_2fa_session(self, user_id):
-        """Verifica se o usuário possui sessão 2FA válida"""
+    def has_valid_2fa_session(self, user_id, session_token):
+        """Verifica se o token de sessão 2FA é válido para o usuário (sem consulta ao banco)"""
+        if not session_token:
+            return False
         try:
-            session = TwoFactorSession.query.filter_by(user_id=user_id).filter(
-                TwoFactorSession.valid_until > datetime.utcnow()
-            ).order_by(TwoFactorSession.valid_until.desc()).first()
-            return session is not None
+            return two_factor_session_tokens.verify(session_token, user_id)
         except Exception:
             return False
+    
+    def end_2fa_session(self, user_id, session_token):
+        """Revoga o token de sessão 2FA do usuário (logout)"""
+        return two_factor_session_tokens.revoke_session(session_token, user_id)
 
     def _send_2fa_email(self, to_email, code, display_name):
         """Envia email com código 2FA"""
@@ -213,7 +223,7 @@ class AuthService:
                 '''
             )
             
-            sg = SendGridAPIClient(api_key=self.sendgrid_api_key)
+            sg = SendGridAPIClient(api_key=self.sendgrid_api_key, host=self.sendgrid_api_host)
             response = sg.send(message)
             
             print(f"Email 2FA enviado para {to_email}. Status: {response.status_code}")
@@ -240,6 +250,9 @@ class AuthService:
             
             db.session.commit()
             
+            # Identidade em cache (papel, ativação, 2FA) deixa de valer neste processo
+            user_identity_cache.invalidate(user.firebase_uid)
+            
             # Atualiza custom claims no Firebase
             try:
                 auth.set_custom_user_claims(user.firebase_uid, {'role': new_role})
@@ -263,6 +276,12 @@ class AuthService:
             
             db.session.commit()
             
+            # Tokens já verificados e a identidade em cache deixam de ser aceitos sem nova consulta
+            verified_token_cache.invalidate_user(user.firebase_uid)
+            user_identity_cache.invalidate(user.firebase_uid)
+            # Sessões 2FA já emitidas deixam de valer (também após uma reativação)
+            two_factor_session_tokens.revoke_user(user.id)
+            
             return user
         except Exception as e:
             db.session.rollback()
@@ -280,6 +299,9 @@ class AuthService:
             
             db.session.commit()
             
+            # Identidade em cache (papel, ativação, 2FA) deixa de valer neste processo
+            user_identity_cache.invalidate(user.firebase_uid)
+            
             return user
         except Exception as e:
             db.session.rollback()
@@ -1,217 +1,536 @@
 import os
+import io
 import json
+import re
+import hashlib
+import shutil
 import tempfile
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from docx import Document
+from flask import current_app
 from docx.shared import Inches
 from google.cloud import storage
-from src.models.user import db, GeneratedPetition, Question, ThesisQuestionLink, Thesis
+from src.models.user import db, GeneratedPetition, Thesis
+from src.services.thesis_selection import selection_index_cache
+from src.services.thesis_cache import LRUByteCache, ThesisContentCache, thesis_content_cache
+from src.services.docx_merge import DocxMerger
+from src.services.docx_stream import StreamingDocxWriter
+from src.services.docx_text import extract_document_text
+from src.services.docx_edit import DocxParagraphEditor, diff_lines, normalize_edits
+from src.services.petition_revisions import petition_revision_store
+from src.services.search_index import search_index
+from src.services.storage_backends import DOCUMENT_SPOOL_MAX_BYTES, GenerationMismatch, create_storage_backend
+from src.services.docx_fragments import FRAGMENT_FORMAT_VERSION, DocxFragment, compile_fragment
+
+# Número máximo de downloads simultâneos de teses
+THESIS_FETCH_WORKERS = int(os.getenv('THESIS_FETCH_WORKERS', '8'))
+
+# Petições com pelo menos este número de teses são geradas em streaming
+PETITION_STREAMING_MIN_THESES = int(os.getenv('PETITION_STREAMING_MIN_THESES', '50'))
+
+# Tamanho dos blocos lidos (e incluídos no hash) ao receber o arquivo de uma tese
+THESIS_UPLOAD_CHUNK_BYTES = int(os.getenv('THESIS_UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+THESIS_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Petições de um lote montadas em paralelo e tamanho máximo do lote
+PETITION_BATCH_WORKERS = int(os.getenv('PETITION_BATCH_WORKERS', '4'))
+PETITION_BATCH_MAX_ROWS = int(os.getenv('PETITION_BATCH_MAX_ROWS', '500'))
+
+# Limites da mesclagem de documentos enviados pelos usuários (/api/documents/merge)
+MERGE_MAX_DOCUMENTS = int(os.getenv('MERGE_MAX_DOCUMENTS', '100'))
+MERGE_MAX_INPUT_BYTES = int(os.getenv('MERGE_MAX_INPUT_BYTES', str(25 * 1024 * 1024)))  # por documento
+MERGE_MAX_TOTAL_BYTES = int(os.getenv('MERGE_MAX_TOTAL_BYTES', str(200 * 1024 * 1024)))
+# Memória reservada para documentos baixados/compilados ainda não gravados na saída
+MERGE_MEMORY_BUDGET_BYTES = int(os.getenv('MERGE_MEMORY_BUDGET_BYTES', str(256 * 1024 * 1024)))
+# Um .docx compactado ocupa várias vezes o seu tamanho depois de descompactado e interpretado
+MERGE_MEMORY_EXPANSION = int(os.getenv('MERGE_MEMORY_EXPANSION', '6'))
+
+# Páginas do conteúdo de petições (parágrafos por requisição e cache dos parágrafos já divididos)
+PETITION_PARAGRAPHS_MAX_LIMIT = int(os.getenv('PETITION_PARAGRAPHS_MAX_LIMIT', '500'))
+PETITION_PARAGRAPH_CACHE_MAX_BYTES = int(os.getenv('PETITION_PARAGRAPH_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Incrementar quando o layout da petição gerada mudar (invalida a deduplicação)
+GENERATION_KEY_VERSION = 1
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Parágrafos de petições já divididos, por (petition_id, caminho, updated_at)
+petition_paragraph_cache = LRUByteCache(PETITION_PARAGRAPH_CACHE_MAX_BYTES)
 
 class DocumentService:
-    def __init__(self):
+    def __init__(self, fetch_workers=None, storage_backend=None):
         self.bucket_name = 'documerge-storage'
-        self.client = None
-        self.bucket = None
+        self.fetch_workers = fetch_workers or THESIS_FETCH_WORKERS
         
-        # Inicializa cliente GCS se as credenciais estiverem disponíveis
-        try:
-            self.client = storage.Client(project="documerge-api")
-            self.bucket = self.client.bucket(self.bucket_name)
-        except Exception as e:
-            print(f"Aviso: Google Cloud Storage não configurado: {e}")
-            # Em desenvolvimento, usa armazenamento local
-            self.local_storage_path = '/tmp/advocacia_documents'
-            os.makedirs(self.local_storage_path, exist_ok=True)
+        # GCS se as credenciais estiverem disponíveis; disco local com DOCUMENT_STORAGE=local ou sem GCS
+        self.storage = storage_backend or create_storage_backend(
+            lambda: storage.Client(project="documerge-api").bucket(self.bucket_name), self.bucket_name
+        )
     
-    def upload_thesis_file(self, file, client_id, title):
-        """Faz upload de um arquivo de tese.
+    def upload_thesis_file(self, file, thesis_id=None):
+        """Armazena o arquivo de uma tese pelo SHA-256 do conteúdo e compila o fragmento.
         Aceita:
-        - file: FileStorage (tem método save) OU
-        - file: caminho str para arquivo local OU
-        - file: file-like (read())
+        - file: FileStorage / file-like (read()) OU
+        - file: caminho str para arquivo local
+        O hash é calculado enquanto o upload é lido; se o mesmo conteúdo já está
+        armazenado, nada é transferido. Retorna (gcs_path, content_hash).
+        Se thesis_id for informado (substituição de arquivo), invalida o cache da tese.
         """
         try:
-            # Gera nome único para o arquivo
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"client_{client_id}/theses/{timestamp}_{title.replace(' ', '_')}.docx"
-            
-            if self.bucket:
-                # Upload para GCS
-                blob = self.bucket.blob(filename)
-                if hasattr(file, 'read') and not hasattr(file, 'save'):
-                    blob.upload_from_file(file, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                elif isinstance(file, str) and os.path.exists(file):
-                    with open(file, 'rb') as f:
-                        blob.upload_from_file(f, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                else:
-                    blob.upload_from_file(file, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                return f"gs://{self.bucket_name}/{filename}"
+            if thesis_id is not None:
+                thesis_content_cache.invalidate(thesis_id)
+            
+            if isinstance(file, str):
+                if not os.path.exists(file):
+                    raise Exception(f"Arquivo não encontrado: {file}")
+                with open(file, 'rb') as f:
+                    spool, content_hash = self._spool_and_hash(f)
+            elif hasattr(file, 'read'):
+                spool, content_hash = self._spool_and_hash(file)
             else:
-                # Armazenamento local para desenvolvimento
-                local_path = os.path.join(self.local_storage_path, filename)
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                if hasattr(file, 'save'):
-                    file.save(local_path)
-                elif isinstance(file, str) and os.path.exists(file):
-                    import shutil
-                    shutil.copy2(file, local_path)
-                elif hasattr(file, 'read'):
-                    with open(local_path, 'wb') as f:
-                        f.write(file.read())
-                else:
-                    raise Exception('Tipo de arquivo não suportado para upload')
-                return local_path
+                raise Exception('Tipo de arquivo não suportado para upload')
+            
+            with spool:
+                gcs_path = self.thesis_blob_path(content_hash)
+                # Conteúdo idêntico já armazenado (reimportação, reenvio): objeto imutável, sem transferência
+                if self.object_exists(gcs_path):
+                    return gcs_path, content_hash
+                
+                self.write_object(gcs_path, spool, DOCX_CONTENT_TYPE)
+                
+                # Compila o fragmento junto ao original (falhas caem no caminho de compilação sob demanda)
+                spool.seek(0)
+                self.store_thesis_fragment(gcs_path, spool.read())
+            
+            return gcs_path, content_hash
                 
         except Exception as e:
             raise Exception(f"Erro ao fazer upload do arquivo: {str(e)}")
     
+    @staticmethod
+    def _spool_and_hash(source):
+        """Copia o upload em blocos para um buffer (com transbordo para disco) calculando o SHA-256"""
+        digest = hashlib.sha256()
+        spool = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, suffix='.docx')
+        try:
+            while True:
+                chunk = source.read(THESIS_UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool, digest.hexdigest()
+    
+    def thesis_blob_path(self, content_hash):
+        """Caminho imutável do conteúdo de uma tese (compartilhado entre teses idênticas)"""
+        return self.object_path(f"theses/sha256/{content_hash[:2]}/{content_hash}.docx")
+    
+    def find_thesis_blob(self, content_hash):
+        """Caminho do conteúdo já armazenado com este SHA-256, ou None"""
+        if not THESIS_HASH_PATTERN.match(content_hash or ''):
+            raise Exception("content_hash deve ser um SHA-256 em hexadecimal")
+        gcs_path = self.thesis_blob_path(content_hash)
+        return gcs_path if self.object_exists(gcs_path) else None
+    
+    @staticmethod
+    def thesis_blob_refcount(content_hash):
+        """Número de teses que referenciam o conteúdo"""
+        return Thesis.query.filter_by(content_hash=content_hash).count()
+    
+    def release_thesis_file(self, gcs_path, content_hash):
+        """Libera o arquivo de uma tese removida ou substituída (chamar após o commit).
+        Conteúdo endereçado por hash só é apagado quando nenhuma tese o referencia.
+        
+        Uma tese nova pode reaproveitar o conteúdo entre a contagem e a remoção:
+        o objeto é movido para uma lápide, a contagem é refeita e, se houver
+        nova referência, o conteúdo é restaurado. Quem cria a tese confirma o
+        conteúdo depois do commit (ensure_thesis_file).
+        """
+        if not content_hash:
+            self.delete_thesis_file(gcs_path)
+            return True
+        if self.thesis_blob_refcount(content_hash) > 0:
+            return False
+        
+        tombstone = f"{gcs_path}.deleting-{uuid.uuid4().hex}"
+        try:
+            self.copy_object(gcs_path, tombstone)
+        except Exception as e:
+            print(f"Aviso: Conteúdo {gcs_path} mantido; falha ao criar a lápide: {e}")
+            return False
+        self.delete_file(gcs_path)
+        
+        # Encerra a transação de leitura: a nova contagem vê as teses criadas nesse intervalo
+        db.session.commit()
+        if self.thesis_blob_refcount(content_hash) > 0:
+            try:
+                self.copy_object(tombstone, gcs_path)
+            except Exception as e:
+                print(f"Aviso: Falha ao restaurar {gcs_path}; conteúdo mantido em {tombstone}: {e}")
+                return False
+            self.delete_file(tombstone)
+            return False
+        
+        self.delete_file(tombstone)
+        self.delete_file(self.fragment_path(gcs_path))
+        return True
+    
+    def ensure_thesis_file(self, gcs_path, file=None):
+        """Confirma, após o commit da tese, que o conteúdo reaproveitado ainda existe.
+        Uma remoção concorrente pode tê-lo apagado depois da verificação do upload;
+        com o arquivo em mãos o conteúdo é regravado. Retorna False se ele não
+        existe e não há arquivo para regravá-lo.
+        """
+        if self.object_exists(gcs_path):
+            return True
+        if file is None:
+            return False
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        self.upload_thesis_file(file)
+        return True
+    
     def upload_petition_file(self, content, user_id, client_id, title):
-        """Salva uma petição gerada"""
+        """Salva uma petição gerada.
+        content pode ser bytes ou um stream (BytesIO/SpooledTemporaryFile).
+        """
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"client_{client_id}/petitions/{timestamp}_{title.replace(' ', '_')}.docx"
-            
-            if self.bucket:
-                # Upload para GCS
-                blob = self.bucket.blob(filename)
-                blob.upload_from_string(content, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                return f"gs://{self.bucket_name}/{filename}"
-            else:
-                # Armazenamento local
-                local_path = os.path.join(self.local_storage_path, filename)
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                with open(local_path, 'wb') as f:
-                    f.write(content)
-                return local_path
+            path = self.petition_object_path(client_id, title)
+            
+            if callable(content):
+                # Conteúdo escrito em streaming direto no destino; falhas não publicam o objeto
+                with self.open_object_writer(path, DOCX_CONTENT_TYPE) as stream:
+                    content(stream)
+                return path
+            
+            return self.write_object(path, content, DOCX_CONTENT_TYPE)
                 
         except Exception as e:
             raise Exception(f"Erro ao salvar petição: {str(e)}")
     
-    def download_file(self, gcs_path):
-        """Baixa um arquivo do GCS ou local"""
+    def petition_object_path(self, client_id, title):
+        """Caminho único para uma nova petição do cliente"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Sufixo aleatório evita colisão entre petições de mesmo título no mesmo segundo (lotes)
+        suffix = uuid.uuid4().hex[:8]
+        return self.object_path(f"client_{client_id}/petitions/{timestamp}_{suffix}_{title.replace(' ', '_')}.docx")
+    
+    def object_path(self, filename):
+        """URI (gs:// ou local://) de um objeto relativo ao storage"""
+        return self.storage.uri(filename)
+    
+    def _object_key(self, path):
+        if not self.storage.owns(path):
+            raise Exception(f"Objeto fora do storage configurado: {path}")
+        return self.storage.key_for(path)
+    
+    def open_object_writer(self, path, content_type):
+        """Abre um stream de escrita (upload resumível em blocos no GCS), publicado ao fechar"""
+        return self.storage.open_writer(self._object_key(path), content_type)
+    
+    def write_object(self, path, content, content_type, if_generation_match=None):
+        """Grava bytes ou um stream de forma atômica e retorna o caminho.
+        if_generation_match: só grava se a geração atual for essa (0 = objeto inexistente).
+        """
+        self.storage.write(self._object_key(path), content, content_type, if_generation_match=if_generation_match)
+        return path
+    
+    def stat_object(self, path):
+        """ObjectInfo (tamanho, geração, atualização) do objeto ou None"""
+        return self.storage.stat(self._object_key(path))
+    
+    def download_stream(self, gcs_path):
+        """Abre um objeto do storage como stream posicionado no início.
+        No GCS, blobs pequenos ficam em memória; acima de DOCUMENT_SPOOL_MAX_BYTES
+        o SpooledTemporaryFile transborda para disco. No disco local o arquivo é
+        lido diretamente. O chamador deve fechar o stream.
+        """
         try:
-            if gcs_path.startswith('gs://'):
-                # Download do GCS
-                if not self.bucket:
-                    raise Exception("Google Cloud Storage não configurado")
-                
-                blob_name = gcs_path.replace(f"gs://{self.bucket_name}/", "")
-                blob = self.bucket.blob(blob_name)
-                
-                # Baixa para arquivo temporário
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-                blob.download_to_filename(temp_file.name)
-                return temp_file.name
-            else:
-                # Arquivo local
-                if os.path.exists(gcs_path):
-                    return gcs_path
-                else:
-                    raise Exception(f"Arquivo não encontrado: {gcs_path}")
-                    
+            return self.storage.open_reader(self._object_key(gcs_path))
         except Exception as e:
             raise Exception(f"Erro ao baixar arquivo: {str(e)}")
     
+    def open_range_stream(self, gcs_path):
+        """Stream com seek que lê do storage só os trechos acessados (ex.: word/document.xml de um .docx)"""
+        try:
+            return self.storage.open_range_reader(self._object_key(gcs_path))
+        except Exception as e:
+            raise Exception(f"Erro ao baixar arquivo: {str(e)}")
+    
+    def open_document(self, gcs_path):
+        """Abre um documento do storage sem passar por arquivo temporário"""
+        with self.download_stream(gcs_path) as stream:
+            return Document(stream)
+    
+    def save_document(self, doc):
+        """Serializa um documento para um buffer em memória (com transbordo para disco)"""
+        buffer = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, suffix='.docx')
+        doc.save(buffer)
+        buffer.seek(0)
+        return buffer
+    
+    def copy_object(self, source_path, destination_path):
+        """Copia um objeto no próprio storage (cópia no servidor no GCS)"""
+        self.storage.copy(self._object_key(source_path), self._object_key(destination_path))
+        return destination_path
+    
+    def object_exists(self, gcs_path):
+        """Indica se o objeto existe no storage"""
+        return self.storage.exists(self._object_key(gcs_path))
+    
     def delete_file(self, gcs_path):
         """Remove um arquivo"""
         try:
-            if gcs_path.startswith('gs://'):
-                # Remove do GCS
-                if self.bucket:
-                    blob_name = gcs_path.replace(f"gs://{self.bucket_name}/", "")
-                    blob = self.bucket.blob(blob_name)
-                    blob.delete()
-            else:
-                # Remove arquivo local
-                if os.path.exists(gcs_path):
-                    os.remove(gcs_path)
-                    
+            self.storage.delete(self._object_key(gcs_path))
         except Exception as e:
             print(f"Aviso: Erro ao remover arquivo {gcs_path}: {e}")
     
-    def generate_petition(self, petition_model_id, form_answers, user_id, client_id, title, process_number=None):
-        """Gera uma petição baseada nas respostas do formulário (UC-01)"""
+    @staticmethod
+    def fragment_path(gcs_path):
+        """Caminho do fragmento compilado armazenado ao lado do .docx original"""
+        base = gcs_path[:-len('.docx')] if gcs_path.endswith('.docx') else gcs_path
+        return f"{base}.fragment.json"
+    
+    def store_thesis_fragment(self, gcs_path, data):
+        """Compila e armazena o fragmento de uma tese. Retorna o fragmento ou None em caso de falha."""
         try:
-            # Busca as perguntas do modelo
-            questions = Question.query.filter_by(petition_model_id=petition_model_id).order_by(Question.order).all()
-            
-            # Identifica as teses relevantes baseadas nas respostas
-            selected_theses = []
-            
-            for question in questions:
-                question_id = str(question.id)
-                if question_id in form_answers:
-                    answer = 'sim' if form_answers[question_id] else 'nao'
-                    
-                    # Busca teses vinculadas a esta resposta
-                    links = ThesisQuestionLink.query.filter_by(
-                        question_id=question.id,
-                        answer=answer
-                    ).all()
-                    
-                    for link in links:
-                        if link.thesis not in selected_theses:
-                            selected_theses.append(link.thesis)
-            
-            if not selected_theses:
-                raise Exception("Nenhuma tese foi selecionada com base nas respostas fornecidas")
-            
+            fragment = compile_fragment(data)
+            self.write_object(self.fragment_path(gcs_path), fragment.to_json(), 'application/json')
+            return fragment
+        except Exception as e:
+            print(f"Aviso: Erro ao compilar fragmento de {gcs_path}: {e}")
+            return None
+    
+    def load_thesis_fragment(self, gcs_path):
+        """Carrega o fragmento armazenado; None se ausente, inválido ou de versão antiga"""
+        try:
+            with self.download_stream(self.fragment_path(gcs_path)) as stream:
+                fragment = DocxFragment.from_json(stream.read())
+        except Exception:
+            return None
+        return fragment if fragment.is_current else None
+    
+    def get_thesis_content(self, thesis):
+        """Retorna o fragmento compilado de uma tese (somente leitura).
+        Ordem: cache em memória -> fragmento armazenado -> compilação do .docx (com backfill).
+        """
+        content = thesis_content_cache.get(thesis)
+        if content is not None:
+            return content
+        
+        content = self.load_thesis_fragment(thesis.gcs_path)
+        if content is None:
+            with self.download_stream(thesis.gcs_path) as stream:
+                data = stream.read()
+            content = self.store_thesis_fragment(thesis.gcs_path, data) or compile_fragment(data)
+        
+        thesis_content_cache.put(thesis, content, content.estimated_size())
+        return content
+    
+    def delete_thesis_file(self, gcs_path):
+        """Remove o arquivo de uma tese e o fragmento compilado"""
+        self.delete_file(gcs_path)
+        self.delete_file(self.fragment_path(gcs_path))
+    
+    def rebuild_thesis_fragments(self, force=False):
+        """Recompila em lote os fragmentos ausentes ou de versão antiga (ou todos, com force)"""
+        rebuilt, skipped, failed = [], 0, []
+        seen = set()
+        for thesis in Thesis.query.all():
+            # Conteúdo compartilhado por várias teses é compilado uma vez
+            if thesis.gcs_path in seen:
+                skipped += 1
+                continue
+            seen.add(thesis.gcs_path)
+            if not force and self.load_thesis_fragment(thesis.gcs_path) is not None:
+                skipped += 1
+                continue
+            try:
+                with self.download_stream(thesis.gcs_path) as stream:
+                    data = stream.read()
+                if self.store_thesis_fragment(thesis.gcs_path, data) is None:
+                    raise Exception("falha na compilação")
+                thesis_content_cache.invalidate(thesis.id)
+                rebuilt.append(thesis.id)
+            except Exception as e:
+                failed.append({'thesis_id': thesis.id, 'error': str(e)})
+        return {'rebuilt': rebuilt, 'skipped': skipped, 'failed': failed}
+    
+    def fetch_theses_content(self, theses):
+        """Obtém o conteúdo de várias teses em paralelo, preservando a ordem.
+        Falhas individuais são agregadas em uma única exceção com o título de cada tese.
+        """
+        contents, errors = self._fetch_theses_by_id(theses)
+        if errors:
+            raise Exception("Falha ao obter teses - " + "; ".join(
+                f"{thesis.title}: {errors[thesis.id]}" for thesis in theses if thesis.id in errors
+            ))
+        
+        return [contents[thesis.id] for thesis in theses]
+    
+    def _write_petition_body(self, doc, append, title, process_number, selected_theses, theses_content):
+        """Escreve título, número do processo e teses em doc (Document ou StreamingDocxWriter).
+        Retorna o texto do que foi escrito, um parágrafo por linha.
+        """
+        lines = []
+        
+        # Adiciona título
+        doc.add_heading(title, 0)
+        lines.append(title)
+        
+        # Adiciona número do processo se fornecido
+        if process_number:
+            doc.add_paragraph(f"Processo nº: {process_number}")
+            lines.append(f"Processo nº: {process_number}")
+        
+        doc.add_paragraph()  # Linha em branco
+        lines.append('')
+        
+        for i, (thesis, thesis_content) in enumerate(zip(selected_theses, theses_content)):
+            # Adiciona cabeçalho da tese
+            doc.add_heading(f"{i+1}. {thesis.title}", 1)
+            lines.append(f"{i+1}. {thesis.title}")
+            
+            # Copia o corpo da tese (tabelas, listas, notas e formatação)
+            append(thesis_content)
+            if thesis_content.body:
+                lines.append(thesis_content.text)
+            
+            # Adiciona espaço entre teses
+            doc.add_paragraph()
+            lines.append('')
+        
+        return '\n'.join(lines)
+    
+    def iter_theses_content(self, theses):
+        """Gera o conteúdo das teses em ordem, buscando no máximo 2 x fetch_workers à frente.
+        Mantém a memória limitada em petições com muitas teses.
+        """
+        window = max(1, self.fetch_workers * 2)
+        with ThreadPoolExecutor(max_workers=max(1, self.fetch_workers), thread_name_prefix='thesis-fetch') as executor:
+            pending = deque()
+            remaining = iter(theses)
+            for thesis in remaining:
+                pending.append((thesis, executor.submit(self.get_thesis_content, thesis)))
+                if len(pending) >= window:
+                    break
+            
+            while pending:
+                thesis, future = pending.popleft()
+                next_thesis = next(remaining, None)
+                if next_thesis is not None:
+                    pending.append((next_thesis, executor.submit(self.get_thesis_content, next_thesis)))
+                try:
+                    yield future.result()
+                except Exception as e:
+                    for _, other in pending:
+                        other.cancel()
+                    raise Exception(f"Falha ao obter teses - {thesis.title}: {e}")
+    
+    @staticmethod
+    def compute_generation_key(petition_model_id, selected_theses, title, process_number=None):
+        """Chave determinística de uma geração: modelo, revisões das teses e cabeçalho"""
+        payload = {
+            'version': GENERATION_KEY_VERSION,
+            'fragment_version': FRAGMENT_FORMAT_VERSION,
+            'petition_model_id': petition_model_id,
+            'theses': [[thesis.id, ThesisContentCache.version_marker(thesis)] for thesis in selected_theses],
+            'title': title,
+            'process_number': process_number or ''
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def reuse_generated_petition(self, generation_key, client_id, title):
+        """Copia o arquivo de uma petição idêntica já gerada.
+        Retorna (novo caminho, texto armazenado ou None), ou (None, None) se não houver.
+        """
+        existing = GeneratedPetition.query.filter_by(
+            generation_key=generation_key, client_id=client_id
+        ).order_by(GeneratedPetition.created_at.desc()).first()
+        if not existing:
+            return None, None
+        
+        try:
+            gcs_path = self.copy_object(existing.gcs_path, self.petition_object_path(client_id, title))
+            return gcs_path, self.stored_petition_text(existing)
+        except Exception as e:
+            print(f"Aviso: Não foi possível reutilizar a petição {existing.id}: {e}")
+            return None, None
+    
+    def render_petition(self, selected_theses, user_id, client_id, title, process_number=None, streaming=None,
+                        theses_content=None):
+        """Mescla as teses selecionadas e envia a petição ao storage.
+        Retorna (caminho, texto extraído). theses_content permite reutilizar
+        fragmentos já obtidos (ex.: geração em lote).
+        """
+        # Petições grandes são escritas em streaming direto para o storage
+        if streaming is None:
+            streaming = len(selected_theses) >= PETITION_STREAMING_MIN_THESES
+        
+        if streaming:
+            written = []
+            
+            def write_petition(stream):
+                with StreamingDocxWriter(stream) as writer:
+                    written.append(self._write_petition_body(
+                        writer, writer.append, title, process_number,
+                        selected_theses,
+                        theses_content if theses_content is not None else self.iter_theses_content(selected_theses)
+                    ))
+            
+            gcs_path = self.upload_petition_file(write_petition, user_id, client_id, title)
+            content_text = written[0]
+        else:
             # Cria o documento final
             final_doc = Document()
             
-            # Adiciona título
-            title_paragraph = final_doc.add_heading(title, 0)
-            
-            # Adiciona número do processo se fornecido
-            if process_number:
-                final_doc.add_paragraph(f"Processo nº: {process_number}")
-            
-            final_doc.add_paragraph()  # Linha em branco
+            # Baixa as teses em paralelo (a ordem do resultado segue a seleção)
+            if theses_content is None:
+                theses_content = self.fetch_theses_content(selected_theses)
             
-            # Mescla as teses selecionadas
-            for i, thesis in enumerate(selected_theses):
-                # Baixa o arquivo da tese
-                thesis_file_path = self.download_file(thesis.gcs_path)
-                
-                try:
-                    # Abre o documento da tese
-                    thesis_doc = Document(thesis_file_path)
-                    
-                    # Adiciona cabeçalho da tese
-                    final_doc.add_heading(f"{i+1}. {thesis.title}", 1)
-                    
-                    # Copia o conteúdo da tese
-                    for paragraph in thesis_doc.paragraphs:
-                        if paragraph.text.strip():  # Ignora parágrafos vazios
-                            new_paragraph = final_doc.add_paragraph(paragraph.text)
-                            # Tenta preservar formatação básica
-                            for run in paragraph.runs:
-                                if run.bold:
-                                    new_paragraph.runs[-1].bold = True
-                                if run.italic:
-                                    new_paragraph.runs[-1].italic = True
-                    
-                    # Adiciona espaço entre teses
-                    final_doc.add_paragraph()
-                    
-                finally:
-                    # Remove arquivo temporário se foi baixado do GCS
-                    if thesis.gcs_path.startswith('gs://') and os.path.exists(thesis_file_path):
-                        os.remove(thesis_file_path)
+            # Mescla as teses selecionadas no nível OOXML
+            merger = DocxMerger(final_doc)
+            content_text = self._write_petition_body(
+                final_doc, merger.append, title, process_number, selected_theses, theses_content
+            )
             
-            # Salva o documento final
-            temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-            final_doc.save(temp_output.name)
+            # Salva o documento final em memória e faz upload
+            with self.save_document(final_doc) as content:
+                gcs_path = self.upload_petition_file(content, user_id, client_id, title)
+        
+        return gcs_path, content_text
+    
+    def generate_petition(self, petition_model_id, form_answers, user_id, client_id, title, process_number=None, streaming=None,
+                          commit=True):
+        """Gera uma petição baseada nas respostas do formulário (UC-01).
+        streaming=None escolhe o modo de saída pelo número de teses (PETITION_STREAMING_MIN_THESES).
+        commit=False deixa a petição pendente na transação do chamador, que a confirma
+        junto com o que mais precisar gravar (ex.: resultado de um job da fila).
+        """
+        try:
+            # Seleciona as teses pelo índice compilado do modelo (sem consultas por pergunta)
+            selection_index = selection_index_cache.get(petition_model_id)
+            selected_theses = selection_index.select(form_answers)
             
-            # Lê o conteúdo do arquivo
-            with open(temp_output.name, 'rb') as f:
-                content = f.read()
+            if not selected_theses:
+                raise Exception("Nenhuma tese foi selecionada com base nas respostas fornecidas")
             
-            # Remove arquivo temporário
-            os.remove(temp_output.name)
+            # Petição idêntica já gerada: copia o arquivo em vez de mesclar de novo
+            generation_key = self.compute_generation_key(petition_model_id, selected_theses, title, process_number)
+            gcs_path, content_text = self.reuse_generated_petition(generation_key, client_id, title)
             
-            # Faz upload da petição gerada
-            gcs_path = self.upload_petition_file(content, user_id, client_id, title)
+            if not gcs_path:
+                gcs_path, content_text = self.render_petition(
+                    selected_theses, user_id, client_id, title, process_number, streaming
+                )
             
             # Salva metadados no banco
             petition = GeneratedPetition(
@@ -220,11 +539,16 @@ class DocumentService:
                 title=title,
                 process_number=process_number,
                 gcs_path=gcs_path,
-                form_data=json.dumps(form_answers)
+                form_data=json.dumps(form_answers),
+                generation_key=generation_key
             )
+            self.set_petition_text(petition, content_text)
             
             db.session.add(petition)
-            db.session.commit()
+            db.session.flush()
+            search_index.index_petition(petition, content_text)
+            if commit:
+                db.session.commit()
             
             return petition
             
@@ -232,6 +556,267 @@ class DocumentService:
             db.session.rollback()
             raise Exception(f"Erro ao gerar petição: {str(e)}")
     
+    def generate_petitions_batch(self, petition_model_id, rows, user_id, client_id):
+        """Gera várias petições do mesmo modelo (ex.: planilha de fim de mês).
+        
+        O índice de seleção é resolvido uma vez, cada tese é obtida uma única vez
+        para todo o lote e as petições são montadas em paralelo. Falhas são
+        reportadas por linha sem interromper as demais.
+        """
+        if len(rows) > PETITION_BATCH_MAX_ROWS:
+            raise Exception(f"Lote excede o limite de {PETITION_BATCH_MAX_ROWS} linhas")
+        
+        selection_index = selection_index_cache.get(petition_model_id)
+        results = [None] * len(rows)
+        groups = {}  # generation_key -> {'theses', 'title', 'process_number', 'rows'}
+        
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results[index] = {'index': index, 'status': 'error', 'error': 'Cada linha deve ser um objeto'}
+                continue
+            form_answers = row.get('form_answers')
+            title = row.get('title')
+            process_number = row.get('process_number')
+            if not form_answers or not title:
+                results[index] = {'index': index, 'status': 'error', 'error': 'form_answers e title são obrigatórios'}
+                continue
+            if not isinstance(form_answers, dict) or not isinstance(title, str):
+                results[index] = {
+                    'index': index, 'status': 'error',
+                    'error': 'form_answers deve ser um objeto e title um texto'
+                }
+                continue
+            
+            selected_theses = selection_index.select(form_answers)
+            if not selected_theses:
+                results[index] = {
+                    'index': index, 'status': 'error',
+                    'error': 'Nenhuma tese foi selecionada com base nas respostas fornecidas'
+                }
+                continue
+            
+            # Linhas idênticas no lote são montadas uma única vez
+            generation_key = self.compute_generation_key(petition_model_id, selected_theses, title, process_number)
+            group = groups.setdefault(generation_key, {
+                'theses': selected_theses, 'title': title, 'process_number': process_number, 'rows': []
+            })
+            group['rows'].append(index)
+        
+        # Obtém uma única vez cada tese usada por alguma linha
+        needed = {}
+        for group in groups.values():
+            for thesis in group['theses']:
+                needed.setdefault(thesis.id, thesis)
+        contents, fetch_errors = self._fetch_theses_by_id(list(needed.values()))
+        
+        def render(generation_key, group):
+            gcs_path, content_text = self.reuse_generated_petition(generation_key, client_id, group['title'])
+            if gcs_path:
+                return gcs_path, content_text
+            
+            missing = [f"{thesis.title}: {fetch_errors[thesis.id]}" for thesis in group['theses'] if thesis.id in fetch_errors]
+            if missing:
+                raise Exception("Falha ao obter teses - " + "; ".join(missing))
+            return self.render_petition(
+                group['theses'], user_id, client_id, group['title'], group['process_number'],
+                theses_content=[contents[thesis.id] for thesis in group['theses']]
+            )
+        
+        # A consulta de deduplicação usa o banco: cada thread tem o próprio contexto da aplicação
+        app = current_app._get_current_object()
+        
+        def render_in_context(generation_key, group):
+            with app.app_context():
+                return render(generation_key, group)
+        
+        max_workers = max(1, min(PETITION_BATCH_WORKERS, len(groups)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='petition-batch') as executor:
+            futures = {
+                generation_key: executor.submit(render_in_context, generation_key, group)
+                for generation_key, group in groups.items()
+            }
+        
+        for generation_key, group in groups.items():
+            error = futures[generation_key].exception()
+            for position, index in enumerate(group['rows']):
+                row = rows[index]
+                if error is not None:
+                    results[index] = {'index': index, 'status': 'error', 'error': str(error)}
+                    continue
+                try:
+                    gcs_path, content_text = futures[generation_key].result()
+                    if position > 0:
+                        # Linha repetida: cópia do arquivo já montado
+                        gcs_path = self.copy_object(gcs_path, self.petition_object_path(client_id, row['title']))
+                    
+                    petition = GeneratedPetition(
+                        user_id=user_id,
+                        client_id=client_id,
+                        title=row['title'],
+                        process_number=row.get('process_number'),
+                        gcs_path=gcs_path,
+                        form_data=json.dumps(row['form_answers']),
+                        generation_key=generation_key
+                    )
+                    self.set_petition_text(petition, content_text)
+                    db.session.add(petition)
+                    db.session.flush()
+                    search_index.index_petition(petition, content_text)
+                    db.session.commit()
+                    results[index] = {'index': index, 'status': 'ok', 'petition': petition.to_dict()}
+                except Exception as e:
+                    db.session.rollback()
+                    results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+        
+        return results
+    
+    def _fetch_theses_by_id(self, theses):
+        """Obtém o conteúdo das teses em paralelo. Retorna (conteúdos, erros), ambos por id."""
+        contents = {}
+        errors = {}
+        if not theses:
+            return contents, errors
+        
+        max_workers = max(1, min(self.fetch_workers, len(theses)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thesis-fetch') as executor:
+            futures = [(thesis, executor.submit(self.get_thesis_content, thesis)) for thesis in theses]
+        
+        for thesis, future in futures:
+            error = future.exception()
+            if error is not None:
+                errors[thesis.id] = str(error)
+            else:
+                contents[thesis.id] = future.result()
+        return contents, errors
+    
+    # ===== Mesclagem de documentos dos usuários =====
+    
+    def merge_documents(self, document_paths, user_id):
+        """Prepara a mesclagem, na ordem dada, de documentos do usuário (users/{uid}/...).
+        
+        Valida caminhos e tamanhos antes de baixar qualquer conteúdo e retorna
+        uma função de escrita: a saída é montada em streaming direto no destino
+        por upload_merged_document, sem manter o documento final em memória.
+        """
+        sources = self._resolve_merge_sources(document_paths, user_id)
+        
+        def write_merged(stream):
+            with StreamingDocxWriter(stream) as writer:
+                for fragment in self.iter_merge_fragments(sources, lambda: writer.retained_bytes):
+                    writer.append(fragment)
+        
+        return write_merged
+    
+    def upload_merged_document(self, merged, filename, user_id):
+        """Grava o documento mesclado em users/{uid}/{filename} e retorna o caminho do blob.
+        merged pode ser a função de escrita de merge_documents, bytes ou um stream.
+        """
+        blob_path = f"users/{user_id}/{filename}"
+        
+        try:
+            # Saída parcial nunca é publicada: o writer descarta o upload em caso de erro
+            with self._user_documents_storage().open_writer(blob_path, DOCX_CONTENT_TYPE) as stream:
+                if callable(merged):
+                    merged(stream)
+                else:
+                    if isinstance(merged, (bytes, bytearray)):
+                        merged = io.BytesIO(merged)
+                    merged.seek(0)
+                    shutil.copyfileobj(merged, stream)
+            return blob_path
+            
+        except Exception as e:
+            raise Exception(f"Erro ao salvar documento mesclado: {str(e)}")
+    
+    def iter_merge_fragments(self, sources, retained_bytes=lambda: 0):
+        """Baixa e compila os documentos em paralelo, entregando os fragmentos em ordem.
+        
+        Cada documento em andamento reserva tamanho x MERGE_MEMORY_EXPANSION do
+        orçamento MERGE_MEMORY_BUDGET_BYTES; novos downloads só começam quando
+        os anteriores já foram gravados na saída e liberaram sua reserva.
+        retained_bytes() informa o que a saída mantém em memória até o fim
+        (estilos, numeração e notas do StreamingDocxWriter) e também conta
+        no orçamento.
+        """
+        max_pending = max(1, self.fetch_workers * 2)
+        with ThreadPoolExecutor(max_workers=max(1, self.fetch_workers), thread_name_prefix='merge-fetch') as executor:
+            pending = deque()
+            reserved = 0
+            try:
+                for blob_path, size in sources:
+                    cost = size * MERGE_MEMORY_EXPANSION
+                    # Aguarda os documentos anteriores até caber no orçamento
+                    while pending and (
+                        reserved + cost + retained_bytes() > MERGE_MEMORY_BUDGET_BYTES or len(pending) >= max_pending
+                    ):
+                        fragment, released = self._next_merge_fragment(pending)
+                        yield fragment
+                        reserved -= released
+                    if cost + retained_bytes() > MERGE_MEMORY_BUDGET_BYTES:
+                        raise Exception("Os documentos excedem o orçamento de memória da mesclagem")
+                    pending.append((blob_path, cost, executor.submit(self._fetch_merge_fragment, blob_path)))
+                    reserved += cost
+                
+                while pending:
+                    fragment, released = self._next_merge_fragment(pending)
+                    yield fragment
+                    reserved -= released
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+    
+    @staticmethod
+    def _next_merge_fragment(pending):
+        blob_path, cost, future = pending.popleft()
+        try:
+            return future.result(), cost
+        except Exception as e:
+            raise Exception(f"Falha ao processar {blob_path.split('/')[-1]}: {e}")
+    
+    def _fetch_merge_fragment(self, blob_path):
+        with self._user_documents_storage().open_reader(blob_path) as stream:
+            return compile_fragment(stream.read())
+    
+    def _resolve_merge_sources(self, document_paths, user_id):
+        """Valida posse, existência e tamanho dos documentos. Retorna [(caminho, tamanho)]."""
+        if not user_id:
+            raise Exception("Usuário não identificado")
+        if len(document_paths) > MERGE_MAX_DOCUMENTS:
+            raise Exception(f"Máximo de {MERGE_MAX_DOCUMENTS} documentos por mesclagem")
+        
+        prefix = f"users/{user_id}/"
+        user_storage = self._user_documents_storage()
+        sources = []
+        total = 0
+        for blob_path in document_paths:
+            if not isinstance(blob_path, str) or not blob_path.startswith(prefix) or '..' in blob_path.split('/'):
+                raise Exception(f"Acesso negado ao documento: {blob_path}")
+            if not blob_path.lower().endswith('.docx'):
+                raise Exception(f"Apenas arquivos .docx podem ser mesclados: {blob_path}")
+            
+            info = user_storage.stat(blob_path)
+            if info is None:
+                raise Exception(f"Documento não encontrado: {blob_path}")
+            size = info.size
+            if size > MERGE_MAX_INPUT_BYTES:
+                raise Exception(f"Documento excede o limite de {MERGE_MAX_INPUT_BYTES // (1024 * 1024)} MB: {blob_path}")
+            if size * MERGE_MEMORY_EXPANSION > MERGE_MEMORY_BUDGET_BYTES:
+                raise Exception(f"Documento grande demais para o orçamento de memória da mesclagem: {blob_path}")
+            
+            total += size
+            if total > MERGE_MAX_TOTAL_BYTES:
+                raise Exception(f"Tamanho total excede o limite de {MERGE_MAX_TOTAL_BYTES // (1024 * 1024)} MB")
+            sources.append((blob_path, size))
+        
+        return sources
+    
+    def _user_documents_storage(self):
+        """Storage dos documentos enviados pelos usuários (Firebase Storage ou o disco local)"""
+        if os.getenv('DOCUMENT_STORAGE') == 'local':
+            return self.storage
+        from src.services.firebase_service import firebase_service
+        return firebase_service.storage
+    
     def get_petition_content(self, petition_id):
         """Retorna o conteúdo de uma petição para visualização/edição (UC-02)"""
         try:
@@ -239,79 +824,155 @@ class DocumentService:
             if not petition:
                 raise Exception("Petição não encontrada")
             
-            # Baixa o arquivo
-            file_path = self.download_file(petition.gcs_path)
+            # Texto armazenado na geração/edição; extrai do arquivo só se faltar
+            content = self.stored_petition_text(petition)
+            if content is None:
+                content = self.extract_petition_text(petition.gcs_path)
+                self.set_petition_text(petition, content)
+                db.session.commit()
+            
+            return {
+                'petition': petition.to_dict(),
+                'content': content
+            }
             
-            try:
-                # Abre o documento
-                doc = Document(file_path)
-                
-                # Extrai o texto
-                content = []
-                for paragraph in doc.paragraphs:
-                    content.append(paragraph.text)
-                
-                return {
-                    'petition': petition.to_dict(),
-                    'content': '\n'.join(content)
-                }
-                
-            finally:
-                # Remove arquivo temporário se necessário
-                if petition.gcs_path.startswith('gs://') and os.path.exists(file_path):
-                    os.remove(file_path)
-                    
         except Exception as e:
             raise Exception(f"Erro ao obter conteúdo da petição: {str(e)}")
     
-    def update_petition_content(self, petition_id, new_content, new_title=None):
-        """Atualiza o conteúdo de uma petição (UC-02)"""
+    def get_petition_paragraphs(self, petition_id, offset=0, limit=100):
+        """Retorna um intervalo de parágrafos da petição, com o total e ids por parágrafo.
+        
+        Os parágrafos vêm do texto armazenado (nunca do storage, salvo no
+        primeiro acesso sem texto) e ficam divididos em cache: páginas
+        seguintes custam só o recorte do intervalo pedido.
+        """
+        petition = GeneratedPetition.query.get(petition_id)
+        if not petition:
+            raise Exception("Petição não encontrada")
+        
+        offset = max(0, int(offset))
+        limit = max(1, min(int(limit), PETITION_PARAGRAPHS_MAX_LIMIT))
+        
+        # A chave muda a cada edição (updated_at) ou troca de arquivo
+        updated_at = petition.updated_at.isoformat() if petition.updated_at else ''
+        key = (petition.id, petition.gcs_path, updated_at)
+        paragraphs = petition_paragraph_cache.get(key)
+        if paragraphs is None:
+            paragraphs = tuple(self.get_petition_content(petition_id)['content'].split('\n'))
+            # Remove versões anteriores da mesma petição
+            petition_paragraph_cache.invalidate(lambda cached: cached[0] == petition.id)
+            petition_paragraph_cache.put(key, paragraphs, sum(len(text) for text in paragraphs) * 2 + 64 * len(paragraphs))
+        
+        page = paragraphs[offset:offset + limit]
+        next_offset = offset + len(page)
+        return {
+            'petition_id': petition.id,
+            'total': len(paragraphs),
+            'offset': offset,
+            'limit': limit,
+            'next_offset': next_offset if next_offset < len(paragraphs) else None,
+            'version': updated_at,
+            'paragraphs': [{'id': offset + i, 'text': text} for i, text in enumerate(page)]
+        }
+    
+    @staticmethod
+    def stored_petition_text(petition):
+        """Texto armazenado da petição, se corresponder ao arquivo atual"""
+        if petition.content_text is not None and petition.content_text_path == petition.gcs_path:
+            return petition.content_text
+        return None
+    
+    @staticmethod
+    def set_petition_text(petition, content_text):
+        petition.content_text = content_text
+        petition.content_text_path = petition.gcs_path if content_text is not None else None
+    
+    def extract_petition_text(self, gcs_path):
+        """Extrai o texto de uma petição do storage, um parágrafo por linha.
+        Lê só o índice do ZIP e o word/document.xml (imagens e demais partes não são baixadas).
+        """
+        with self.open_range_stream(gcs_path) as stream:
+            return extract_document_text(stream)
+    
+    def update_petition_content(self, petition_id, new_content=None, new_title=None, edits=None, user_id=None):
+        """Atualiza o conteúdo de uma petição (UC-02) editando só os parágrafos alterados.
+        
+        new_content: texto completo (mesmo formato de get_petition_content), comparado
+        parágrafo a parágrafo com o armazenado. edits: apenas os intervalos alterados,
+        [{"start", "end", "lines"}] (ver docx_edit.normalize_edits).
+        A formatação dos parágrafos não alterados é preservada e cada edição
+        gera uma revisão no histórico (petition_revisions).
+        """
+        written_bases = []
         try:
             petition = GeneratedPetition.query.get(petition_id)
             if not petition:
                 raise Exception("Petição não encontrada")
             
-            # Cria novo documento com o conteúdo atualizado
-            doc = Document()
-            
-            # Adiciona título
-            title = new_title or petition.title
-            doc.add_heading(title, 0)
-            
-            # Adiciona número do processo se existir
-            if petition.process_number:
-                doc.add_paragraph(f"Processo nº: {petition.process_number}")
-            
-            doc.add_paragraph()  # Linha em branco
-            
-            # Adiciona o conteúdo (divide por linhas)
-            for line in new_content.split('\n'):
-                if line.strip():
-                    doc.add_paragraph(line)
-            
-            # Salva temporariamente
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-            doc.save(temp_file.name)
-            
-            # Lê o conteúdo
-            with open(temp_file.name, 'rb') as f:
-                content = f.read()
-            
-            # Remove arquivo temporário
-            os.remove(temp_file.name)
-            
-            # Remove arquivo antigo
-            self.delete_file(petition.gcs_path)
-            
-            # Faz upload do novo arquivo
-            new_gcs_path = self.upload_petition_file(
-                content, petition.user_id, petition.client_id, title
-            )
-            
-            # Atualiza no banco
-            petition.gcs_path = new_gcs_path
-            if new_title:
+            old_lines = self.get_petition_content(petition_id)['content'].split('\n')
+            if edits is not None:
+                changes = normalize_edits(edits, len(old_lines))
+            else:
+                changes = diff_lines(old_lines, new_content.split('\n'))
+            
+            # Novo título também substitui o cabeçalho, se ele não foi editado
+            if new_title and old_lines and old_lines[0] == petition.title and not any(start == 0 for start, _, _ in changes):
+                changes.insert(0, (0, 1, [new_title]))
+            
+            old_text = '\n'.join(old_lines)
+            content_text = None
+            if changes:
+                # Geração lida antes do download: uma edição concorrente faz a gravação falhar
+                current = self.stat_object(petition.gcs_path)
+                if current is None:
+                    raise Exception("Arquivo da petição não encontrado")
+                
+                source = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, suffix='.docx')
+                output = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, suffix='.docx')
+                with source, output:
+                    with self.download_stream(petition.gcs_path) as stream:
+                        shutil.copyfileobj(stream, source)
+                    source.seek(0)
+                    
+                    # Reescreve só os parágrafos alterados; as demais partes do pacote são copiadas
+                    with DocxParagraphEditor(source) as editor:
+                        if len(editor.paragraphs) != len(old_lines):
+                            raise Exception("Texto armazenado não corresponde ao documento")
+                        editor.apply(changes)
+                        content_text = editor.text()
+                        editor.save(output)
+                    
+                    # Grava no mesmo caminho (substituição atômica, condicionada à geração lida)
+                    output.seek(0)
+                    try:
+                        self.write_object(
+                            petition.gcs_path, output, DOCX_CONTENT_TYPE, if_generation_match=current.generation
+                        )
+                    except GenerationMismatch:
+                        raise Exception("A petição foi alterada por outra edição; recarregue o conteúdo e tente novamente")
+                    
+                    # A gravação condicional confirma que os bytes lidos são os da versão substituída:
+                    # o histórico parte deles (e do arquivo editado), não de cópias feitas depois
+                    source.seek(0)
+                    base = petition_revision_store.ensure_base(petition, old_text, source)
+                    if base is not None:
+                        written_bases.append(base.gcs_path)
+                    
+                    self.set_petition_text(petition, content_text)
+                    # Conteúdo editado deixa de corresponder à geração original
+                    petition.generation_key = None
+                    if new_title:
+                        petition.title = new_title
+                    
+                    output.seek(0)
+                    revision = petition_revision_store.record(petition, changes, old_text, content_text, output, user_id=user_id)
+                    if revision.gcs_path:
+                        written_bases.append(revision.gcs_path)
+            elif new_title:
                 petition.title = new_title
+            
+            if changes or new_title:
+                search_index.index_petition(petition, content_text)
             petition.updated_at = datetime.utcnow()
             
             db.session.commit()
@@ -320,6 +981,9 @@ class DocumentService:
             
         except Exception as e:
             db.session.rollback()
+            # Bases gravadas por uma edição desfeita não pertencem a nenhuma revisão
+            for gcs_path in written_bases:
+                self.delete_file(gcs_path)
             raise Exception(f"Erro ao atualizar petição: {str(e)}")
     
     def list_user_petitions(self, user_id):
@@ -332,13 +996,13 @@ class DocumentService:
             raise Exception(f"Erro ao listar petições: {str(e)}")
     
     def get_petition_file(self, petition_id):
-        """Retorna o caminho do arquivo de uma petição para download"""
+        """Retorna um stream com o arquivo de uma petição para download"""
         try:
             petition = GeneratedPetition.query.get(petition_id)
             if not petition:
                 raise Exception("Petição não encontrada")
             
-            return self.download_file(petition.gcs_path)
+            return self.download_stream(petition.gcs_path)
             
         except Exception as e:
             raise Exception(f"Erro ao obter arquivo da petição: {str(e)}")
@@ -0,0 +1,199 @@
+import difflib
+import shutil
+import zipfile
+from copy import deepcopy
+from lxml import etree
+from docx.oxml.ns import qn
+from src.services.docx_text import W_P, W_R, W_T, iter_paragraph_elements, main_document_member, paragraph_text
+
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+def normalize_edits(edits, paragraph_count):
+    """Valida edições por intervalo e retorna [(start, end, lines)] ordenadas.
+
+    edits: [{"start": i, "end": j, "lines": [...]}] substitui os parágrafos
+    [i:j]; os intervalos referem-se à versão atual e não podem se sobrepor.
+    """
+    normalized = []
+    for edit in edits:
+        try:
+            start, end, new_lines = int(edit['start']), int(edit['end']), list(edit.get('lines') or [])
+        except (KeyError, TypeError, ValueError):
+            raise Exception("Cada edição deve ter start, end e lines")
+        if not 0 <= start <= end <= paragraph_count:
+            raise Exception(f"Intervalo inválido: {start}-{end} (documento com {paragraph_count} parágrafos)")
+        if any(not isinstance(line, str) or '\n' in line for line in new_lines):
+            raise Exception("Cada item de lines deve ser um único parágrafo (texto sem quebras de linha)")
+        normalized.append((start, end, new_lines))
+
+    normalized.sort(key=lambda edit: (edit[0], edit[1]))
+    for previous, current in zip(normalized, normalized[1:]):
+        if current[0] < previous[1]:
+            raise Exception("Edições com intervalos sobrepostos")
+    return normalized
+
+
+def diff_lines(old_lines, new_lines):
+    """Edições [(start, end, lines)] que transformam old_lines em new_lines"""
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        (i1, i2, new_lines[j1:j2])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+
+class DocxParagraphEditor:
+    """Edita os parágrafos de um .docx no lugar, preservando a formatação.
+
+    Os parágrafos seguem a mesma enumeração do texto extraído (um por linha,
+    incluindo células de tabela). Só os parágrafos alterados são reescritos;
+    estilos, numeração, imagens e as demais partes do pacote ficam intactos.
+    """
+
+    def __init__(self, source):
+        self._package = zipfile.ZipFile(source)
+        self.member = main_document_member(self._package)
+        self.root = etree.fromstring(self._package.read(self.member))
+        self.paragraphs = list(iter_paragraph_elements(self.root.find(qn('w:body'))))
+
+    def text(self):
+        """Texto atual do documento, um parágrafo por linha"""
+        body = self.root.find(qn('w:body'))
+        return '\n'.join(paragraph_text(paragraph) for paragraph in iter_paragraph_elements(body))
+
+    def apply(self, edits):
+        """Aplica edições [(start, end, lines)] ordenadas e sem sobreposição (ver normalize_edits)"""
+        # De trás para frente: inserções usam vizinhos ainda não alterados
+        for i1, i2, new in reversed(edits):
+            old = self.paragraphs[i1:i2]
+            paired = min(len(old), len(new))
+
+            for paragraph, text in zip(old[:paired], new[:paired]):
+                set_paragraph_text(paragraph, text)
+
+            if len(new) > paired:
+                anchor = old[paired - 1] if paired else (self.paragraphs[i1 - 1] if i1 > 0 else None)
+                template = anchor if anchor is not None else (self.paragraphs[0] if self.paragraphs else None)
+                for text in reversed(new[paired:]):
+                    self._insert_after(anchor, new_paragraph(template, text))
+
+            for paragraph in old[paired:]:
+                remove_paragraph(paragraph)
+
+        # Índices passam a valer para a versão editada (edições encadeadas)
+        self.paragraphs = list(iter_paragraph_elements(self.root.find(qn('w:body'))))
+
+    def save(self, stream):
+        """Grava o pacote editado em stream; as demais partes são copiadas sem alteração"""
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as output:
+            for info in self._package.infolist():
+                if info.filename == self.member:
+                    output.writestr(info, etree.tostring(self.root, encoding='UTF-8', standalone=True))
+                    continue
+                with self._package.open(info) as source, output.open(info, 'w') as target:
+                    shutil.copyfileobj(source, target)
+
+    def close(self):
+        self._package.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _insert_after(self, anchor, paragraph):
+        if anchor is not None:
+            anchor.addnext(paragraph)
+            return
+        # Sem parágrafo anterior: início do corpo
+        body = self.root.find(qn('w:body'))
+        body.insert(0, paragraph)
+
+
+def set_paragraph_text(paragraph, text):
+    """Substitui o texto de um w:p alterando só o trecho que mudou.
+
+    Prefixo e sufixo comuns permanecem nos runs originais (com sua
+    formatação); o trecho novo entra no run onde a alteração começa.
+    """
+    nodes = list(paragraph.iter(W_T))
+    old = ''.join(node.text or '' for node in nodes)
+    if old == text:
+        return
+
+    if not nodes:
+        run = etree.SubElement(paragraph, W_R)
+        _set_text(etree.SubElement(run, W_T), text)
+        return
+
+    prefix = 0
+    limit = min(len(old), len(text))
+    while prefix < limit and old[prefix] == text[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == text[-1 - suffix]:
+        suffix += 1
+
+    cut_start, cut_end = prefix, len(old) - suffix
+    inserted = text[prefix:len(text) - suffix]
+
+    position = 0
+    target = nodes[-1]
+    for node in nodes:
+        length = len(node.text or '')
+        if position <= prefix < position + length:
+            target = node
+            break
+        position += length
+
+    position = 0
+    for node in nodes:
+        value = node.text or ''
+        start = min(max(cut_start - position, 0), len(value))
+        end = min(max(cut_end - position, 0), len(value))
+        new_value = value[:start] + (inserted if node is target else '') + value[end:]
+        position += len(value)
+        if new_value != value:
+            _set_text(node, new_value)
+
+
+def new_paragraph(template, text):
+    """Novo w:p com as propriedades de parágrafo e do primeiro run do modelo"""
+    paragraph = etree.Element(W_P)
+    if template is not None:
+        paragraph_pr = template.find(qn('w:pPr'))
+        if paragraph_pr is not None:
+            paragraph_pr = deepcopy(paragraph_pr)
+            # Quebra de seção pertence ao parágrafo original
+            for sect_pr in paragraph_pr.findall(qn('w:sectPr')):
+                paragraph_pr.remove(sect_pr)
+            paragraph.append(paragraph_pr)
+
+    run = etree.SubElement(paragraph, W_R)
+    if template is not None:
+        first_run = template.find(W_R)
+        run_pr = first_run.find(qn('w:rPr')) if first_run is not None else None
+        if run_pr is not None:
+            run.append(deepcopy(run_pr))
+    _set_text(etree.SubElement(run, W_T), text)
+    return paragraph
+
+
+def remove_paragraph(paragraph):
+    """Remove um w:p; esvazia em vez de remover quando ele é necessário à estrutura"""
+    parent = paragraph.getparent()
+    has_section_break = paragraph.find(f"{qn('w:pPr')}/{qn('w:sectPr')}") is not None
+    # Células de tabela precisam de ao menos um parágrafo
+    last_in_cell = parent.tag == qn('w:tc') and len(parent.findall(W_P)) == 1
+    if has_section_break or last_in_cell:
+        set_paragraph_text(paragraph, '')
+        return
+    parent.remove(paragraph)
+
+
+def _set_text(node, value):
+    node.text = value
+    if value != value.strip():
+        node.set(XML_SPACE, 'preserve')
@@ -0,0 +1,366 @@
+import base64
+import hashlib
+import io
+import json
+import posixpath
+import zipfile
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from src.services.docx_text import iter_paragraph_elements, paragraph_text
+
+# Incrementar sempre que o compilador mudar de forma incompatível;
+# fragmentos com versão diferente são recompilados a partir do .docx original
+FRAGMENT_FORMAT_VERSION = 1
+
+R_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CT_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+# Notas: (chave no fragmento, tipo de relação, tag de referência, tag da nota)
+NOTE_KINDS = (
+    ('footnotes', RT.FOOTNOTES, 'w:footnoteReference', 'w:footnote'),
+    ('endnotes', RT.ENDNOTES, 'w:endnoteReference', 'w:endnote'),
+)
+
+# Elementos que dependem de partes não copiadas (comentários)
+STRIPPED_TAGS = (qn('w:commentRangeStart'), qn('w:commentRangeEnd'), qn('w:commentReference'))
+
+STYLE_REFERENCE_TAGS = (qn('w:pStyle'), qn('w:rStyle'), qn('w:tblStyle'))
+
+
+class FragmentPart:
+    """Parte do pacote de origem referenciada pelo fragmento (imagem, gráfico, objeto)"""
+
+    def __init__(self, partname, content_type, blob, rels=None):
+        self.partname = partname
+        self.content_type = content_type
+        self.blob = blob
+        self.rels = rels or {}
+
+
+class FragmentRel:
+    """Relação de origem; mesma interface usada pelo DocxMerger ao copiar partes"""
+
+    def __init__(self, reltype, target_ref=None, target_part=None):
+        self.reltype = reltype
+        self.target_ref = target_ref
+        self.target_part = target_part
+
+    @property
+    def is_external(self):
+        return self.target_part is None
+
+
+class DocxFragment:
+    """Conteúdo compilado de um .docx, pronto para ser concatenado em outro documento"""
+
+    def __init__(self, body, styles, nums, abstract_nums, notes, relationships, text, content_hash,
+                 version=FRAGMENT_FORMAT_VERSION):
+        self.body = body                      # elementos do corpo (sem sectPr)
+        self.styles = styles                  # styleId -> w:style
+        self.nums = nums                      # numId -> w:num
+        self.abstract_nums = abstract_nums    # abstractNumId -> w:abstractNum
+        self.notes = notes                    # 'footnotes'/'endnotes' -> {id: elemento}
+        self.relationships = relationships    # escopo ('document', 'footnotes', ...) -> {rId: FragmentRel}
+        self.text = text
+        self.content_hash = content_hash
+        self.version = version
+
+    @property
+    def is_current(self):
+        return self.version == FRAGMENT_FORMAT_VERSION
+
+    def to_json(self):
+        data = {
+            'version': self.version,
+            'content_hash': self.content_hash,
+            'text': self.text,
+            'body': [_serialize(element) for element in self.body],
+            'styles': {key: _serialize(element) for key, element in self.styles.items()},
+            'nums': {key: _serialize(element) for key, element in self.nums.items()},
+            'abstract_nums': {key: _serialize(element) for key, element in self.abstract_nums.items()},
+            'notes': {
+                kind: {key: _serialize(element) for key, element in notes.items()}
+                for kind, notes in self.notes.items()
+            },
+            'relationships': {
+                scope: {rid: _rel_to_dict(rel) for rid, rel in rels.items()}
+                for scope, rels in self.relationships.items()
+            }
+        }
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(
+            body=[parse_xml(xml) for xml in data['body']],
+            styles={key: parse_xml(xml) for key, xml in data['styles'].items()},
+            nums={key: parse_xml(xml) for key, xml in data['nums'].items()},
+            abstract_nums={key: parse_xml(xml) for key, xml in data['abstract_nums'].items()},
+            notes={
+                kind: {key: parse_xml(xml) for key, xml in notes.items()}
+                for kind, notes in data['notes'].items()
+            },
+            relationships={
+                scope: {rid: _rel_from_dict(rel) for rid, rel in rels.items()}
+                for scope, rels in data['relationships'].items()
+            },
+            text=data['text'],
+            content_hash=data['content_hash'],
+            version=data.get('version')
+        )
+
+    def estimated_size(self):
+        """Tamanho aproximado em memória (para caches limitados por bytes)"""
+        size = len(self.text.encode('utf-8'))
+        for element in self.body:
+            size += len(etree.tostring(element))
+        for rels in self.relationships.values():
+            for rel in rels.values():
+                size += _part_size(rel.target_part)
+        return size
+
+
+def compile_fragment(data):
+    """Compila os bytes de um .docx em um DocxFragment (sem python-docx Document)"""
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        reader = _PackageReader(package)
+        document_partname = reader.main_document_partname()
+        document = reader.xml(document_partname)
+
+        body_root = document.find(qn('w:body'))
+        body = [element for element in body_root if element.tag != qn('w:sectPr')]
+        strip_unsupported(body)
+
+        relationships = {'document': reader.relationships(document_partname, body)}
+
+        notes = {}
+        for kind, reltype, ref_tag, note_tag in NOTE_KINDS:
+            referenced = {ref.get(qn('w:id')) for root in body for ref in root.iter(qn(ref_tag))}
+            notes_partname = reader.related_partname(document_partname, reltype)
+            if not referenced or notes_partname is None:
+                continue
+            notes_root = reader.xml(notes_partname)
+            selected = {
+                note.get(qn('w:id')): note for note in notes_root.iter(qn(note_tag))
+                if note.get(qn('w:id')) in referenced
+            }
+            strip_unsupported(selected.values())
+            notes[kind] = selected
+            relationships[kind] = reader.relationships(notes_partname, selected.values())
+
+        note_elements = [note for selected in notes.values() for note in selected.values()]
+
+        styles = {}
+        styles_partname = reader.related_partname(document_partname, RT.STYLES)
+        if styles_partname is not None:
+            styles = _style_closure(reader.xml(styles_partname), body + note_elements)
+
+        nums, abstract_nums = {}, {}
+        numbering_partname = reader.related_partname(document_partname, RT.NUMBERING)
+        if numbering_partname is not None:
+            nums, abstract_nums = _numbering_closure(
+                reader.xml(numbering_partname), body + note_elements + list(styles.values())
+            )
+
+    return DocxFragment(
+        body=body,
+        styles=styles,
+        nums=nums,
+        abstract_nums=abstract_nums,
+        notes=notes,
+        relationships=relationships,
+        text=extract_text(body),
+        content_hash=hashlib.sha256(data).hexdigest()
+    )
+
+
+def extract_text(elements):
+    """Texto simples dos parágrafos (incluindo células de tabela), um por linha (ver docx_text.paragraph_text)"""
+    return '\n'.join(paragraph_text(paragraph) for paragraph in iter_paragraph_elements(elements))
+
+
+def strip_unsupported(elements):
+    for root in elements:
+        for element in list(root.iter(*STRIPPED_TAGS)):
+            element.getparent().remove(element)
+        # Quebras de seção mantêm a página, mas não cabeçalhos/rodapés da origem
+        for sect_pr in root.iter(qn('w:sectPr')):
+            for ref in sect_pr.findall(qn('w:headerReference')) + sect_pr.findall(qn('w:footerReference')):
+                sect_pr.remove(ref)
+
+
+def _style_closure(styles_root, elements):
+    by_id = {style.get(qn('w:styleId')): style for style in styles_root.iter(qn('w:style'))}
+    pending = [ref.get(qn('w:val')) for root in elements for ref in root.iter(*STYLE_REFERENCE_TAGS)]
+    selected = {}
+    while pending:
+        style_id = pending.pop()
+        if style_id in selected or style_id not in by_id:
+            continue
+        style = by_id[style_id]
+        selected[style_id] = style
+        for tag in ('w:basedOn', 'w:link', 'w:next'):
+            dependency = style.find(qn(tag))
+            if dependency is not None:
+                pending.append(dependency.get(qn('w:val')))
+    return selected
+
+
+def _numbering_closure(numbering_root, elements):
+    nums_by_id = {num.get(qn('w:numId')): num for num in numbering_root.iter(qn('w:num'))}
+    abstracts_by_id = {
+        abstract.get(qn('w:abstractNumId')): abstract
+        for abstract in numbering_root.iter(qn('w:abstractNum'))
+    }
+    nums, abstract_nums = {}, {}
+    for root in elements:
+        for ref in root.iter(qn('w:numId')):
+            num_id = ref.get(qn('w:val'))
+            if num_id in nums or num_id not in nums_by_id:
+                continue
+            num = nums_by_id[num_id]
+            nums[num_id] = num
+            abstract_id = num.find(qn('w:abstractNumId')).get(qn('w:val'))
+            if abstract_id in abstracts_by_id:
+                abstract_nums[abstract_id] = abstracts_by_id[abstract_id]
+    return nums, abstract_nums
+
+
+class _PackageReader:
+    """Leitura mínima de um pacote OPC direto do ZIP"""
+
+    def __init__(self, package):
+        self.package = package
+        self.names = set(package.namelist())
+        self._content_types = None
+        self._xml_cache = {}
+
+    def main_document_partname(self):
+        for rel in self._rels_root('/'):
+            if rel.get('Type') == RT.OFFICE_DOCUMENT:
+                return self._resolve('/', rel.get('Target'))
+        raise Exception('Pacote .docx sem documento principal')
+
+    def xml(self, partname):
+        if partname not in self._xml_cache:
+            self._xml_cache[partname] = parse_xml(self.package.read(partname.lstrip('/')))
+        return self._xml_cache[partname]
+
+    def related_partname(self, source_partname, reltype):
+        for rel in self._rels_root(source_partname):
+            if rel.get('Type') == reltype and rel.get('TargetMode') != 'External':
+                return self._resolve(source_partname, rel.get('Target'))
+        return None
+
+    def relationships(self, source_partname, elements):
+        """Relações de source_partname referenciadas por atributos r:* nos elementos"""
+        referenced = set()
+        for root in elements:
+            for element in root.iter():
+                for attr, value in element.attrib.items():
+                    if attr.startswith('{' + R_NAMESPACE + '}'):
+                        referenced.add(value)
+        return self._part_rels(source_partname, set(), referenced)
+
+    def _part_rels(self, source_partname, visiting, only=None):
+        rels = {}
+        visiting = visiting | {source_partname}
+        for rel in self._rels_root(source_partname):
+            if only is not None and rel.get('Id') not in only:
+                continue
+            reltype = rel.get('Type')
+            if rel.get('TargetMode') == 'External':
+                rels[rel.get('Id')] = FragmentRel(reltype, target_ref=rel.get('Target'))
+                continue
+            partname = self._resolve(source_partname, rel.get('Target'))
+            if partname in visiting or partname.lstrip('/') not in self.names:
+                continue
+            rels[rel.get('Id')] = FragmentRel(reltype, target_part=self._part(partname, visiting))
+        return rels
+
+    def _part(self, partname, visiting):
+        return FragmentPart(
+            partname,
+            self._content_type(partname),
+            self.package.read(partname.lstrip('/')),
+            # Só as partes referenciadas pelo corpo são carregadas; as relações delas vêm completas
+            self._part_rels(partname, visiting)
+        )
+
+    def _rels_root(self, source_partname):
+        if source_partname == '/':
+            rels_name = '_rels/.rels'
+        else:
+            directory, filename = posixpath.split(source_partname.lstrip('/'))
+            rels_name = posixpath.join(directory, '_rels', filename + '.rels')
+        if rels_name not in self.names:
+            return []
+        return etree.fromstring(self.package.read(rels_name)).iter(f'{{{PKG_REL_NAMESPACE}}}Relationship')
+
+    def _content_type(self, partname):
+        if self._content_types is None:
+            root = etree.fromstring(self.package.read('[Content_Types].xml'))
+            defaults = {
+                element.get('Extension').lower(): element.get('ContentType')
+                for element in root.iter(f'{{{CT_NAMESPACE}}}Default')
+            }
+            overrides = {
+                element.get('PartName'): element.get('ContentType')
+                for element in root.iter(f'{{{CT_NAMESPACE}}}Override')
+            }
+            self._content_types = (defaults, overrides)
+        defaults, overrides = self._content_types
+        if partname in overrides:
+            return overrides[partname]
+        return defaults.get(posixpath.splitext(partname)[1].lstrip('.').lower(), 'application/octet-stream')
+
+    @staticmethod
+    def _resolve(source_partname, target):
+        if target.startswith('/'):
+            return posixpath.normpath(target)
+        base = '/' if source_partname == '/' else posixpath.dirname(source_partname)
+        return posixpath.normpath(posixpath.join(base, target))
+
+
+def _serialize(element):
+    return etree.tostring(element, encoding='unicode')
+
+
+def _rel_to_dict(rel):
+    if rel.is_external:
+        return {'type': rel.reltype, 'target': rel.target_ref}
+    return {'type': rel.reltype, 'part': _part_to_dict(rel.target_part)}
+
+
+def _rel_from_dict(data):
+    if 'part' not in data:
+        return FragmentRel(data['type'], target_ref=data['target'])
+    return FragmentRel(data['type'], target_part=_part_from_dict(data['part']))
+
+
+def _part_to_dict(part):
+    return {
+        'partname': part.partname,
+        'content_type': part.content_type,
+        'blob': base64.b64encode(part.blob).decode('ascii'),
+        'relationships': {rid: _rel_to_dict(rel) for rid, rel in part.rels.items()}
+    }
+
+
+def _part_from_dict(data):
+    return FragmentPart(
+        data['partname'],
+        data['content_type'],
+        base64.b64decode(data['blob']),
+        {rid: _rel_from_dict(rel) for rid, rel in data['relationships'].items()}
+    )
+
+
+def _part_size(part):
+    if part is None:
+        return 0
+    return len(part.blob) + sum(_part_size(rel.target_part) for rel in part.rels.values())
@@ -0,0 +1,405 @@
+import hashlib
+import io
+import re
+from copy import deepcopy
+from lxml import etree
+from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part, XmlPart
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from src.services.docx_fragments import R_NAMESPACE, compile_fragment
+
+WP_DOCPR = '{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}docPr'
+
+# Notas no destino: (chave no fragmento, tipo de relação, tag de referência, tag da nota, content type, partname, raiz)
+NOTE_PARTS = (
+    ('footnotes', RT.FOOTNOTES, 'w:footnoteReference', 'w:footnote', CT.WML_FOOTNOTES, '/word/footnotes.xml', 'w:footnotes'),
+    ('endnotes', RT.ENDNOTES, 'w:endnoteReference', 'w:endnote', CT.WML_ENDNOTES, '/word/endnotes.xml', 'w:endnotes'),
+)
+
+
+class DocxMerger:
+    """Mescla documentos .docx no nível OOXML.
+
+    Cada fragmento (ver docx_fragments) tem os elementos do corpo copiados
+    direto para o documento de destino. Estilos, numeração, notas, imagens,
+    hyperlinks e demais relações são remapeados uma vez por fragmento anexado,
+    preservando tabelas, listas e formatação.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.body = target.element.body
+        self._next_docpr_id = self._max_int_attr(target.element, WP_DOCPR, 'id') + 1
+        self._next_bookmark_id = self._max_int_attr(target.element, qn('w:bookmarkStart'), qn('w:id')) + 1
+        self._bookmark_names = {element.get(qn('w:name')) for element in target.element.iter(qn('w:bookmarkStart'))}
+        self._numbering = None  # (numbering, próximo abstractNumId, próximo numId, primeiro w:num), lido uma vez
+        self._part_elements = {}  # id(part) -> (part, elemento XML) de partes genéricas do destino
+        self._image_parts = None  # sha1 -> ImagePart do destino (não depende do blob ainda estar em memória)
+        # Partes copiadas dos fragmentos; não mudam depois de criadas e podem ser gravadas de imediato
+        self.new_parts = []
+
+    def append(self, fragment):
+        """Anexa o corpo de um DocxFragment ao final do destino"""
+        elements = [deepcopy(element) for element in fragment.body]
+        if not elements:
+            return
+
+        _FragmentMerge(self, fragment).apply(elements)
+        self._flush_parts()
+
+        sect_pr = self.body.find(qn('w:sectPr'))
+        for element in elements:
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                self.body.append(element)
+
+    def part_element(self, part):
+        """Elemento XML de uma parte do destino; partes genéricas são interpretadas uma única vez"""
+        element = getattr(part, 'element', None)
+        if element is not None:
+            return element
+        if id(part) not in self._part_elements:
+            self._part_elements[id(part)] = (part, parse_xml(part.blob))
+        return self._part_elements[id(part)][1]
+
+    def _flush_parts(self):
+        # Partes sem suporte nativo no python-docx (ex.: notas de rodapé) guardam só o blob
+        for part, element in self._part_elements.values():
+            part._blob = etree.tostring(element, encoding='UTF-8', standalone=True)
+
+    def allocate_docpr_id(self):
+        value = self._next_docpr_id
+        self._next_docpr_id += 1
+        return value
+
+    def allocate_bookmark_id(self):
+        value = self._next_bookmark_id
+        self._next_bookmark_id += 1
+        return value
+
+    def allocate_bookmark_name(self, name):
+        """Nome do marcador no destino: o próprio, ou com sufixo se já existir"""
+        if name not in self._bookmark_names:
+            self._bookmark_names.add(name)
+            return name
+        counter = 2
+        while True:
+            suffix = f'_{counter}'
+            # O Word limita nomes de marcadores a 40 caracteres
+            candidate = name[:40 - len(suffix)] + suffix
+            if candidate not in self._bookmark_names:
+                self._bookmark_names.add(candidate)
+                return candidate
+            counter += 1
+
+    def image_part(self, blob):
+        """ImagePart do destino com o conteúdo blob, criada se ainda não existir"""
+        if self._image_parts is None:
+            self._image_parts = {part.sha1: part for part in self.target.part.package.image_parts}
+        sha1 = hashlib.sha1(blob).hexdigest()
+        part = self._image_parts.get(sha1)
+        if part is None:
+            part = self.target.part.package.get_or_add_image_part(io.BytesIO(blob))
+            self._image_parts[sha1] = part
+            self.new_parts.append(part)
+        return part
+
+    def numbering(self, target_numbering):
+        """Estado da numeração do destino, calculado uma vez por mesclagem (não a cada lista)"""
+        if self._numbering is None or self._numbering[0] is not target_numbering:
+            self._numbering = [
+                target_numbering,
+                self._max_int_attr(target_numbering, qn('w:abstractNum'), qn('w:abstractNumId')) + 1,
+                self._max_int_attr(target_numbering, qn('w:num'), qn('w:numId')) + 1,
+                target_numbering.find(qn('w:num'))
+            ]
+        return self._numbering
+
+    @staticmethod
+    def _max_int_attr(root, tag, attr):
+        values = [0]
+        for element in root.iter(tag):
+            try:
+                values.append(int(element.get(attr)))
+            except (TypeError, ValueError):
+                continue
+        return max(values)
+
+
+class _FragmentMerge:
+    """Estado de remapeamento de um único fragmento"""
+
+    def __init__(self, merger, fragment):
+        self.merger = merger
+        self.fragment = fragment
+        self.target = merger.target
+        self.package = merger.target.part.package
+        self.num_map = {}
+        self.part_map = {}
+        self.rel_map = {}
+
+    def apply(self, elements):
+        new_styles = self.merge_styles(elements)
+        self.merge_numbering(elements + new_styles)
+        self.merge_notes(elements)
+        self.remap_relationships(elements, 'document', self.target.part)
+        self.renumber_ids(elements)
+
+    # ===== Estilos =====
+
+    def merge_styles(self, elements):
+        """Copia para o destino os estilos usados que ele não possui. Retorna os estilos copiados."""
+        target_styles = self.target.styles.element
+        target_ids = {style.get(qn('w:styleId')) for style in target_styles.iter(qn('w:style'))}
+
+        pending = []
+        for root in elements:
+            for tag in ('w:pStyle', 'w:rStyle', 'w:tblStyle'):
+                for ref in root.iter(qn(tag)):
+                    pending.append(ref.get(qn('w:val')))
+
+        copied = []
+        while pending:
+            style_id = pending.pop()
+            if style_id in target_ids or style_id not in self.fragment.styles:
+                continue
+            style = deepcopy(self.fragment.styles[style_id])
+            target_styles.append(style)
+            target_ids.add(style_id)
+            copied.append(style)
+            # Dependências do estilo também precisam existir no destino
+            for tag in ('w:basedOn', 'w:link', 'w:next'):
+                dependency = style.find(qn(tag))
+                if dependency is not None:
+                    pending.append(dependency.get(qn('w:val')))
+
+        return copied
+
+    # ===== Numeração =====
+
+    def merge_numbering(self, elements):
+        references = [
+            ref for root in elements for ref in root.iter(qn('w:numId'))
+            if ref.get(qn('w:val')) not in (None, '0')
+        ]
+        if not references:
+            return
+
+        target_numbering = self._target_numbering()
+        if target_numbering is None:
+            # Sem definições de numeração no destino: listas viram parágrafos simples
+            for ref in references:
+                num_pr = ref.getparent()
+                num_pr.getparent().remove(num_pr)
+            return
+
+        for ref in references:
+            ref.set(qn('w:val'), self._map_num_id(ref.get(qn('w:val')), target_numbering))
+
+    def _map_num_id(self, num_id, target_numbering):
+        if num_id in self.num_map:
+            return self.num_map[num_id]
+
+        source_num = self.fragment.nums.get(num_id)
+        if source_num is None:
+            self.num_map[num_id] = '0'
+            return '0'
+
+        abstract_id = source_num.find(qn('w:abstractNumId')).get(qn('w:val'))
+        source_abstract = self.fragment.abstract_nums.get(abstract_id)
+
+        numbering = self.merger.numbering(target_numbering)
+        new_abstract_id = str(numbering[1])
+        new_num_id = str(numbering[2])
+        numbering[1] += 1
+        numbering[2] += 1
+
+        if source_abstract is not None:
+            abstract = deepcopy(source_abstract)
+            abstract.set(qn('w:abstractNumId'), new_abstract_id)
+            # nsid repetido faria o Word unir listas de teses diferentes
+            nsid = abstract.find(qn('w:nsid'))
+            if nsid is not None:
+                abstract.remove(nsid)
+            # abstractNum precisa vir antes de todos os w:num
+            if numbering[3] is not None:
+                numbering[3].addprevious(abstract)
+            else:
+                target_numbering.append(abstract)
+
+        num = deepcopy(source_num)
+        num.set(qn('w:numId'), new_num_id)
+        num.find(qn('w:abstractNumId')).set(qn('w:val'), new_abstract_id)
+        target_numbering.append(num)
+        if numbering[3] is None:
+            numbering[3] = num
+
+        self.num_map[num_id] = new_num_id
+        return new_num_id
+
+    def _target_numbering(self):
+        try:
+            return self.target.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return None
+
+    # ===== Notas de rodapé / fim =====
+
+    def merge_notes(self, elements):
+        for kind, reltype, ref_tag, note_tag, content_type, partname, root_tag in NOTE_PARTS:
+            references = [ref for root in elements for ref in root.iter(qn(ref_tag))]
+            if not references:
+                continue
+
+            source_notes = self.fragment.notes.get(kind, {})
+            target_part = self._get_or_add_notes_part(reltype, content_type, partname, root_tag, note_tag)
+            target_notes = self.merger.part_element(target_part)
+            next_id = DocxMerger._max_int_attr(target_notes, qn(note_tag), qn('w:id')) + 1
+            id_map = {}
+
+            for ref in references:
+                old_id = ref.get(qn('w:id'))
+                if old_id not in id_map:
+                    source_note = source_notes.get(old_id)
+                    if source_note is None:
+                        ref.getparent().remove(ref)
+                        continue
+                    note = deepcopy(source_note)
+                    note.set(qn('w:id'), str(next_id))
+                    new_styles = self.merge_styles([note])
+                    self.merge_numbering([note] + new_styles)
+                    self.remap_relationships([note], kind, target_part)
+                    target_notes.append(note)
+                    id_map[old_id] = str(next_id)
+                    next_id += 1
+                ref.set(qn('w:id'), id_map[old_id])
+
+    def _get_or_add_notes_part(self, reltype, content_type, partname, root_tag, note_tag):
+        document_part = self.target.part
+        try:
+            return document_part.part_related_by(reltype)
+        except KeyError:
+            pass
+
+        element = parse_xml(
+            f'<{root_tag} {nsdecls("w", "r")}>'
+            f'<{note_tag} w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></{note_tag}>'
+            f'<{note_tag} w:type="continuationSeparator" w:id="0"><w:p><w:r><w:continuationSeparator/></w:r></w:p></{note_tag}>'
+            f'</{root_tag}>'
+        )
+        part = XmlPart(PackURI(partname), content_type, element, self.package)
+        document_part.relate_to(part, reltype)
+        return part
+
+    # ===== Relações (imagens, hyperlinks, objetos) =====
+
+    def remap_relationships(self, elements, scope, target_part):
+        source_rels = self.fragment.relationships.get(scope, {})
+        for root in elements:
+            for element in root.iter():
+                for attr, value in element.attrib.items():
+                    if not attr.startswith('{' + R_NAMESPACE + '}'):
+                        continue
+                    new_rid = self._map_relationship(scope, value, source_rels, target_part)
+                    if new_rid is not None:
+                        element.set(attr, new_rid)
+
+    def _map_relationship(self, scope, rid, source_rels, target_part):
+        key = (scope, rid)
+        if key in self.rel_map:
+            return self.rel_map[key]
+
+        rel = source_rels.get(rid)
+        if rel is None:
+            return None
+
+        if rel.is_external:
+            new_rid = target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        else:
+            new_rid = target_part.relate_to(self._copy_part(rel.target_part), rel.reltype)
+
+        self.rel_map[key] = new_rid
+        return new_rid
+
+    def _copy_part(self, source_part):
+        """Copia uma parte da origem para o pacote de destino (uma vez por fragmento)"""
+        if id(source_part) in self.part_map:
+            return self.part_map[id(source_part)]
+
+        if source_part.content_type.startswith('image/'):
+            # Imagens idênticas são deduplicadas pelo hash no pacote de destino
+            part = self.merger.image_part(source_part.blob)
+            self.part_map[id(source_part)] = part
+            return part
+
+        template = re.sub(r'\d*(\.\w+)$', r'%d\1', source_part.partname)
+        if '%d' not in template:
+            template = template + '%d'
+        partname = self.package.next_partname(template)
+        part = Part(partname, source_part.content_type, source_part.blob, self.package)
+        self.part_map[id(source_part)] = part
+        self.merger.new_parts.append(part)
+
+        # Mantém os mesmos rIds, pois o conteúdo da parte é copiado sem alteração
+        for rid, rel in source_part.rels.items():
+            if rel.is_external:
+                part.load_rel(rel.reltype, rel.target_ref, rid, is_external=True)
+            else:
+                part.load_rel(rel.reltype, self._copy_part(rel.target_part), rid)
+
+        return part
+
+    # ===== Identificadores únicos =====
+
+    def renumber_ids(self, elements):
+        bookmark_map = {}
+        name_map = {}
+        for root in elements:
+            for element in root.iter(WP_DOCPR):
+                element.set('id', str(self.merger.allocate_docpr_id()))
+            for element in root.iter(qn('w:bookmarkStart'), qn('w:bookmarkEnd')):
+                old_id = element.get(qn('w:id'))
+                if old_id not in bookmark_map:
+                    bookmark_map[old_id] = str(self.merger.allocate_bookmark_id())
+                element.set(qn('w:id'), bookmark_map[old_id])
+                name = element.get(qn('w:name'))
+                if name is not None:
+                    new_name = self.merger.allocate_bookmark_name(name)
+                    if new_name != name:
+                        name_map[name] = new_name
+                        element.set(qn('w:name'), new_name)
+        if name_map:
+            self.rename_bookmark_references(elements, name_map)
+
+    @staticmethod
+    def rename_bookmark_references(elements, name_map):
+        """Atualiza hyperlinks internos e campos REF/PAGEREF/NOTEREF para os marcadores renomeados"""
+        field = re.compile(r'\b((?:PAGE|NOTE)?REF\s+)(\S+)')
+
+        def rename_fields(instruction):
+            return field.sub(lambda match: match.group(1) + name_map.get(match.group(2), match.group(2)), instruction)
+
+        for root in elements:
+            for element in root.iter(qn('w:hyperlink')):
+                anchor = element.get(qn('w:anchor'))
+                if anchor in name_map:
+                    element.set(qn('w:anchor'), name_map[anchor])
+            for element in root.iter(qn('w:fldSimple')):
+                element.set(qn('w:instr'), rename_fields(element.get(qn('w:instr'), '')))
+            for element in root.iter(qn('w:instrText')):
+                if element.text:
+                    element.text = rename_fields(element.text)
+
+
+def merge_documents(sources, base=None):
+    """Mescla uma sequência de .docx (bytes ou DocxFragment) em um novo documento"""
+    target = base if base is not None else Document()
+    merger = DocxMerger(target)
+    for source in sources:
+        fragment = compile_fragment(source) if isinstance(source, (bytes, bytearray)) else source
+        merger.append(fragment)
+    return target
@@ -0,0 +1,184 @@
+import tempfile
+import zipfile
+from copy import deepcopy
+from xml.sax.saxutils import quoteattr
+from lxml import etree
+from docx import Document
+from docx.oxml.ns import qn
+from src.services.docx_merge import DocxMerger
+
+CT_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/content-types'
+RELS_CONTENT_TYPE = 'application/vnd.openxmlformats-package.relationships+xml'
+
+BODY_MARKER = 'STREAMING_BODY_MARKER'
+
+
+class StreamingDocxWriter:
+    """Escreve um .docx incrementalmente em um stream (arquivo local ou upload resumível).
+
+    O word/document.xml é gravado no ZIP à medida que os elementos são
+    adicionados; cada elemento é serializado e descartado em seguida. Imagens
+    e demais partes copiadas dos fragmentos vão para um arquivo temporário ao
+    serem anexadas (o ZIP só aceita uma entrada aberta por vez) e são copiadas
+    para o ZIP em close(), sem voltar à memória. Apenas estilos, numeração e
+    notas continuam no documento-esqueleto; retained_bytes estima quanto eles
+    acumularam.
+    """
+
+    def __init__(self, stream):
+        self.skeleton = Document()
+        self.merger = DocxMerger(self.skeleton)
+        self._body = self.skeleton.element.body
+        self._zip = zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._document_entry = None
+        self._document_tail = None
+        self._root_declarations = ()
+        self._spool = tempfile.TemporaryFile()
+        self._spooled_parts = {}  # partname -> (posição, tamanho) no arquivo temporário
+        self._closed = False
+        self.streamed_part_bytes = 0
+        self.retained_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Em caso de erro o arquivo parcial é descartado pelo chamador
+            if self._document_entry is not None:
+                self._document_entry.close()
+            self._zip.close()
+            self._spool.close()
+
+    def add_heading(self, text, level=1):
+        paragraph = self.skeleton.add_heading(text, level)
+        self._flush_body()
+        return paragraph
+
+    def add_paragraph(self, text='', style=None):
+        paragraph = self.skeleton.add_paragraph(text, style)
+        self._flush_body()
+        return paragraph
+
+    def append(self, fragment):
+        """Anexa um DocxFragment e grava seus elementos e partes imediatamente"""
+        self.merger.append(fragment)
+        self._flush_body()
+        self._flush_new_parts()
+        # Estilos, numeração e notas do fragmento que podem ter sido copiados para o esqueleto
+        self.retained_bytes += sum(
+            len(etree.tostring(element))
+            for definitions in (fragment.styles, fragment.nums, fragment.abstract_nums, *fragment.notes.values())
+            for element in definitions.values()
+        )
+
+    def close(self):
+        if self._closed:
+            return
+        self._open_document_entry()
+
+        sect_pr = self._body.find(qn('w:sectPr'))
+        if sect_pr is not None:
+            self._document_entry.write(self._serialize(sect_pr))
+        self._document_entry.write(self._document_tail)
+        self._document_entry.close()
+
+        self._write_remaining_parts()
+        self._zip.close()
+        self._spool.close()
+        self._closed = True
+
+    def _flush_body(self):
+        self._open_document_entry()
+        for element in list(self._body):
+            if element.tag == qn('w:sectPr'):
+                continue
+            self._document_entry.write(self._serialize(element))
+            self._body.remove(element)
+
+    def _flush_new_parts(self):
+        """Move as partes copiadas dos fragmentos para o arquivo temporário, liberando a memória"""
+        new_parts, self.merger.new_parts = self.merger.new_parts, []
+        for part in new_parts:
+            blob = part.blob
+            self._spooled_parts[part.partname] = (self._spool.tell(), len(blob))
+            self._spool.write(blob)
+            self.streamed_part_bytes += len(blob)
+            # Partname, content type e relações continuam no pacote para o [Content_Types].xml
+            part._blob = b''
+            if hasattr(part, '_image'):
+                # ImagePart guarda também o Image com uma cópia do conteúdo
+                part._image = None
+
+    def _write_spooled_part(self, partname):
+        offset, size = self._spooled_parts[partname]
+        self._spool.seek(offset)
+        with self._zip.open(partname.membername, mode='w', force_zip64=True) as entry:
+            remaining = size
+            while remaining:
+                chunk = self._spool.read(min(remaining, 1024 * 1024))
+                entry.write(chunk)
+                remaining -= len(chunk)
+
+    def _serialize(self, element):
+        """Serializa um elemento sem repetir as declarações de namespace já feitas na raiz"""
+        xml = etree.tostring(element)
+        end = xml.index(b'>')
+        start_tag = xml[:end]
+        for declaration in self._root_declarations:
+            start_tag = start_tag.replace(declaration, b'')
+        return start_tag + xml[end:]
+
+    def _open_document_entry(self):
+        if self._document_entry is not None:
+            return
+        # Serializa a raiz com o corpo vazio para obter abertura e fechamento do XML
+        root = deepcopy(self.skeleton.element)
+        body = root.find(qn('w:body'))
+        for child in list(body):
+            body.remove(child)
+        body.text = BODY_MARKER
+        head, tail = etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True).split(
+            BODY_MARKER.encode('ascii')
+        )
+        self._document_tail = tail
+        self._root_declarations = tuple(
+            f' xmlns:{prefix}="{uri}"'.encode('utf-8')
+            for prefix, uri in root.nsmap.items() if prefix is not None
+        )
+
+        document_part = self.skeleton.part
+        self._document_entry = self._zip.open(document_part.partname.membername, mode='w', force_zip64=True)
+        self._document_entry.write(head)
+
+    def _write_remaining_parts(self):
+        package = self.skeleton.part.package
+        document_part = self.skeleton.part
+        parts = list(package.iter_parts())
+
+        self._zip.writestr('[Content_Types].xml', self._content_types_xml(parts))
+        self._zip.writestr('_rels/.rels', package.rels.xml)
+
+        for part in parts:
+            if part.partname in self._spooled_parts:
+                self._write_spooled_part(part.partname)
+            elif part is not document_part:
+                self._zip.writestr(part.partname.membername, part.blob)
+            if len(part.rels):
+                self._zip.writestr(part.partname.rels_uri.membername, part.rels.xml)
+
+    @staticmethod
+    def _content_types_xml(parts):
+        overrides = ''.join(
+            f'<Override PartName={quoteattr(str(part.partname))} ContentType={quoteattr(part.content_type)}/>'
+            for part in parts
+        )
+        return (
+            "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>"
+            f'<Types xmlns="{CT_NAMESPACE}">'
+            f'<Default Extension="rels" ContentType="{RELS_CONTENT_TYPE}"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'{overrides}</Types>'
+        )
@@ -0,0 +1,142 @@
+import io
+import posixpath
+import zipfile
+from collections import namedtuple
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+
+PKG_REL_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+W_P = qn('w:p')
+W_R = qn('w:r')
+W_T = qn('w:t')
+W_BODY = qn('w:body')
+
+# Valores de w:val que desligam uma formatação booleana (w:b, w:i)
+FALSE_VALUES = ('0', 'false', 'off')
+
+TextRun = namedtuple('TextRun', ['text', 'bold', 'italic', 'underline'])
+TextParagraph = namedtuple('TextParagraph', ['text', 'style', 'runs'])
+
+
+def paragraph_text(paragraph):
+    """Texto simples de um w:p (concatenação dos w:t).
+
+    w:tab e w:br são ignorados de propósito: o texto tem um parágrafo por linha
+    (uma quebra viraria uma linha a mais e desalinharia os índices) e o editor
+    (docx_edit) mapeia as posições do texto só sobre os w:t, mantendo tabulações
+    e quebras onde estão. Por isso o texto difere de Paragraph.text do python-docx.
+    """
+    return ''.join(node.text or '' for node in paragraph.iter(W_T))
+
+
+def iter_paragraph_elements(elements):
+    """w:p de blocos do corpo na ordem do texto extraído: o próprio parágrafo ou os de tabelas.
+    Como em iter_paragraphs, parágrafos aninhados em outro (caixas de texto) fazem parte do externo.
+    """
+    for root in elements:
+        if root.tag == W_P:
+            yield root
+            continue
+        for paragraph in root.iter(W_P):
+            ancestor = paragraph.getparent()
+            while ancestor is not root and ancestor.tag != W_P:
+                ancestor = ancestor.getparent()
+            if ancestor is root:
+                yield paragraph
+
+
+def iter_paragraphs(source, with_runs=True):
+    """Gera os parágrafos do documento principal de um .docx em ordem, com memória constante.
+
+    source pode ser um caminho, bytes ou um stream binário com seek. O
+    word/document.xml é lido com iterparse direto do ZIP: cada parágrafo é
+    descartado depois de entregue, sem montar o modelo do python-docx.
+    Parágrafos de células de tabela são entregues na ordem do documento.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    with zipfile.ZipFile(source) as package:
+        with package.open(main_document_member(package)) as document_xml:
+            # Profundidade de w:p abertos: parágrafos aninhados (caixas de texto) fazem parte do externo
+            depth = 0
+            for event, element in etree.iterparse(document_xml, events=('start', 'end')):
+                if element.tag == W_P:
+                    if event == 'start':
+                        depth += 1
+                        continue
+                    depth -= 1
+                    if depth:
+                        continue
+                    yield _read_paragraph(element, with_runs)
+
+                if event == 'end' and not depth:
+                    parent = element.getparent()
+                    if element.tag == W_P or (parent is not None and parent.tag == W_BODY):
+                        _release(element)
+
+
+def extract_document_text(source):
+    """Texto do documento principal, um parágrafo por linha (mesmo formato de docx_fragments.extract_text)"""
+    return '\n'.join(paragraph.text for paragraph in iter_paragraphs(source, with_runs=False))
+
+
+def _release(element):
+    """Libera um elemento já processado e, no corpo, os irmãos anteriores"""
+    element.clear()
+    parent = element.getparent()
+    if parent is not None and parent.tag == W_BODY:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _read_paragraph(paragraph, with_runs):
+    style = paragraph.find(f"{qn('w:pPr')}/{qn('w:pStyle')}")
+    style_id = style.get(qn('w:val')) if style is not None else None
+
+    if not with_runs:
+        return TextParagraph(paragraph_text(paragraph), style_id, ())
+
+    runs = []
+    for run in paragraph.iter(W_R):
+        text = ''.join(node.text or '' for node in run.findall(W_T))
+        if not text:
+            continue
+        run_pr = run.find(qn('w:rPr'))
+        runs.append(TextRun(
+            text,
+            _is_on(run_pr, 'w:b'),
+            _is_on(run_pr, 'w:i'),
+            _underline(run_pr)
+        ))
+    return TextParagraph(''.join(run.text for run in runs), style_id, tuple(runs))
+
+
+def _is_on(run_pr, tag):
+    if run_pr is None:
+        return False
+    element = run_pr.find(qn(tag))
+    if element is None:
+        return False
+    return (element.get(qn('w:val')) or 'true').lower() not in FALSE_VALUES
+
+
+def _underline(run_pr):
+    if run_pr is None:
+        return False
+    element = run_pr.find(qn('w:u'))
+    return element is not None and element.get(qn('w:val')) not in (None, 'none')
+
+
+def main_document_member(package):
+    """Nome no ZIP do documento principal, segundo _rels/.rels"""
+    try:
+        root = etree.fromstring(package.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for rel in root.iter(f'{{{PKG_REL_NAMESPACE}}}Relationship'):
+        if rel.get('Type') == RT.OFFICE_DOCUMENT:
+            return posixpath.normpath(rel.get('Target')).lstrip('/')
+    return 'word/document.xml'
@@ -0,0 +1,216 @@
+import base64
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from firebase_admin import auth
+from google.auth import crypt
+from src.config.firebase_settings import FIREBASE_PROJECT_ID
+
+# Certificados públicos (kid -> PEM X.509) que assinam os ID tokens do Firebase
+FIREBASE_CERTS_URL = os.getenv(
+    'FIREBASE_CERTS_URL',
+    'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+)
+# Arquivo com os certificados no mesmo formato JSON; quando definido, nenhuma chave é buscada na rede
+FIREBASE_KEYS_FILE = os.getenv('FIREBASE_KEYS_FILE')
+# Renovação antecipada (s) em relação ao max-age informado pelo Cache-Control
+FIREBASE_KEYS_REFRESH_MARGIN = int(os.getenv('FIREBASE_KEYS_REFRESH_MARGIN', '300'))
+# Intervalo (s) entre tentativas quando a busca falha, e max-age assumido sem Cache-Control
+FIREBASE_KEYS_RETRY_SECONDS = int(os.getenv('FIREBASE_KEYS_RETRY_SECONDS', '30'))
+FIREBASE_KEYS_DEFAULT_MAX_AGE = int(os.getenv('FIREBASE_KEYS_DEFAULT_MAX_AGE', '3600'))
+# Intervalo mínimo (s) entre buscas forçadas por um kid desconhecido (rotação de chaves)
+FIREBASE_KEYS_MIN_REFRESH_SECONDS = int(os.getenv('FIREBASE_KEYS_MIN_REFRESH_SECONDS', '60'))
+FIREBASE_KEYS_FETCH_TIMEOUT = float(os.getenv('FIREBASE_KEYS_FETCH_TIMEOUT', '10'))
+# Tolerância (s) de relógio nas verificações de iat/auth_time/exp
+FIREBASE_TOKEN_CLOCK_SKEW = int(os.getenv('FIREBASE_TOKEN_CLOCK_SKEW', '5'))
+
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+class FirebaseKeyManager:
+    """Chaves públicas do Firebase Authentication e verificação local de ID tokens.
+
+    As chaves são buscadas na inicialização (start) e renovadas em segundo
+    plano antes do max-age do Cache-Control, de modo que nenhuma requisição
+    espera pela busca. A verificação repete as checagens do firebase_admin
+    (RS256, kid, aud, iss, sub, iat, auth_time, exp) sobre as chaves em
+    memória. Com FIREBASE_KEYS_FILE as chaves vêm do arquivo e a rede nunca
+    é usada. Enquanto nenhuma chave pôde ser carregada (ex.: sem rede na
+    inicialização), os tokens são verificados pelo SDK.
+    """
+
+    def __init__(self, project_id=FIREBASE_PROJECT_ID, certs_url=FIREBASE_CERTS_URL, keys_file=FIREBASE_KEYS_FILE):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.certs_url = certs_url
+        self.keys_file = keys_file
+        self._verifiers = {}  # kid -> RSAVerifier
+        self._expires_at = 0
+        self._last_fetch = float('-inf')
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.sdk_verifications = 0
+
+    # ===== CHAVES =====
+
+    def start(self):
+        """Carrega as chaves e inicia a renovação em segundo plano (uma vez por processo)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name='firebase-keys', daemon=True)
+        try:
+            self.refresh()
+        except Exception as e:
+            # Sem chaves, a primeira verificação tenta de novo; o thread segue tentando
+            print(f"Aviso: Chaves do Firebase não carregadas na inicialização: {e}")
+        if not self.keys_file:
+            self._thread.start()
+
+    def stop(self):
+        self._wakeup.set()
+
+    def refresh(self):
+        """Recarrega as chaves (do arquivo ou da URL). Retorna o número de chaves."""
+        with self._lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        self._last_fetch = time.monotonic()
+        try:
+            if self.keys_file:
+                with open(self.keys_file, encoding='utf-8') as f:
+                    certs = json.load(f)
+                max_age = None
+            else:
+                certs, max_age = self._fetch()
+            verifiers = {kid: crypt.RSAVerifier.from_string(pem) for kid, pem in certs.items()}
+            if not verifiers:
+                raise Exception("Nenhuma chave recebida")
+        except Exception:
+            self.fetch_failures += 1
+            raise
+
+        self.fetches += 1
+        self._verifiers = verifiers
+        self._expires_at = time.monotonic() + max_age if max_age is not None else float('inf')
+        return len(verifiers)
+
+    def _fetch(self):
+        with urllib.request.urlopen(self.certs_url, timeout=FIREBASE_KEYS_FETCH_TIMEOUT) as response:
+            certs = json.loads(response.read())
+            match = MAX_AGE_PATTERN.search(response.headers.get('Cache-Control') or '')
+            max_age = int(match.group(1)) if match else FIREBASE_KEYS_DEFAULT_MAX_AGE
+            # Resposta vinda de cache intermediário já consumiu parte do max-age
+            max_age -= int(response.headers.get('Age') or 0)
+        return certs, max(max_age, 0)
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                delay = self._expires_at - FIREBASE_KEYS_REFRESH_MARGIN - time.monotonic()
+            if self._wakeup.wait(max(delay, FIREBASE_KEYS_MIN_REFRESH_SECONDS)):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Aviso: Falha ao renovar as chaves do Firebase: {e}")
+                # Mantém as chaves atuais (seguem válidas por um tempo após a rotação) e tenta de novo
+                if self._wakeup.wait(FIREBASE_KEYS_RETRY_SECONDS):
+                    return
+
+    def _verifier_for(self, kid):
+        """Verificador da chave kid (None se desconhecida).
+        Levanta CertificateFetchError se nenhuma chave pôde ser carregada.
+        """
+        verifier = self._verifiers.get(kid)
+        if verifier is not None:
+            return verifier
+        # Kid desconhecido: chaves ainda não carregadas ou rotacionadas antes da renovação
+        with self._lock:
+            verifier = self._verifiers.get(kid)
+            # Sem chaves, a busca é repetida a cada FIREBASE_KEYS_RETRY_SECONDS (o SDK verifica nesse intervalo)
+            interval = FIREBASE_KEYS_MIN_REFRESH_SECONDS if self._verifiers else FIREBASE_KEYS_RETRY_SECONDS
+            error = None
+            if verifier is None and time.monotonic() - self._last_fetch >= interval:
+                try:
+                    self._refresh_locked()
+                except Exception as e:
+                    error = e
+                verifier = self._verifiers.get(kid)
+            if not self._verifiers:
+                raise auth.CertificateFetchError(f"Chaves do Firebase indisponíveis: {error}", error)
+        return verifier
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._verifiers),
+                'source': self.keys_file or self.certs_url,
+                'expires_in': None if self._expires_at == float('inf') else round(self._expires_at - time.monotonic()),
+                'fetches': self.fetches,
+                'fetch_failures': self.fetch_failures,
+                'sdk_verifications': self.sdk_verifications
+            }
+
+    # ===== VERIFICAÇÃO =====
+
+    def verify(self, token):
+        """Claims de um ID token do Firebase verificado localmente (mesmo formato do firebase_admin)"""
+        try:
+            header_part, payload_part, signature_part = token.split('.')
+            header = json.loads(_b64decode(header_part))
+            claims = json.loads(_b64decode(payload_part))
+            signature = _b64decode(signature_part)
+        except (AttributeError, ValueError):
+            raise auth.InvalidIdTokenError("ID token malformado")
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise auth.InvalidIdTokenError("ID token malformado")
+
+        if header.get('alg') != 'RS256':
+            raise auth.InvalidIdTokenError("ID token com algoritmo diferente de RS256")
+        kid = header.get('kid')
+        if not kid:
+            raise auth.InvalidIdTokenError("ID token sem kid")
+        try:
+            verifier = self._verifier_for(kid)
+        except auth.CertificateFetchError:
+            # Nenhuma chave em memória: o SDK busca as chaves e verifica o token por conta própria
+            with self._lock:
+                self.sdk_verifications += 1
+            return auth.verify_id_token(token)
+        if verifier is None or not verifier.verify(f"{header_part}.{payload_part}".encode('ascii'), signature):
+            raise auth.InvalidIdTokenError("Assinatura do ID token inválida")
+
+        now = time.time()
+        if claims.get('aud') != self.project_id:
+            raise auth.InvalidIdTokenError("ID token emitido para outro projeto (aud)")
+        if claims.get('iss') != self.issuer:
+            raise auth.InvalidIdTokenError("ID token com emissor inválido (iss)")
+        subject = claims.get('sub')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError("ID token com sub inválido")
+        if not isinstance(claims.get('iat'), (int, float)) or claims['iat'] > now + FIREBASE_TOKEN_CLOCK_SKEW:
+            raise auth.InvalidIdTokenError("ID token emitido no futuro (iat)")
+        if not isinstance(claims.get('auth_time'), (int, float)) or claims['auth_time'] > now + FIREBASE_TOKEN_CLOCK_SKEW:
+            raise auth.InvalidIdTokenError("ID token com auth_time ausente ou no futuro")
+        if not isinstance(claims.get('exp'), (int, float)):
+            raise auth.InvalidIdTokenError("ID token sem exp")
+        if claims['exp'] <= now - FIREBASE_TOKEN_CLOCK_SKEW:
+            raise auth.ExpiredIdTokenError("ID token expirado", None)
+
+        claims['uid'] = subject
+        return claims
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+firebase_key_manager = FirebaseKeyManager()
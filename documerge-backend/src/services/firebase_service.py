@@ -1,13 +1,16 @@
 import firebase_admin
-from firebase_admin import credentials, auth, storage, firestore
+from firebase_admin import credentials, storage, firestore
 import os
 from src.config.firebase_config import FIREBASE_PROJECT_ID, SERVICE_ACCOUNT_KEY_PATH, STORAGE_BUCKET
+from src.services.storage_backends import create_storage_backend
+from src.services.token_verifier import FirebaseTokenVerifier, token_verifier
 
 class FirebaseService:
     def __init__(self):
         self.app = None
         self.bucket = None
         self.db = None
+        self.storage = None
         self.initialize_firebase()
     
     def initialize_firebase(self):
@@ -22,11 +25,13 @@ class FirebaseService:
                 if os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
                     cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
                     self.app = firebase_admin.initialize_app(cred, {
+                        'projectId': FIREBASE_PROJECT_ID,
                         'storageBucket': STORAGE_BUCKET
                     })
                 else:
                     # Use default credentials (for Cloud Run or when GOOGLE_APPLICATION_CREDENTIALS is set)
                     self.app = firebase_admin.initialize_app(options={
+                        'projectId': FIREBASE_PROJECT_ID,
                         'storageBucket': STORAGE_BUCKET
                     })
             except Exception as e:
@@ -48,72 +53,48 @@ class FirebaseService:
         else:
             self.bucket = None
             self.db = None
+        
+        # User files go to the Firebase bucket, or to the local disk backend when it is unavailable
+        self.storage = create_storage_backend(self.bucket, STORAGE_BUCKET)
     
     def verify_token(self, id_token):
-        """Verify Firebase ID token"""
-        if not self.app:
+        """Verify Firebase ID token (or a local test token when AUTH_TOKEN_VERIFIER=local)"""
+        if not self.app and isinstance(token_verifier, FirebaseTokenVerifier):
             return None
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = token_verifier.verify(id_token)
             return decoded_token
         except Exception as e:
             print(f"Token verification error: {e}")
             return None
     
     def upload_file(self, file_stream, filename, user_id=None):
-        """Upload file to Firebase Storage"""
-        if not self.bucket:
-            # Mock implementation for development
-            print(f"Mock: Would upload file {filename} for user {user_id}")
-            return f"users/{user_id}/{filename}" if user_id else filename
-        
+        """Upload file to user storage"""
         try:
             # Create user-specific path if user_id provided
             blob_path = f"users/{user_id}/{filename}" if user_id else filename
-            blob = self.bucket.blob(blob_path)
-            blob.upload_from_file(file_stream)
+            self.storage.write(blob_path, file_stream, content_type=getattr(file_stream, 'mimetype', None))
             return blob_path
         except Exception as e:
             print(f"File upload error: {e}")
             return None
     
     def download_file(self, blob_path):
-        """Download file from Firebase Storage"""
-        if not self.bucket:
-            # Mock implementation for development
-            print(f"Mock: Would download file {blob_path}")
-            return None
-        
+        """Download file from user storage"""
         try:
-            blob = self.bucket.blob(blob_path)
-            return blob.download_as_bytes()
+            with self.storage.open_reader(blob_path) as stream:
+                return stream.read()
         except Exception as e:
             print(f"File download error: {e}")
             return None
     
     def list_user_files(self, user_id):
         """List files for a specific user"""
-        if not self.bucket:
-            # Mock implementation for development
-            print(f"Mock: Would list files for user {user_id}")
+        try:
             return [
-                {
-                    'name': 'sample_document1.docx',
-                    'path': f'users/{user_id}/sample_document1.docx',
-                    'size': 12345,
-                    'updated': '2024-01-01T00:00:00Z'
-                },
-                {
-                    'name': 'sample_document2.docx',
-                    'path': f'users/{user_id}/sample_document2.docx',
-                    'size': 23456,
-                    'updated': '2024-01-02T00:00:00Z'
-                }
+                {'name': info.key.split('/')[-1], 'path': info.key, 'size': info.size, 'updated': info.updated}
+                for info in self.storage.list(prefix=f"users/{user_id}/")
             ]
-        
-        try:
-            blobs = self.bucket.list_blobs(prefix=f"users/{user_id}/")
-            return [{'name': blob.name.split('/')[-1], 'path': blob.name, 'size': blob.size, 'updated': blob.updated} for blob in blobs]
         except Exception as e:
             print(f"Error listing files: {e}")
             return []
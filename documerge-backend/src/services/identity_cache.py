@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from src.models.user import db, User
+
+# Tempo máximo (s) que a identidade de um usuário fica em cache. A invalidação explícita só
+# atinge o processo local: em outros workers um usuário desativado ou com papel alterado
+# continua sendo servido pelo cache por até esse tempo. Papel e ativação de administradores
+# não passam pelo cache (PRIVILEGED_ROLES), então a defasagem nunca concede acesso administrativo
+USER_IDENTITY_CACHE_TTL = float(os.getenv('USER_IDENTITY_CACHE_TTL', '30'))
+# Usuários mantidos em cache por processo (0 desliga o cache)
+USER_IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv('USER_IDENTITY_CACHE_MAX_ENTRIES', '10000'))
+
+# Papéis cujo papel e ativação são sempre relidos do banco (decisões de administração)
+PRIVILEGED_ROLES = ('advogado_administrador', 'dev')
+FRESH_PRIVILEGED_FIELDS = ('role', 'is_active')
+
+# Campos usados pelos decorators de autenticação e pela maioria das rotas
+UserIdentity = namedtuple('UserIdentity', ['id', 'firebase_uid', 'email', 'role', 'is_active', 'two_factor_enabled'])
+
+
+class CachedUser:
+    """Usuário da requisição montado a partir da identidade em cache.
+
+    Os campos de UserIdentity são servidos sem consulta ao banco; qualquer
+    outro atributo (to_dict, must_change_password, ...) ou alteração carrega
+    o User da sessão atual na primeira vez e passa a delegar a ele. Para
+    identidades com papel administrativo, role e is_active também vêm do
+    banco: rebaixamento ou desativação feitos em outro worker valem na hora.
+    """
+
+    def __init__(self, identity, user=None):
+        self._identity = identity
+        self._user = user
+
+    def _load(self):
+        if self._user is None:
+            self._user = db.session.get(User, self._identity.id)
+            if self._user is None:
+                raise Exception("Usuário não encontrado")
+        return self._user
+
+    def __getattr__(self, name):
+        # Chamado só para atributos inexistentes no proxy
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in UserIdentity._fields and self._user is None and not (
+            name in FRESH_PRIVILEGED_FIELDS and self._identity.role in PRIVILEGED_ROLES
+        ):
+            return getattr(self._identity, name)
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._load(), name, value)
+
+    def __repr__(self):
+        return f'<User {self._identity.email}>'
+
+
+class UserIdentityCache:
+    """Cache por processo, com TTL, de identidades de usuário por firebase_uid.
+
+    Evita a consulta ao banco feita a cada requisição autenticada só para
+    ler papel, is_active e two_factor_enabled. Os métodos do AuthService que
+    alteram esses campos invalidam a entrada; em outros workers a mudança é
+    vista em até USER_IDENTITY_CACHE_TTL segundos (exceto papel e ativação
+    de administradores, relidos do banco por CachedUser).
+    """
+
+    def __init__(self, ttl=USER_IDENTITY_CACHE_TTL, max_entries=USER_IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # firebase_uid -> (UserIdentity, válida até)
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação: leituras do banco em andamento não repõem entradas removidas
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_user(self, firebase_uid, load):
+        """Usuário da requisição (CachedUser) ou None.
+        load(firebase_uid) busca o User no banco quando a identidade não está em cache.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(firebase_uid)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(firebase_uid)
+                    self.hits += 1
+                    return CachedUser(entry[0])
+                del self._entries[firebase_uid]
+                self.expired += 1
+            self.misses += 1
+            epoch = self._epoch
+
+        user = load(firebase_uid)
+        if user is None:
+            return None
+        self._put(user, epoch)
+        return CachedUser(self.identity_of(user), user)
+
+    @staticmethod
+    def identity_of(user):
+        return UserIdentity(
+            user.id, user.firebase_uid, user.email, user.role, bool(user.is_active), bool(user.two_factor_enabled)
+        )
+
+    def _put(self, user, epoch):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        identity = self.identity_of(user)
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._entries[identity.firebase_uid] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.firebase_uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, firebase_uid):
+        """Remove a identidade de um usuário (chamado após alterar papel, ativação ou 2FA)"""
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(firebase_uid, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+user_identity_cache = UserIdentityCache()
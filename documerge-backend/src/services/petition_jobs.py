@@ -0,0 +1,249 @@
+import json
+import os
+import signal
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, update
+from src.models.user import db, PetitionJob
+from src.services.document_service import document_service
+
+# Workers iniciados dentro do processo web (0 = apenas o entry point separado processa jobs)
+PETITION_JOB_WORKERS = int(os.getenv('PETITION_JOB_WORKERS', '0'))
+# '1' quando o entry point separado (python -m src.worker) está implantado consumindo o mesmo banco
+PETITION_JOB_EXTERNAL_WORKER = os.getenv('PETITION_JOB_EXTERNAL_WORKER', '0') == '1'
+# Intervalo de consulta à fila quando não há jobs
+PETITION_JOB_POLL_SECONDS = float(os.getenv('PETITION_JOB_POLL_SECONDS', '2'))
+# Duração da reserva de um job; renovada enquanto o worker estiver vivo
+PETITION_JOB_LEASE_SECONDS = int(os.getenv('PETITION_JOB_LEASE_SECONDS', '120'))
+# Tentativas máximas de um job cujo worker morreu no meio do processamento
+PETITION_JOB_MAX_ATTEMPTS = int(os.getenv('PETITION_JOB_MAX_ATTEMPTS', '3'))
+
+
+class PetitionJobQueue:
+    """Fila de geração de petições persistida no banco (funciona com SQLite).
+
+    Um job é reservado com um UPDATE condicional, de modo que apenas um worker
+    o obtém mesmo com vários processos consultando a fila. A reserva expira se
+    o worker parar de renová-la (reinício, crash), e o job volta a ser elegível.
+    """
+
+    def enqueue(self, petition_model_id, form_answers, user_id, client_id, title, process_number=None):
+        job = PetitionJob(
+            user_id=user_id,
+            client_id=client_id,
+            petition_model_id=petition_model_id,
+            title=title,
+            process_number=process_number,
+            form_data=json.dumps(form_answers),
+            status='queued'
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def get_job(self, job_id):
+        return db.session.get(PetitionJob, job_id)
+
+    def claim_next(self, worker_id):
+        """Reserva o próximo job elegível para o worker. Retorna o job ou None."""
+        now = datetime.utcnow()
+        self._fail_abandoned(now)
+
+        claimable = and_(
+            or_(
+                PetitionJob.status == 'queued',
+                and_(PetitionJob.status == 'running', PetitionJob.locked_until < now)
+            ),
+            PetitionJob.attempts < PETITION_JOB_MAX_ATTEMPTS
+        )
+        candidates = db.session.query(PetitionJob.id).filter(claimable).order_by(PetitionJob.id).limit(5).all()
+
+        for (job_id,) in candidates:
+            result = db.session.execute(
+                update(PetitionJob)
+                .where(PetitionJob.id == job_id, claimable)
+                .values(
+                    status='running',
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=PETITION_JOB_LEASE_SECONDS),
+                    attempts=PetitionJob.attempts + 1,
+                    started_at=now,
+                    error=None
+                )
+            )
+            db.session.commit()
+            # Outro worker pode ter reservado o mesmo job entre a consulta e o UPDATE
+            if result.rowcount == 1:
+                return db.session.get(PetitionJob, job_id, populate_existing=True)
+
+        return None
+
+    def renew_lease(self, job_id, worker_id):
+        """Estende a reserva de um job em execução. Retorna False se o worker a perdeu."""
+        result = db.session.execute(
+            update(PetitionJob)
+            .where(PetitionJob.id == job_id, PetitionJob.locked_by == worker_id, PetitionJob.status == 'running')
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=PETITION_JOB_LEASE_SECONDS))
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def run_job(self, job, worker_id, lease_lost=None):
+        """Gera a petição do job e registra o resultado.
+
+        A petição e o resultado do job são confirmados na mesma transação, e
+        só se o worker ainda detém a reserva; caso contrário (lease_lost
+        sinalizado ou job já reservado por outro worker) a transação é desfeita
+        e o arquivo gerado é removido. Um worker que morre antes do commit não
+        deixa petição no banco (só o arquivo já enviado, sem registro): o job
+        volta à fila e a petição é registrada uma única vez.
+        Retorna True se o resultado foi gravado.
+        """
+        job_id = job.id
+        gcs_path = None
+        try:
+            petition = document_service.generate_petition(
+                petition_model_id=job.petition_model_id,
+                form_answers=json.loads(job.form_data),
+                user_id=job.user_id,
+                client_id=job.client_id,
+                title=job.title,
+                process_number=job.process_number,
+                commit=False
+            )
+            gcs_path = petition.gcs_path
+            values = {'status': 'done', 'petition_id': petition.id}
+        except Exception as e:
+            db.session.rollback()
+            # Erros de geração são definitivos; só jobs abandonados são repetidos
+            values = {'status': 'failed', 'error': str(e)}
+
+        recorded = False
+        try:
+            if lease_lost is None or not lease_lost.is_set():
+                result = db.session.execute(
+                    update(PetitionJob)
+                    .where(PetitionJob.id == job_id, PetitionJob.locked_by == worker_id, PetitionJob.status == 'running')
+                    .values(finished_at=datetime.utcnow(), locked_until=None, **values)
+                )
+                if result.rowcount == 1:
+                    db.session.commit()
+                    recorded = True
+        finally:
+            if not recorded:
+                db.session.rollback()
+                print(f"Aviso: Reserva do job {job_id} perdida; resultado descartado")
+                if gcs_path is not None:
+                    # Só o arquivo sobra: a petição não chegou a ser confirmada no banco
+                    document_service.delete_file(gcs_path)
+        return recorded
+
+    def _fail_abandoned(self, now):
+        """Marca como falhos os jobs abandonados que já esgotaram as tentativas"""
+        result = db.session.execute(
+            update(PetitionJob)
+            .where(
+                PetitionJob.status == 'running',
+                PetitionJob.locked_until < now,
+                PetitionJob.attempts >= PETITION_JOB_MAX_ATTEMPTS
+            )
+            .values(
+                status='failed',
+                error='Job abandonado pelo worker após o número máximo de tentativas',
+                finished_at=now,
+                locked_until=None
+            )
+        )
+        if result.rowcount:
+            db.session.commit()
+
+
+class PetitionJobWorker:
+    """Pool de threads que consome a fila de jobs de petição"""
+
+    def __init__(self, app, concurrency=1, queue=None, poll_seconds=PETITION_JOB_POLL_SECONDS):
+        self.app = app
+        self.concurrency = concurrency
+        self.queue = queue or petition_job_queue
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._loop, name=f"petition-job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        """Executa até receber SIGTERM/SIGINT (entry point separado)"""
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        signal.signal(signal.SIGINT, lambda *_: self._stop.set())
+        self.start()
+        self._stop.wait()
+        self.stop()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    job = self.queue.claim_next(self.worker_id)
+                    if job is not None:
+                        self._run_with_lease(job)
+                        continue
+            except Exception as e:
+                print(f"Erro no worker de petições: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def _run_with_lease(self, job):
+        finished = threading.Event()
+        lease_lost = threading.Event()
+        job_id = job.id
+
+        def keep_alive():
+            while not finished.wait(PETITION_JOB_LEASE_SECONDS / 3):
+                try:
+                    with self.app.app_context():
+                        renewed = self.queue.renew_lease(job_id, self.worker_id)
+                except Exception as e:
+                    print(f"Aviso: Não foi possível renovar a reserva do job {job_id}: {e}")
+                    continue
+                if not renewed:
+                    # Outro worker reservou o job depois que a reserva expirou
+                    lease_lost.set()
+                    return
+
+        heartbeat = threading.Thread(target=keep_alive, daemon=True)
+        heartbeat.start()
+        try:
+            self.queue.run_job(job, self.worker_id, lease_lost)
+        finally:
+            finished.set()
+            heartbeat.join()
+
+
+def job_workers_available():
+    """Indica se há workers consumindo a fila; sem eles, jobs ficariam 'queued' para sempre"""
+    return PETITION_JOB_WORKERS > 0 or PETITION_JOB_EXTERNAL_WORKER
+
+
+def start_job_workers(app, concurrency=PETITION_JOB_WORKERS):
+    """Inicia workers dentro do processo da aplicação, se configurado"""
+    if concurrency <= 0:
+        return None
+    return PetitionJobWorker(app, concurrency).start()
+
+
+petition_job_queue = PetitionJobQueue()
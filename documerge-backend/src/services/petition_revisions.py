@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+from src.models.user import db, PetitionRevision
+from src.services.docx_edit import DocxParagraphEditor, diff_lines
+
+# Número máximo de deltas encadeados antes de gravar uma nova base completa
+PETITION_REVISION_REBASE_EVERY = int(os.getenv('PETITION_REVISION_REBASE_EVERY', '20'))
+
+
+def apply_line_edits(lines, edits):
+    """Aplica edições [(start, end, lines)] ordenadas a uma lista de linhas"""
+    result = list(lines)
+    for start, end, new_lines in reversed(edits):
+        result[start:end] = new_lines
+    return result
+
+
+class PetitionRevisionStore:
+    """Histórico de versões de petições: bases completas + deltas por parágrafo.
+
+    A primeira edição grava a versão original como base (cópia do .docx no
+    storage) e cada edição seguinte grava só as edições de parágrafo aplicadas.
+    As bases são gravadas a partir dos bytes que o chamador leu ou produziu,
+    nunca de uma cópia posterior do arquivo da petição (que outra edição pode
+    já ter substituído).
+    Uma revisão é reconstruída a partir da base mais próxima; a cada
+    PETITION_REVISION_REBASE_EVERY deltas uma nova base limita esse caminho.
+    """
+
+    def __init__(self, documents=None):
+        self._documents = documents
+
+    @property
+    def documents(self):
+        # Import tardio: document_service usa este módulo ao editar petições
+        if self._documents is None:
+            from src.services.document_service import document_service
+            self._documents = document_service
+        return self._documents
+
+    def list_revisions(self, petition_id):
+        return PetitionRevision.query.filter_by(petition_id=petition_id).order_by(PetitionRevision.number).all()
+
+    def get_revision(self, petition_id, number):
+        return PetitionRevision.query.filter_by(petition_id=petition_id, number=number).first()
+
+    def ensure_base(self, petition, content_text, source):
+        """Grava a versão anterior à edição como revisão base se a petição ainda não tem histórico.
+        source: stream com o .docx dessa versão (content_text). Retorna a revisão criada ou None.
+        """
+        if self._latest(petition.id) is not None:
+            return None
+        return self._add_base(petition, 1, content_text, petition.user_id, source)
+
+    def record(self, petition, edits, old_text, new_text, source, user_id=None):
+        """Registra uma edição já aplicada ao arquivo atual da petição.
+        source: stream com o .docx editado, gravado se a edição virar uma nova base.
+        """
+        latest = self._latest(petition.id)
+        number = latest.number + 1
+
+        deltas_since_base = number - self._latest_base(petition.id, latest.number).number - 1
+        if deltas_since_base >= PETITION_REVISION_REBASE_EVERY:
+            return self._add_base(petition, number, new_text, user_id, source)
+
+        old_lines = old_text.split('\n')
+        new_lines = new_text.split('\n')
+        edits = [[start, end, list(lines)] for start, end, lines in edits]
+        # Células e quebras de seção são esvaziadas em vez de removidas: o texto pode diferir das edições
+        text_edits = diff_lines(old_lines, new_lines)
+        same_effect = apply_line_edits(old_lines, edits) == new_lines
+
+        revision = PetitionRevision(
+            petition_id=petition.id,
+            number=number,
+            kind='delta',
+            edits=json.dumps(edits, ensure_ascii=False),
+            text_edits=None if same_effect else json.dumps(
+                [[start, end, list(lines)] for start, end, lines in text_edits], ensure_ascii=False
+            ),
+            title=petition.title,
+            paragraph_count=len(new_lines),
+            user_id=user_id
+        )
+        db.session.add(revision)
+        return revision
+
+    def revision_text(self, petition_id, number):
+        """Texto da revisão: base mais próxima + deltas de texto (sem acessar o storage)"""
+        base = self._base_for(petition_id, number)
+
+        lines = base.content_text.split('\n')
+        for delta in self._deltas(petition_id, base.number, number):
+            lines = apply_line_edits(lines, json.loads(delta.text_edits or delta.edits))
+        return '\n'.join(lines)
+
+    def revision_document(self, petition_id, number):
+        """Reconstrói o .docx da revisão; retorna um stream que o chamador deve fechar"""
+        from src.services.document_service import DOCUMENT_SPOOL_MAX_BYTES
+
+        base = self._base_for(petition_id, number)
+
+        deltas = self._deltas(petition_id, base.number, number)
+        source = self.documents.download_stream(base.gcs_path)
+        if not deltas:
+            return source
+
+        with source, DocxParagraphEditor(source) as editor:
+            for delta in deltas:
+                editor.apply(json.loads(delta.edits))
+            output = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, suffix='.docx')
+            editor.save(output)
+        output.seek(0)
+        return output
+
+    def delete_revisions(self, petition_id):
+        """Remove o histórico da petição (arquivos base e registros)"""
+        for revision in self.list_revisions(petition_id):
+            if revision.gcs_path:
+                self.documents.delete_file(revision.gcs_path)
+            db.session.delete(revision)
+
+    def _add_base(self, petition, number, content_text, user_id, source):
+        from src.services.document_service import DOCX_CONTENT_TYPE
+
+        base_path, _ = os.path.splitext(petition.gcs_path)
+        gcs_path = self.documents.write_object(f"{base_path}.rev{number}.docx", source, DOCX_CONTENT_TYPE)
+        revision = PetitionRevision(
+            petition_id=petition.id,
+            number=number,
+            kind='base',
+            gcs_path=gcs_path,
+            content_text=content_text,
+            title=petition.title,
+            paragraph_count=len(content_text.split('\n')),
+            user_id=user_id
+        )
+        db.session.add(revision)
+        db.session.flush()
+        return revision
+
+    def _base_for(self, petition_id, number):
+        if self.get_revision(petition_id, number) is None:
+            raise Exception("Revisão não encontrada")
+        return self._latest_base(petition_id, number)
+
+    def _latest(self, petition_id):
+        return PetitionRevision.query.filter_by(petition_id=petition_id).order_by(
+            PetitionRevision.number.desc()
+        ).first()
+
+    def _latest_base(self, petition_id, number):
+        return PetitionRevision.query.filter(
+            PetitionRevision.petition_id == petition_id,
+            PetitionRevision.kind == 'base',
+            PetitionRevision.number <= number
+        ).order_by(PetitionRevision.number.desc()).first()
+
+    def _deltas(self, petition_id, after, until):
+        return PetitionRevision.query.filter(
+            PetitionRevision.petition_id == petition_id,
+            PetitionRevision.number > after,
+            PetitionRevision.number <= until
+        ).order_by(PetitionRevision.number).all()
+
+
+petition_revision_store = PetitionRevisionStore()
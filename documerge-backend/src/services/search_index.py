@@ -0,0 +1,269 @@
+import html
+import os
+import re
+from sqlalchemy import text
+from src.models.user import db, Thesis, GeneratedPetition
+
+# Tamanho (em tokens) dos trechos de destaque retornados pela busca
+SEARCH_SNIPPET_TOKENS = int(os.getenv('SEARCH_SNIPPET_TOKENS', '16'))
+# Máximo de resultados por página e de termos considerados na consulta
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '100'))
+SEARCH_MAX_TERMS = int(os.getenv('SEARCH_MAX_TERMS', '16'))
+
+# Pesos do bm25 por coluna (título pesa mais que descrição, que pesa mais que o corpo)
+THESIS_WEIGHTS = (10.0, 5.0, 1.0, 0.0)  # title, description, body, client_id
+PETITION_WEIGHTS = (10.0, 8.0, 1.0, 0.0, 0.0)  # title, process_number, body, client_id, user_id
+
+# remove_diacritics: "peticao" encontra "petição"
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS theses_fts USING fts5("
+    "title, description, body, client_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS petitions_fts USING fts5("
+    "title, process_number, body, client_id UNINDEXED, user_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2')",
+)
+
+
+
+class SearchUnavailable(Exception):
+    """Banco sem FTS5 ou tabelas do índice ausentes (reconstruir o índice)"""
+
+
+# Marcadores internos dos trechos; o texto é escapado e eles viram <mark>
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+
+
+def build_match_query(query):
+    """Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra (ou número de processo, como 0001234-56.2024.8.26.0100) vira
+    uma frase entre aspas, exigida no resultado; a última aceita prefixo para
+    busca enquanto se digita. Operadores do FTS5 não são interpretados.
+    """
+    terms = [term for term in query.split() if re.search(r'\w', term)][:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def highlight(snippet):
+    """Escapa o trecho retornado pelo FTS5 e marca os termos encontrados com <mark>"""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+class SearchIndex:
+    """Índice de busca textual (SQLite FTS5) de teses e petições geradas.
+
+    As tabelas virtuais ficam no mesmo banco da aplicação e são atualizadas na
+    mesma transação das alterações (upload, edição, remoção), de modo que o
+    índice acompanha o commit ou o rollback. Em bancos sem FTS5 a indexação é
+    ignorada e a busca levanta SearchUnavailable.
+    """
+
+    def __init__(self, documents=None):
+        self._documents = documents
+        self._ready = {}  # engine -> tabelas existem
+
+    @property
+    def documents(self):
+        # Import tardio: document_service usa este módulo ao gerar e editar petições
+        if self._documents is None:
+            from src.services.document_service import document_service
+            self._documents = document_service
+        return self._documents
+
+    def ensure_schema(self):
+        """Cria as tabelas do índice se necessário. Retorna False se o banco não suporta FTS5."""
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            self._ready[engine] = False
+            return False
+        try:
+            for statement in SCHEMA:
+                db.session.execute(text(statement))
+            db.session.commit()
+            self._ready[engine] = True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Aviso: Índice de busca (FTS5) indisponível: {e}")
+            self._ready[engine] = False
+        return self._ready[engine]
+
+    def available(self):
+        """Tabelas do índice existem (sem criá-las: a criação é feita na inicialização ou no rebuild)"""
+        engine = db.engine
+        if engine not in self._ready:
+            if engine.dialect.name != 'sqlite':
+                self._ready[engine] = False
+            else:
+                count = db.session.execute(text(
+                    "SELECT count(*) FROM sqlite_master WHERE name IN ('theses_fts', 'petitions_fts')"
+                )).scalar()
+                self._ready[engine] = count == len(SCHEMA)
+        return self._ready[engine]
+
+    # ===== ATUALIZAÇÃO INCREMENTAL (sem commit: acompanha a transação do chamador) =====
+
+    def index_thesis(self, thesis, body=None):
+        """Indexa (ou reindexa) uma tese já com id. body: texto do .docx; obtido do fragmento se omitido."""
+        if not self.available():
+            return
+        if body is None:
+            body = self._thesis_text(thesis)
+        self.remove_thesis(thesis.id)
+        db.session.execute(
+            text("INSERT INTO theses_fts (rowid, title, description, body, client_id) "
+                 "VALUES (:id, :title, :description, :body, :client_id)"),
+            {'id': thesis.id, 'title': thesis.title, 'description': thesis.description or '',
+             'body': body, 'client_id': thesis.client_id}
+        )
+
+    def remove_thesis(self, thesis_id):
+        if self.available():
+            db.session.execute(text("DELETE FROM theses_fts WHERE rowid = :id"), {'id': thesis_id})
+
+    def index_petition(self, petition, content_text=None):
+        """Indexa (ou reindexa) uma petição já com id. content_text: texto atual; o armazenado se omitido."""
+        if not self.available():
+            return
+        if content_text is None:
+            content_text = self.documents.stored_petition_text(petition) or ''
+        self.remove_petition(petition.id)
+        db.session.execute(
+            text("INSERT INTO petitions_fts (rowid, title, process_number, body, client_id, user_id) "
+                 "VALUES (:id, :title, :process_number, :body, :client_id, :user_id)"),
+            {'id': petition.id, 'title': petition.title, 'process_number': petition.process_number or '',
+             'body': content_text, 'client_id': petition.client_id, 'user_id': petition.user_id}
+        )
+
+    def remove_petition(self, petition_id):
+        if self.available():
+            db.session.execute(text("DELETE FROM petitions_fts WHERE rowid = :id"), {'id': petition_id})
+
+    def remove_client(self, client_id):
+        """Remove do índice as teses e petições de um cliente"""
+        if not self.available():
+            return
+        for table in ('theses_fts', 'petitions_fts'):
+            db.session.execute(text(f"DELETE FROM {table} WHERE client_id = :client_id"), {'client_id': client_id})
+
+    # ===== BUSCA =====
+
+    def search_theses(self, client_id, query, limit=20, offset=0):
+        """Teses do cliente que contêm todos os termos, das mais relevantes para as menos"""
+        rows, has_more = self._search(
+            'theses_fts', THESIS_WEIGHTS, query, {'client_id': client_id}, limit, offset
+        )
+        theses = {thesis.id: thesis for thesis in Thesis.query.filter(Thesis.id.in_([row[0] for row in rows]))}
+        results = [
+            {'thesis': theses[row_id].to_dict(), 'score': score, 'snippet': highlight(snippet)}
+            for row_id, score, snippet in rows if row_id in theses
+        ]
+        return {'results': results, 'offset': offset, 'limit': limit, 'has_more': has_more}
+
+    def search_petitions(self, client_id, query, user_id=None, limit=20, offset=0):
+        """Petições do cliente (apenas de user_id, se informado) que contêm todos os termos"""
+        filters = {'client_id': client_id}
+        if user_id is not None:
+            filters['user_id'] = user_id
+        rows, has_more = self._search('petitions_fts', PETITION_WEIGHTS, query, filters, limit, offset)
+        petitions = {
+            petition.id: petition
+            for petition in GeneratedPetition.query.filter(GeneratedPetition.id.in_([row[0] for row in rows]))
+        }
+        results = [
+            {'petition': petitions[row_id].to_dict(), 'score': score, 'snippet': highlight(snippet)}
+            for row_id, score, snippet in rows if row_id in petitions
+        ]
+        return {'results': results, 'offset': offset, 'limit': limit, 'has_more': has_more}
+
+    def _search(self, table, weights, query, filters, limit, offset):
+        if not self.available():
+            raise SearchUnavailable("Índice de busca indisponível; execute a reconstrução do índice")
+        match = build_match_query(query or '')
+        if match is None:
+            raise Exception("Consulta de busca vazia")
+        if not 0 < limit <= SEARCH_MAX_LIMIT or offset < 0:
+            raise Exception(f"limit deve estar entre 1 e {SEARCH_MAX_LIMIT} e offset não pode ser negativo")
+
+        # Colunas UNINDEXED são filtradas sobre as linhas já encontradas pelo MATCH
+        conditions = ''.join(f" AND {column} = :{column}" for column in filters)
+        weight_args = ', '.join(str(weight) for weight in weights)
+        rows = db.session.execute(
+            text(
+                f"SELECT rowid, bm25({table}, {weight_args}) AS score, "
+                f"snippet({table}, -1, :mark_open, :mark_close, '…', :tokens) "
+                f"FROM {table} WHERE {table} MATCH :match{conditions} "
+                f"ORDER BY score LIMIT :limit OFFSET :offset"
+            ),
+            {
+                **filters, 'match': match, 'mark_open': _MARK_OPEN, 'mark_close': _MARK_CLOSE,
+                'tokens': SEARCH_SNIPPET_TOKENS, 'limit': limit + 1, 'offset': offset
+            }
+        ).all()
+        # bm25 é negativo (menor = mais relevante); expõe como pontuação positiva
+        results = [(row_id, round(-score, 6), snippet) for row_id, score, snippet in rows[:limit]]
+        return results, len(rows) > limit
+
+    # ===== RECONSTRUÇÃO =====
+
+    def rebuild(self, client_id=None):
+        """Reindexa todas as teses e petições (ou as de um cliente) a partir do banco e do storage"""
+        if not self.ensure_schema():
+            raise Exception("Banco de dados sem suporte a FTS5")
+
+        theses_query = Thesis.query
+        petitions_query = GeneratedPetition.query
+        if client_id is not None:
+            self.remove_client(client_id)
+            theses_query = theses_query.filter_by(client_id=client_id)
+            petitions_query = petitions_query.filter_by(client_id=client_id)
+        else:
+            db.session.execute(text("DELETE FROM theses_fts"))
+            db.session.execute(text("DELETE FROM petitions_fts"))
+
+        indexed = {'theses': 0, 'petitions': 0}
+        failed = []
+        for thesis in theses_query.order_by(Thesis.id).all():
+            try:
+                self.index_thesis(thesis, self._thesis_text(thesis, strict=True))
+                indexed['theses'] += 1
+            except Exception as e:
+                # Sem o corpo, a tese continua encontrável pelo título e descrição
+                self.index_thesis(thesis, '')
+                failed.append({'thesis_id': thesis.id, 'error': str(e)})
+
+        for petition in petitions_query.order_by(GeneratedPetition.id).all():
+            try:
+                content_text = self.documents.stored_petition_text(petition)
+                if content_text is None:
+                    content_text = self.documents.extract_petition_text(petition.gcs_path)
+                    self.documents.set_petition_text(petition, content_text)
+                self.index_petition(petition, content_text)
+                indexed['petitions'] += 1
+            except Exception as e:
+                self.index_petition(petition, '')
+                failed.append({'petition_id': petition.id, 'error': str(e)})
+
+        db.session.commit()
+        for table in ('theses_fts', 'petitions_fts'):
+            db.session.execute(text(f"INSERT INTO {table} ({table}) VALUES ('optimize')"))
+        db.session.commit()
+        return {'indexed': indexed, 'failed': failed}
+
+    def _thesis_text(self, thesis, strict=False):
+        try:
+            return self.documents.get_thesis_content(thesis).text
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Aviso: Tese {thesis.id} indexada sem o conteúdo do arquivo: {e}")
+            return ''
+
+
+search_index = SearchIndex()
@@ -0,0 +1,618 @@
+import hashlib
+import io
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: exclusão apenas entre threads do processo
+    fcntl = None
+
+# Documentos até este tamanho ficam só em memória ao serem baixados; acima disso vão para disco
+DOCUMENT_SPOOL_MAX_BYTES = int(os.getenv('DOCUMENT_SPOOL_MAX_BYTES', str(16 * 1024 * 1024)))
+# Tamanho dos blocos do upload resumível (múltiplo de 256 KB exigido pelo GCS)
+STREAM_UPLOAD_CHUNK_BYTES = int(os.getenv('STREAM_UPLOAD_CHUNK_BYTES', str(8 * 1024 * 1024)))
+# Tamanho dos blocos buscados por open_range_reader
+STORAGE_RANGE_BLOCK_BYTES = int(os.getenv('STORAGE_RANGE_BLOCK_BYTES', str(256 * 1024)))
+# fsync dos arquivos locais antes da publicação (desligar só em benchmarks/testes)
+LOCAL_STORAGE_FSYNC = os.getenv('LOCAL_STORAGE_FSYNC', '1') != '0'
+
+LOCAL_URI_PREFIX = 'local://'
+# Prefixo dos diretórios de shard: nomes de diretório das chaves não podem começar com ele
+SHARD_PREFIX = '@'
+
+ObjectInfo = namedtuple('ObjectInfo', ['key', 'size', 'generation', 'updated', 'content_type'])
+
+
+class ObjectNotFound(Exception):
+    """Objeto inexistente no storage"""
+
+
+class GenerationMismatch(Exception):
+    """A geração atual do objeto não é a esperada (escrita condicional recusada)"""
+
+
+class StorageBackend:
+    """Interface comum dos backends de armazenamento de objetos.
+
+    Objetos são identificados por chaves relativas (client_1/theses/x.docx) e
+    persistidos no banco como URIs do backend (gs://bucket/chave ou
+    local://chave). Toda escrita é atômica e produz uma nova geração
+    (inteiro crescente); if_generation_match=0 só cria o objeto se ele não
+    existir, e um valor positivo só substitui aquela geração.
+    """
+
+    def uri(self, key):
+        raise NotImplementedError
+
+    def owns(self, uri):
+        raise NotImplementedError
+
+    def key_for(self, uri):
+        """Chave de uma URI deste backend"""
+        raise NotImplementedError
+
+    def write(self, key, content, content_type=None, if_generation_match=None):
+        """Grava bytes ou um stream e retorna a nova geração"""
+        raise NotImplementedError
+
+    def open_writer(self, key, content_type=None):
+        """Stream de escrita publicado ao ser fechado (usar como context manager)"""
+        raise NotImplementedError
+
+    def open_reader(self, key):
+        """Stream binário com seek posicionado no início; o chamador deve fechá-lo"""
+        raise NotImplementedError
+
+    def read_range(self, key, start, end=None, generation=None):
+        """Bytes [start, end) do objeto (end=None: até o fim).
+        Com generation, falha com GenerationMismatch se o objeto tiver mudado.
+        """
+        raise NotImplementedError
+
+    def open_range_reader(self, key, block_size=None):
+        """Stream com seek que busca só os trechos lidos (ex.: um membro de um .docx grande)"""
+        info = self.stat(key)
+        if info is None:
+            raise ObjectNotFound(f"Objeto não encontrado: {key}")
+        return io.BufferedReader(
+            RangeReader(self, key, info.size, info.generation),
+            buffer_size=block_size or STORAGE_RANGE_BLOCK_BYTES
+        )
+
+    def stat(self, key):
+        """ObjectInfo do objeto ou None se não existir"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def copy(self, source_key, destination_key):
+        """Copia um objeto e retorna a geração da cópia"""
+        raise NotImplementedError
+
+    def delete(self, key, if_generation_match=None):
+        """Remove o objeto. Retorna False se ele não existia."""
+        raise NotImplementedError
+
+    def list(self, prefix=''):
+        """Gera ObjectInfo dos objetos cuja chave começa com prefix"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _as_stream(content):
+        if isinstance(content, (bytes, bytearray)):
+            return io.BytesIO(content)
+        content.seek(0)
+        return content
+
+
+class GCSStorageBackend(StorageBackend):
+    """Objetos em um bucket do Google Cloud Storage (gerações nativas do GCS)"""
+
+    def __init__(self, bucket, bucket_name=None):
+        self.bucket = bucket
+        self.bucket_name = bucket_name or bucket.name
+        self._prefix = f"gs://{self.bucket_name}/"
+
+    def uri(self, key):
+        return f"{self._prefix}{key}"
+
+    def owns(self, uri):
+        return uri.startswith(self._prefix)
+
+    def key_for(self, uri):
+        if not self.owns(uri):
+            raise Exception(f"Objeto fora do bucket {self.bucket_name}: {uri}")
+        return uri[len(self._prefix):]
+
+    def write(self, key, content, content_type=None, if_generation_match=None):
+        blob = self.bucket.blob(key)
+        try:
+            blob.upload_from_file(
+                self._as_stream(content), content_type=content_type, if_generation_match=if_generation_match
+            )
+        except Exception as e:
+            self._raise_for(e, key)
+        return blob.generation
+
+    def open_writer(self, key, content_type=None):
+        # Upload resumível em blocos; publicado no close()
+        blob = self.bucket.blob(key)
+        if self._writer_can_terminate():
+            return GCSObjectWriter(
+                blob, blob.open('wb', content_type=content_type, chunk_size=STREAM_UPLOAD_CHUNK_BYTES)
+            )
+        # Versões sem terminate() não cancelam o upload: envia para um nome temporário
+        # e só renomeia para key no close(), de modo que uma saída parcial nunca é publicada
+        temp_blob = self.bucket.blob(f"{key}.upload-{uuid.uuid4().hex}")
+        return GCSObjectWriter(
+            blob,
+            temp_blob.open('wb', content_type=content_type, chunk_size=STREAM_UPLOAD_CHUNK_BYTES),
+            temp_blob=temp_blob
+        )
+
+    def open_reader(self, key):
+        stream = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES)
+        try:
+            self.bucket.blob(key).download_to_file(stream)
+        except Exception as e:
+            stream.close()
+            self._raise_for(e, key)
+        stream.seek(0)
+        return stream
+
+    def read_range(self, key, start, end=None, generation=None):
+        if end is not None and end <= start:
+            return b''
+        try:
+            # No GCS o fim do intervalo é inclusivo
+            return self.bucket.blob(key).download_as_bytes(
+                start=start, end=None if end is None else end - 1, if_generation_match=generation
+            )
+        except Exception as e:
+            self._raise_for(e, key)
+
+    def stat(self, key):
+        blob = self.bucket.get_blob(key)
+        if blob is None:
+            return None
+        return self._info(blob)
+
+    def exists(self, key):
+        return self.bucket.blob(key).exists()
+
+    def copy(self, source_key, destination_key):
+        try:
+            copied = self.bucket.copy_blob(self.bucket.blob(source_key), self.bucket, destination_key)
+        except Exception as e:
+            self._raise_for(e, source_key)
+        return copied.generation
+
+    def delete(self, key, if_generation_match=None):
+        try:
+            self.bucket.blob(key).delete(if_generation_match=if_generation_match)
+            return True
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            self._raise_for(e, key)
+
+    def list(self, prefix=''):
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            yield self._info(blob)
+
+    @staticmethod
+    def _writer_can_terminate():
+        # Verificado na classe: um writer aberto e abandonado publicaria um objeto vazio ao ser coletado
+        try:
+            from google.cloud.storage.fileio import BlobWriter
+        except ImportError:
+            return False
+        return hasattr(BlobWriter, 'terminate')
+
+    @staticmethod
+    def _info(blob):
+        return ObjectInfo(blob.name, blob.size, blob.generation, blob.updated, blob.content_type)
+
+    @staticmethod
+    def _is_not_found(error):
+        return getattr(error, 'code', None) == 404
+
+    @classmethod
+    def _raise_for(cls, error, key):
+        # Traduz os erros da API para as mesmas exceções do backend local
+        if cls._is_not_found(error):
+            raise ObjectNotFound(f"Objeto não encontrado: {key}") from error
+        if getattr(error, 'code', None) == 412:
+            raise GenerationMismatch(f"Geração do objeto {key} diferente da esperada") from error
+        raise error
+
+
+class LocalStorageBackend(StorageBackend):
+    """Objetos em disco local com a mesma semântica do GCS.
+
+    - Escrita atômica: conteúdo gravado em arquivo temporário no mesmo diretório,
+      fsync e os.replace; leitores nunca veem um arquivo parcial.
+    - Diretórios com shard: client_1/petitions/x.docx fica em
+      client_1/petitions/@3f/x.docx (256 shards por diretório, pelo hash do nome).
+    - Gerações: o mtime em nanossegundos do arquivo, definido na publicação e
+      sempre maior que o anterior; escritas condicionais usam um lock por shard
+      (flock entre processos).
+    - Leituras parciais com seek direto no arquivo.
+    Arquivos antigos gravados sem shard (raiz/chave) continuam legíveis.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def uri(self, key):
+        return f"{LOCAL_URI_PREFIX}{self._validate(key)}"
+
+    def owns(self, uri):
+        return uri.startswith(LOCAL_URI_PREFIX) or self._legacy_key(uri) is not None
+
+    def key_for(self, uri):
+        if uri.startswith(LOCAL_URI_PREFIX):
+            return self._validate(uri[len(LOCAL_URI_PREFIX):])
+        key = self._legacy_key(uri)
+        if key is None:
+            raise Exception(f"Objeto fora do armazenamento local: {uri}")
+        return key
+
+    def write(self, key, content, content_type=None, if_generation_match=None):
+        with self.open_writer(key, content_type, if_generation_match) as writer:
+            shutil.copyfileobj(self._as_stream(content), writer)
+        return writer.generation
+
+    def open_writer(self, key, content_type=None, if_generation_match=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        return LocalObjectWriter(self, key, temp_path, if_generation_match)
+
+    def open_reader(self, key):
+        try:
+            return open(self._existing_path(key), 'rb')
+        except FileNotFoundError:
+            raise ObjectNotFound(f"Objeto não encontrado: {key}")
+
+    def open_range_reader(self, key, block_size=None):
+        # O próprio arquivo já permite leitura parcial
+        return self.open_reader(key)
+
+    def read_range(self, key, start, end=None, generation=None):
+        if end is not None and end <= start:
+            return b''
+        with self.open_reader(key) as f:
+            # O arquivo aberto é sempre uma única geração (substituições trocam o inode)
+            if generation is not None and os.fstat(f.fileno()).st_mtime_ns != generation:
+                raise GenerationMismatch(f"Objeto {key} alterado durante a leitura")
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    def stat(self, key):
+        try:
+            stat = os.stat(self._existing_path(key))
+        except FileNotFoundError:
+            return None
+        return self._info(key, stat)
+
+    def copy(self, source_key, destination_key):
+        with self.open_reader(source_key) as source:
+            return self.write(destination_key, source)
+
+    def delete(self, key, if_generation_match=None):
+        with self._shard_lock(key):
+            path = self._existing_path(key)
+            if if_generation_match is not None:
+                self._check_generation(key, path, if_generation_match)
+            try:
+                os.remove(path)
+                return True
+            except FileNotFoundError:
+                return False
+
+    def list(self, prefix=''):
+        # Percorre só o diretório mais profundo contido no prefixo (e seus shards)
+        base = prefix.rsplit('/', 1)[0] if '/' in prefix else ''
+        base_dir = os.path.join(self.root, *base.split('/')) if base else self.root
+        found = {}
+        for directory, _, files in os.walk(base_dir):
+            relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            parts = [] if relative == '.' else relative.split('/')
+            if parts and parts[-1].startswith(SHARD_PREFIX):
+                parts = parts[:-1]
+            for name in files:
+                if name.startswith('.'):
+                    continue  # temporários e locks
+                key = '/'.join(parts + [name])
+                # Arquivo com shard prevalece sobre o antigo sem shard de mesma chave
+                if key.startswith(prefix) and (key not in found or os.path.basename(directory).startswith(SHARD_PREFIX)):
+                    found[key] = os.path.join(directory, name)
+        # Mesma ordem lexicográfica da listagem do GCS
+        for key in sorted(found):
+            yield self._info(key, os.stat(found[key]))
+
+    def publish(self, temp_path, key, if_generation_match=None):
+        """Publica um arquivo temporário como a nova geração do objeto (usado pelo writer)"""
+        path = self._path(key)
+        with self._shard_lock(key):
+            current = self._check_generation(key, path, if_generation_match)
+            # Geração estritamente crescente mesmo com relógio de baixa resolução
+            generation = max(time.time_ns(), (current or 0) + 1)
+            os.utime(temp_path, ns=(generation, generation))
+            os.replace(temp_path, path)
+        if LOCAL_STORAGE_FSYNC:
+            self._fsync_directory(os.path.dirname(path))
+        return generation
+
+    def _check_generation(self, key, path, if_generation_match):
+        """Retorna a geração atual; levanta GenerationMismatch se não for a esperada"""
+        try:
+            current = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            current = None
+        if if_generation_match is not None and (current or 0) != if_generation_match:
+            raise GenerationMismatch(f"Geração do objeto {key} diferente da esperada")
+        return current
+
+    def _shard_lock(self, key):
+        return _ShardLock(self._lock, os.path.join(os.path.dirname(self._path(key)), '.lock'))
+
+    def _path(self, key):
+        """Caminho com shard: <raiz>/<diretórios da chave>/@xx/<nome>"""
+        key = self._validate(key)
+        directory, _, name = key.rpartition('/')
+        shard = SHARD_PREFIX + hashlib.sha1(name.encode('utf-8')).hexdigest()[:2]
+        parts = (directory.split('/') if directory else []) + [shard, name]
+        return os.path.join(self.root, *parts)
+
+    def _existing_path(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            return path
+        legacy = os.path.join(self.root, *key.split('/'))
+        return legacy if os.path.isfile(legacy) else path
+
+    def _legacy_key(self, uri):
+        """Chave de um caminho absoluto antigo (antes das URIs local://) dentro da raiz"""
+        if not os.path.isabs(uri):
+            return None
+        relative = os.path.relpath(os.path.abspath(uri), self.root)
+        if relative.startswith('..'):
+            return None
+        return relative.replace(os.sep, '/')
+
+    @staticmethod
+    def _validate(key):
+        parts = key.split('/')
+        # Nomes iniciados por "." são reservados para temporários e locks
+        if not key or key.startswith('/') or parts[-1].startswith('.') or any(
+            part in ('', '.', '..') or part.startswith(SHARD_PREFIX) for part in parts
+        ):
+            raise Exception(f"Chave de objeto inválida: {key}")
+        return key
+
+    @staticmethod
+    def _info(key, stat):
+        return ObjectInfo(
+            key,
+            stat.st_size,
+            stat.st_mtime_ns,
+            datetime.fromtimestamp(stat.st_mtime_ns / 1e9, tz=timezone.utc),
+            mimetypes.guess_type(key)[0]
+        )
+
+    @staticmethod
+    def _fsync_directory(directory):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class GCSObjectWriter:
+    """Writer de upload resumível com a semântica do writer local: em caso de
+    exceção dentro do bloco with, o upload é cancelado em vez de publicado.
+    """
+
+    def __init__(self, blob, writer, temp_blob=None):
+        self._blob = blob
+        self._writer = writer
+        self._temp_blob = temp_blob  # destino do upload quando ele não pode ser cancelado
+        self.generation = None
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+    def close(self):
+        if self._writer.closed:
+            return
+        self._writer.close()
+        if self._temp_blob is not None:
+            self._blob = self._temp_blob.bucket.rename_blob(self._temp_blob, self._blob.name)
+        self.generation = self._blob.generation
+
+    def discard(self):
+        if self._temp_blob is None:
+            self._writer.terminate()
+            return
+        # Sem terminate(): conclui o upload no nome temporário e o remove; key não é tocada
+        try:
+            self._writer.close()
+            self._temp_blob.delete()
+        except Exception as e:
+            print(f"Aviso: Não foi possível descartar o upload parcial de {self._temp_blob.name}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+class RangeReader(io.RawIOBase):
+    """Leitura com seek sobre read_range do backend (envolver em io.BufferedReader).
+    A geração é fixada na abertura: se o objeto mudar, a leitura falha em vez de misturar versões.
+    """
+
+    def __init__(self, backend, key, size, generation):
+        self._backend = backend
+        self._key = key
+        self._size = size
+        self._generation = generation
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            position = self._size + offset
+        if position < 0:
+            raise ValueError("Posição negativa")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self._position >= self._size:
+            return 0
+        end = min(self._position + len(buffer), self._size)
+        data = self._backend.read_range(self._key, self._position, end, generation=self._generation)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class LocalObjectWriter:
+    """Stream de escrita de um objeto local: grava no temporário e publica no close().
+    Em caso de exceção dentro do bloco with, o temporário é descartado.
+    """
+
+    def __init__(self, backend, key, temp_path, if_generation_match=None):
+        self._backend = backend
+        self._key = key
+        self._temp_path = temp_path
+        self._if_generation_match = if_generation_match
+        self._file = open(temp_path, 'wb')
+        self.generation = None
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._file.flush()
+            if LOCAL_STORAGE_FSYNC:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self.generation = self._backend.publish(self._temp_path, self._key, self._if_generation_match)
+        except Exception:
+            self.discard()
+            raise
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+class _ShardLock:
+    """Lock de threads + flock no arquivo .lock do shard (entre processos, quando disponível)"""
+
+    def __init__(self, thread_lock, lock_path):
+        self._thread_lock = thread_lock
+        self._lock_path = lock_path
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                os.makedirs(os.path.dirname(self._lock_path), exist_ok=True)
+                self._file = open(self._lock_path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self._file is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+        finally:
+            self._thread_lock.release()
+
+
+def create_storage_backend(gcs_bucket=None, bucket_name=None, local_root=None):
+    """Backend de armazenamento conforme a configuração.
+
+    DOCUMENT_STORAGE=local força o disco local (LOCAL_STORAGE_PATH). Caso
+    contrário usa o bucket GCS, se disponível; gcs_bucket pode ser o bucket
+    ou uma função que o cria (falhas caem no disco local com aviso).
+    """
+    if os.getenv('DOCUMENT_STORAGE') != 'local' and gcs_bucket is not None:
+        try:
+            bucket = gcs_bucket() if callable(gcs_bucket) else gcs_bucket
+            return GCSStorageBackend(bucket, bucket_name)
+        except Exception as e:
+            print(f"Aviso: Google Cloud Storage não configurado: {e}")
+    return LocalStorageBackend(local_root or os.getenv('LOCAL_STORAGE_PATH', '/tmp/advocacia_documents'))
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Limite padrão do cache de teses em bytes (64 MB)
+THESIS_CACHE_MAX_BYTES = int(os.getenv('THESIS_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+
+class LRUByteCache:
+    """Cache LRU limitado pelo tamanho (em bytes) dos valores armazenados"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            # Valores maiores que o próprio cache não são armazenados
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, predicate):
+        """Remove todas as entradas cuja chave satisfaz o predicado"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                _, size = self._entries.pop(key)
+                self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class ThesisContentCache:
+    """Cache de conteúdo extraído de teses.
+
+    Teses com content_hash são chaveadas pelo próprio hash: o conteúdo é
+    imutável, dispensa invalidação e é compartilhado entre teses idênticas.
+    As demais usam (thesis_id, marcador de versão).
+    """
+
+    def __init__(self, max_bytes=THESIS_CACHE_MAX_BYTES):
+        self._cache = LRUByteCache(max_bytes)
+
+    @staticmethod
+    def version_marker(thesis):
+        """Marcador de versão da tese: updated_at + caminho no storage"""
+        updated_at = thesis.updated_at.isoformat() if thesis.updated_at else ''
+        return f"{updated_at}|{thesis.gcs_path}"
+
+    @classmethod
+    def cache_key(cls, thesis):
+        if thesis.content_hash:
+            return thesis.content_hash
+        return (thesis.id, cls.version_marker(thesis))
+
+    def get(self, thesis):
+        return self._cache.get(self.cache_key(thesis))
+
+    def put(self, thesis, content, size):
+        key = self.cache_key(thesis)
+        if isinstance(key, tuple):
+            # Mantém apenas a versão mais recente de cada tese sem hash
+            self.invalidate(thesis.id)
+        self._cache.put(key, content, size)
+
+    def invalidate(self, thesis_id):
+        """Remove as entradas por id da tese (entradas por hash são imutáveis)"""
+        self._cache.invalidate(lambda key: isinstance(key, tuple) and key[0] == thesis_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+thesis_content_cache = ThesisContentCache()
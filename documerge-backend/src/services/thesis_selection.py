@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from src.models.user import db, Question, ThesisQuestionLink, Thesis
+
+# Metadados mínimos de uma tese usados na geração (evita lazy-load de Thesis)
+ThesisRef = namedtuple('ThesisRef', ['id', 'title', 'gcs_path', 'updated_at', 'content_hash'])
+
+# Tempo máximo (s) que um índice pode ficar em memória; limita a defasagem
+# entre workers, já que a invalidação explícita só atinge o processo local
+SELECTION_INDEX_TTL = int(os.getenv('SELECTION_INDEX_TTL', '300'))
+
+
+class SelectionIndex:
+    """Índice compilado resposta -> teses de um modelo de petição"""
+
+    def __init__(self, petition_model_id, rows):
+        self.petition_model_id = petition_model_id
+        self.built_at = time.monotonic()
+        self.question_ids = []
+        self.links = {}    # (question_id, answer) -> tupla de ids de teses
+        self.theses = {}   # thesis_id -> ThesisRef
+
+        links = {}
+        seen_questions = set()
+        for question_id, answer, thesis_id, title, gcs_path, updated_at, content_hash in rows:
+            if question_id not in seen_questions:
+                seen_questions.add(question_id)
+                self.question_ids.append(question_id)
+            if thesis_id is None:
+                continue
+            links.setdefault((question_id, answer), []).append(thesis_id)
+            if thesis_id not in self.theses:
+                self.theses[thesis_id] = ThesisRef(thesis_id, title, gcs_path, updated_at, content_hash)
+
+        self.links = {key: tuple(ids) for key, ids in links.items()}
+
+    @classmethod
+    def build(cls, petition_model_id):
+        """Carrega perguntas, vinculações e teses em uma única consulta"""
+        rows = db.session.query(
+            Question.id,
+            ThesisQuestionLink.answer,
+            Thesis.id,
+            Thesis.title,
+            Thesis.gcs_path,
+            Thesis.updated_at,
+            Thesis.content_hash
+        ).select_from(Question).outerjoin(
+            ThesisQuestionLink, ThesisQuestionLink.question_id == Question.id
+        ).outerjoin(
+            Thesis, Thesis.id == ThesisQuestionLink.thesis_id
+        ).filter(
+            Question.petition_model_id == petition_model_id
+        ).order_by(Question.order, Question.id, ThesisQuestionLink.id).all()
+
+        return cls(petition_model_id, rows)
+
+    def is_expired(self):
+        return time.monotonic() - self.built_at > SELECTION_INDEX_TTL
+
+    def references_thesis(self, thesis_id):
+        return thesis_id in self.theses
+
+    def references_question(self, question_id):
+        return question_id in self.question_ids
+
+    def select(self, form_answers):
+        """Retorna as teses selecionadas (ordem das perguntas, sem duplicatas)"""
+        selected = []
+        seen = set()
+
+        for question_id in self.question_ids:
+            key = str(question_id)
+            if key not in form_answers:
+                continue
+            answer = 'sim' if form_answers[key] else 'nao'
+
+            for thesis_id in self.links.get((question_id, answer), ()):
+                if thesis_id not in seen:
+                    seen.add(thesis_id)
+                    selected.append(self.theses[thesis_id])
+
+        return selected
+
+
+class SelectionIndexCache:
+    """Cache de índices de seleção por modelo de petição (por processo)"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação: um índice montado antes dela não é guardado
+        self._generation = 0
+
+    def get(self, petition_model_id):
+        with self._lock:
+            index = self._indexes.get(petition_model_id)
+            generation = self._generation
+        if index is not None and not index.is_expired():
+            return index
+
+        index = SelectionIndex.build(petition_model_id)
+        with self._lock:
+            if generation == self._generation:
+                self._indexes[petition_model_id] = index
+        return index
+
+    def invalidate_model(self, petition_model_id):
+        with self._lock:
+            self._generation += 1
+            self._indexes.pop(petition_model_id, None)
+
+    def invalidate_question(self, question_id):
+        with self._lock:
+            self._generation += 1
+            for model_id, index in list(self._indexes.items()):
+                if index.references_question(question_id):
+                    del self._indexes[model_id]
+
+    def invalidate_thesis(self, thesis_id):
+        with self._lock:
+            self._generation += 1
+            for model_id, index in list(self._indexes.items()):
+                if index.references_thesis(thesis_id):
+                    del self._indexes[model_id]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._indexes.clear()
+
+
+selection_index_cache = SelectionIndexCache()
@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from firebase_admin import auth
+from src.services.firebase_keys import firebase_key_manager
+
+# Verificador dos tokens de autenticação: 'firebase' (padrão, chaves públicas em memória),
+# 'firebase-sdk' (firebase_admin.auth.verify_id_token) ou 'local' (apenas testes de carga)
+AUTH_TOKEN_VERIFIER = os.getenv('AUTH_TOKEN_VERIFIER', 'firebase')
+# Segredo HMAC dos tokens locais (obrigatório com AUTH_TOKEN_VERIFIER=local, mínimo 32 caracteres)
+LOCAL_AUTH_SECRET = os.getenv('LOCAL_AUTH_SECRET')
+LOCAL_AUTH_ISSUER = os.getenv('LOCAL_AUTH_ISSUER', 'documerge-local')
+# Validade padrão (s) dos tokens emitidos localmente
+LOCAL_AUTH_TOKEN_TTL = int(os.getenv('LOCAL_AUTH_TOKEN_TTL', '3600'))
+# Tokens verificados mantidos em cache por processo (0 desliga o cache). A entrada vale até perto
+# do exp e invalidate_user só atinge o processo local: em outros workers o token de um usuário
+# desativado segue aceito, e o bloqueio depende da ativação lida do cache de identidades (até
+# USER_IDENTITY_CACHE_TTL; administradores sempre pelo banco). Papel e ativação nunca vêm das claims
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '10000'))
+# Margem (s) antes do exp a partir da qual o token volta a ser verificado
+TOKEN_CACHE_EXPIRY_SKEW = int(os.getenv('TOKEN_CACHE_EXPIRY_SKEW', '60'))
+
+
+class FirebaseTokenVerifier:
+    """Verifica ID tokens do Firebase Authentication pelo SDK (busca os certificados sob demanda)"""
+
+    def verify(self, token):
+        return auth.verify_id_token(token)
+
+
+class LocalTokenVerifier:
+    """Emite e verifica JWTs HS256 com o mesmo formato de claims do Firebase.
+
+    Permite exercitar require_auth e as rotas protegidas sem o Firebase (testes
+    de carga locais). Os erros usam as exceções do firebase_admin, de modo que
+    os decorators tratam token inválido e expirado da mesma forma.
+    """
+
+    def __init__(self, secret, issuer=LOCAL_AUTH_ISSUER, ttl=LOCAL_AUTH_TOKEN_TTL):
+        if not secret or len(secret) < 32:
+            raise Exception("LOCAL_AUTH_SECRET deve ter ao menos 32 caracteres")
+        self._key = secret.encode('utf-8')
+        self.issuer = issuer
+        self.ttl = ttl
+
+    def issue(self, uid, email=None, name=None, ttl=None, **claims):
+        """Emite um token para uid (claims extras, ex.: role, entram no payload)"""
+        now = int(time.time())
+        payload = {
+            **claims,
+            'iss': self.issuer,
+            'sub': uid,
+            'uid': uid,
+            'iat': now,
+            'exp': now + (ttl if ttl is not None else self.ttl),
+        }
+        if email:
+            payload['email'] = email
+        if name:
+            payload['name'] = name
+        signing_input = _b64encode_json({'alg': 'HS256', 'typ': 'JWT'}) + '.' + _b64encode_json(payload)
+        return signing_input + '.' + _b64encode(self._sign(signing_input))
+
+    def verify(self, token):
+        """Claims decodificadas do token (uid, email, name, ...)"""
+        try:
+            header_part, payload_part, signature_part = token.split('.')
+            header = json.loads(_b64decode(header_part))
+            signature = _b64decode(signature_part)
+        except (AttributeError, ValueError):
+            raise auth.InvalidIdTokenError("Token local malformado")
+
+        if not isinstance(header, dict) or header.get('alg') != 'HS256':
+            raise auth.InvalidIdTokenError("Algoritmo de token não suportado")
+        if not hmac.compare_digest(signature, self._sign(f"{header_part}.{payload_part}")):
+            raise auth.InvalidIdTokenError("Assinatura do token inválida")
+
+        claims = json.loads(_b64decode(payload_part))
+        if claims.get('iss') != self.issuer or not claims.get('sub'):
+            raise auth.InvalidIdTokenError("Emissor ou usuário do token inválido")
+        if claims.get('exp', 0) <= time.time():
+            raise auth.ExpiredIdTokenError("Token expirado", None)
+        return claims
+
+    def _sign(self, signing_input):
+        return hmac.new(self._key, signing_input.encode('ascii'), hashlib.sha256).digest()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64encode_json(value):
+    return _b64encode(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+def create_token_verifier():
+    """Verificador configurado por AUTH_TOKEN_VERIFIER"""
+    if AUTH_TOKEN_VERIFIER == 'local':
+        print("Aviso: Autenticação com tokens locais (AUTH_TOKEN_VERIFIER=local); não use em produção")
+        return LocalTokenVerifier(LOCAL_AUTH_SECRET)
+    # O emulador do Firebase Auth emite tokens sem assinatura, aceitos apenas pelo SDK
+    if AUTH_TOKEN_VERIFIER == 'firebase-sdk' or os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+        return FirebaseTokenVerifier()
+    if AUTH_TOKEN_VERIFIER != 'firebase':
+        raise Exception(f"AUTH_TOKEN_VERIFIER inválido: {AUTH_TOKEN_VERIFIER}")
+    return firebase_key_manager
+
+
+def start_token_verifier():
+    """Pré-carrega as chaves públicas do Firebase e inicia a renovação em segundo plano"""
+    if token_verifier is firebase_key_manager:
+        firebase_key_manager.start()
+
+
+class VerifiedTokenCache:
+    """Cache LRU das claims de tokens já verificados, por processo.
+
+    Evita repetir a verificação de assinatura e claims a cada requisição do
+    mesmo token. A chave é o SHA-256 do token (o token em si não fica em
+    memória) e a entrada vale até exp - TOKEN_CACHE_EXPIRY_SKEW. O cache só
+    substitui a verificação do token: o estado da conta (is_active) continua
+    sendo conferido pelos decorators, e invalidate_user remove na hora as
+    entradas de um usuário desativado neste processo (nos demais, ver
+    TOKEN_CACHE_MAX_ENTRIES).
+    """
+
+    def __init__(self, verifier, max_entries=TOKEN_CACHE_MAX_ENTRIES, skew=TOKEN_CACHE_EXPIRY_SKEW):
+        self.verifier = verifier
+        self.max_entries = max_entries
+        self.skew = skew
+        self._entries = OrderedDict()  # sha256 do token -> (claims, válido até)
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação: verificações em andamento não repõem entradas removidas
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def verify(self, token):
+        """Claims do token, do cache ou verificadas pelo verificador configurado"""
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            epoch = self._epoch
+
+        # Fora do lock: a verificação pode ser lenta (busca de chaves públicas)
+        claims = self.verifier.verify(token)
+
+        valid_until = claims.get('exp', 0) - self.skew
+        if self.max_entries > 0 and valid_until > time.time():
+            with self._lock:
+                if epoch == self._epoch:
+                    self._entries[key] = (claims, valid_until)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return claims
+
+    def invalidate_user(self, uid):
+        """Remove as entradas de um usuário (ex.: conta desativada)"""
+        with self._lock:
+            self._epoch += 1
+            for key in [key for key, (claims, _) in self._entries.items() if claims.get('uid') == uid]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+token_verifier = create_token_verifier()
+verified_token_cache = VerifiedTokenCache(token_verifier)
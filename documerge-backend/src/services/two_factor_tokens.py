@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from src.models.user import db, TwoFactorRevocation
+
+# Segredo HMAC dos tokens de sessão 2FA (obrigatório, o mesmo em todos os workers); sem ele nenhuma sessão é emitida ou aceita
+TWO_FACTOR_SESSION_SECRET = os.getenv('TWO_FACTOR_SESSION_SECRET')
+TWO_FACTOR_SESSION_SECRET_MIN_LENGTH = 32
+# Validade (h) da sessão 2FA emitida após a verificação do código
+TWO_FACTOR_SESSION_HOURS = float(os.getenv('TWO_FACTOR_SESSION_HOURS', '12'))
+# Intervalo (s) entre recargas da lista de revogação; limita o atraso de um logout em outros workers
+TWO_FACTOR_REVOCATION_REFRESH = float(os.getenv('TWO_FACTOR_REVOCATION_REFRESH', '15'))
+# Header com o token de sessão 2FA nas requisições
+TWO_FACTOR_TOKEN_HEADER = 'X-2FA-Session'
+
+
+class TwoFactorSessionTokens:
+    """Tokens de sessão 2FA assinados (HMAC-SHA256) e lista de revogação.
+
+    O token carrega o id do usuário, o id da sessão e a validade, de modo
+    que require_2fa_verified o verifica sem consultar o banco. Revogações
+    (logout, desativação) ficam em two_factor_revocations apenas até a
+    validade dos tokens afetados e são mantidas em memória; cada processo
+    recarrega a lista a cada TWO_FACTOR_REVOCATION_REFRESH segundos.
+    """
+
+    def __init__(self, secret=TWO_FACTOR_SESSION_SECRET, ttl=TWO_FACTOR_SESSION_HOURS * 3600):
+        self._secret = secret
+        self._key = None
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._revoked_sessions = {}  # session_id -> validade (timestamp)
+        self._revoked_users = {}     # user_id -> revogado em (timestamp)
+        self._next_refresh = 0
+        self.verified = 0
+        self.rejected = 0
+        self.revocation_loads = 0
+
+    # ===== EMISSÃO E VERIFICAÇÃO =====
+
+    def issue(self, user_id):
+        """Novo token de sessão 2FA. Retorna (token, valid_until)."""
+        now = time.time()
+        payload = {
+            'uid': user_id,
+            'sid': secrets.token_hex(16),
+            'iat': round(now, 3),
+            'exp': int(now + self.ttl),
+        }
+        payload_part = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        token = payload_part + '.' + _b64encode(self._sign(payload_part))
+        return token, datetime.utcfromtimestamp(payload['exp'])
+
+    def verify(self, token, user_id):
+        """True se o token é válido, do usuário, não venceu e não foi revogado"""
+        payload = self._decode(token)
+        valid = (
+            payload is not None
+            and payload.get('uid') == user_id
+            and payload.get('exp', 0) > time.time()
+            and not self._is_revoked(payload)
+        )
+        with self._lock:
+            if valid:
+                self.verified += 1
+            else:
+                self.rejected += 1
+        return valid
+
+    def _decode(self, token):
+        try:
+            payload_part, signature_part = token.split('.')
+            signature = _b64decode(signature_part)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload_part)):
+            return None
+        try:
+            payload = json.loads(_b64decode(payload_part))
+        except ValueError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def configured(self):
+        """True se há segredo próprio e longo o bastante para assinar as sessões"""
+        return bool(self._secret) and len(self._secret) >= TWO_FACTOR_SESSION_SECRET_MIN_LENGTH
+
+    def _sign(self, payload_part):
+        if self._key is None:
+            if not self.configured():
+                raise Exception(
+                    f"TWO_FACTOR_SESSION_SECRET deve ter ao menos {TWO_FACTOR_SESSION_SECRET_MIN_LENGTH} caracteres"
+                )
+            # Chave derivada: o mesmo segredo não assina outros tipos de token
+            self._key = hashlib.sha256(b'documerge-2fa-session:' + self._secret.encode('utf-8')).digest()
+        return hmac.new(self._key, payload_part.encode('utf-8'), hashlib.sha256).digest()
+
+    # ===== REVOGAÇÃO =====
+
+    def revoke_session(self, token, user_id):
+        """Revoga o token apresentado pelo usuário (logout). Retorna False se o token não é válido."""
+        payload = self._decode(token)
+        if payload is None or payload.get('uid') != user_id or payload.get('exp', 0) <= time.time():
+            return False
+        self._add_revocation(TwoFactorRevocation(
+            user_id=payload['uid'],
+            session_id=payload['sid'],
+            revoked_at=datetime.utcnow(),
+            expires_at=datetime.utcfromtimestamp(payload['exp'])
+        ))
+        return True
+
+    def revoke_user(self, user_id):
+        """Revoga todas as sessões 2FA já emitidas para o usuário (desativação)"""
+        now = time.time()
+        self._add_revocation(TwoFactorRevocation(
+            user_id=user_id,
+            session_id=None,
+            revoked_at=datetime.utcfromtimestamp(now),
+            expires_at=datetime.utcfromtimestamp(now + self.ttl)
+        ))
+
+    def _add_revocation(self, revocation):
+        try:
+            # Remove revogações cujos tokens já venceram: a tabela fica do tamanho das sessões ativas
+            TwoFactorRevocation.query.filter(TwoFactorRevocation.expires_at <= datetime.utcnow()).delete()
+            db.session.add(revocation)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        with self._lock:
+            self._remember(revocation)
+
+    def _remember(self, revocation):
+        if revocation.session_id:
+            self._revoked_sessions[revocation.session_id] = _timestamp(revocation.expires_at)
+        else:
+            revoked_at = _timestamp(revocation.revoked_at)
+            self._revoked_users[revocation.user_id] = max(self._revoked_users.get(revocation.user_id, 0), revoked_at)
+
+    def _is_revoked(self, payload):
+        if time.monotonic() >= self._next_refresh:
+            self._refresh()
+        with self._lock:
+            if payload.get('sid') in self._revoked_sessions:
+                return True
+            return payload.get('iat', 0) <= self._revoked_users.get(payload.get('uid'), -1)
+
+    def _refresh(self):
+        """Recarrega a lista de revogação do banco (no máximo uma vez por intervalo)"""
+        with self._lock:
+            if time.monotonic() < self._next_refresh:
+                return
+            self._next_refresh = time.monotonic() + TWO_FACTOR_REVOCATION_REFRESH
+        try:
+            revocations = TwoFactorRevocation.query.filter(
+                TwoFactorRevocation.expires_at > datetime.utcnow()
+            ).all()
+        except Exception as e:
+            # Mantém a lista atual e tenta de novo no próximo intervalo
+            print(f"Aviso: Falha ao carregar revogações de sessões 2FA: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            # Revogações não são desfeitas: mescla as lidas às atuais e descarta só as vencidas
+            for revocation in revocations:
+                self._remember(revocation)
+            self._revoked_sessions = {sid: exp for sid, exp in self._revoked_sessions.items() if exp > now}
+            self._revoked_users = {
+                user_id: revoked_at for user_id, revoked_at in self._revoked_users.items() if revoked_at + self.ttl > now
+            }
+            self.revocation_loads += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'verified': self.verified,
+                'rejected': self.rejected,
+                'revoked_sessions': len(self._revoked_sessions),
+                'revoked_users': len(self._revoked_users),
+                'revocation_loads': self.revocation_loads
+            }
+
+
+def _timestamp(value):
+    """Timestamp de um datetime UTC sem fuso (padrão dos modelos)"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _b64encode(value):
+    return base64.urlsafe_b64encode(value).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+two_factor_session_tokens = TwoFactorSessionTokens()
@@ -0,0 +1,26 @@
+import os
+import sys
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.services.petition_jobs import PetitionJobWorker, PETITION_JOB_WORKERS
+
+def main():
+    """Processa a fila de geração de petições fora do processo web.
+
+    Uso:
+        python -m src.worker --concurrency 2
+    """
+    parser = argparse.ArgumentParser(description='Worker da fila de geração de petições')
+    parser.add_argument('--concurrency', type=int, default=max(PETITION_JOB_WORKERS, 1),
+                        help='Número de jobs processados em paralelo')
+    args = parser.parse_args()
+
+    app = create_app(start_workers=False)
+    worker = PetitionJobWorker(app, concurrency=args.concurrency)
+    print(f"Worker de petições {worker.worker_id} iniciado com {args.concurrency} thread(s)")
+    worker.run_forever()
+
+if __name__ == '__main__':
+    main()
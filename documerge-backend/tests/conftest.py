@@ -0,0 +1,76 @@
+"""
+Configuração comum dos testes
+
+As variáveis de ambiente são definidas antes de importar a aplicação: os
+módulos de src leem a configuração ao serem carregados. Cada teste recebe
+um banco SQLite em memória e um storage local em diretório temporário.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STORAGE_DIR = tempfile.mkdtemp(prefix='documerge-tests-')
+os.environ.update({
+    'DOCUMENT_STORAGE': 'local',
+    'LOCAL_STORAGE_PATH': STORAGE_DIR,
+    'LOCAL_STORAGE_FSYNC': '0',
+    'AUTH_TOKEN_VERIFIER': 'local',
+    'LOCAL_AUTH_SECRET': 'segredo-dos-testes-com-mais-de-32-caracteres',
+    'TWO_FACTOR_SESSION_SECRET': 'segredo-2fa-dos-testes-com-mais-de-32-caracteres',
+    'PETITION_JOB_WORKERS': '0',
+})
+
+import pytest
+from flask import Flask
+from src.models.user import db, User
+from src.routes.documents import documents_bp
+from src.routes.legal_content import legal_content_bp
+from src.routes.petitions import petitions_bp
+from src.services.document_service import petition_paragraph_cache
+from src.services.identity_cache import user_identity_cache
+from src.services.search_index import search_index
+from src.services.thesis_cache import thesis_content_cache
+from src.services.thesis_selection import selection_index_cache
+from src.services.token_verifier import token_verifier, verified_token_cache
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.register_blueprint(documents_bp, url_prefix='/api/documents')
+    app.register_blueprint(legal_content_bp, url_prefix='/api/legal')
+    app.register_blueprint(petitions_bp, url_prefix='/api/petitions')
+    # Caches por processo sobrevivem entre os testes; cada banco novo começa com eles vazios
+    for cache in (user_identity_cache, verified_token_cache, selection_index_cache, thesis_content_cache,
+                  petition_paragraph_cache):
+        cache.clear()
+    with app.app_context():
+        db.create_all()
+        search_index.ensure_schema()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(app):
+    """login(role) cria um usuário (sem 2FA) e retorna (usuário, headers com o token local)"""
+    def login(role='advogado_redator', uid=None):
+        uid = uid or f"{role}-{User.query.count() + 1}"
+        user = User(firebase_uid=uid, email=f"{uid}@teste.com", role=role, two_factor_enabled=False)
+        db.session.add(user)
+        db.session.commit()
+        return user, {'Authorization': f"Bearer {token_verifier.issue(uid)}"}
+    return login
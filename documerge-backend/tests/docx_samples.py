@@ -0,0 +1,128 @@
+"""Documentos .docx montados com o python-docx para os testes"""
+
+import io
+import struct
+import zlib
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import XmlPart
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Inches, Pt
+
+VML_NAMESPACE = 'urn:schemas-microsoft-com:vml'
+
+
+def docx_bytes(*paragraphs):
+    """Documento com um parágrafo por texto"""
+    document = Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    return save(document)
+
+
+def save(document):
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def open_document(data):
+    return Document(io.BytesIO(data))
+
+
+def add_text_box(paragraph, text):
+    """Caixa de texto (VML) com um parágrafo, ancorada em um run do parágrafo"""
+    run = paragraph.add_run()
+    run._r.append(parse_xml(
+        f'<w:pict {nsdecls("w")} xmlns:v="{VML_NAMESPACE}">'
+        f'<v:shape><v:textbox><w:txbxContent><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:txbxContent></v:textbox></v:shape>'
+        '</w:pict>'
+    ))
+
+
+def add_tab_and_break(paragraph, before, after):
+    """Run com w:tab e w:br entre dois trechos de texto"""
+    paragraph.add_run(before)
+    run = paragraph.add_run()
+    run._r.append(OxmlElement('w:tab'))
+    run._r.append(OxmlElement('w:br'))
+    paragraph.add_run(after)
+
+
+def png_bytes(rgb=(200, 30, 30)):
+    """PNG 1x1 da cor informada"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    raw = b'\x00' + bytes(rgb)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw))
+        + chunk(b'IEND', b'')
+    )
+
+
+def add_picture(document, rgb=(200, 30, 30)):
+    document.add_paragraph().add_run().add_picture(io.BytesIO(png_bytes(rgb)), width=Inches(0.5))
+
+
+def add_custom_style(document, style_id, size):
+    """Estilo de parágrafo com styleId fixo (o mesmo id em documentos diferentes)"""
+    style = document.styles.add_style(style_id, WD_STYLE_TYPE.PARAGRAPH)
+    style.element.set(qn('w:styleId'), style_id)
+    style.font.size = Pt(size)
+    return style
+
+
+def add_numbered_list(document, items, num_format='decimal'):
+    """Lista com numeração própria (abstractNum + num novos) e um parágrafo por item"""
+    numbering = document.part.numbering_part.element
+    abstract_id = max(int(element.get(qn('w:abstractNumId'))) for element in numbering.findall(qn('w:abstractNum'))) + 1
+    num_id = max(int(element.get(qn('w:numId'))) for element in numbering.findall(qn('w:num'))) + 1
+    abstract = parse_xml(
+        f'<w:abstractNum {nsdecls("w")} w:abstractNumId="{abstract_id}"><w:nsid w:val="1A2B3C4D"/>'
+        f'<w:lvl w:ilvl="0"><w:start w:val="1"/><w:numFmt w:val="{num_format}"/><w:lvlText w:val="%1."/></w:lvl>'
+        '</w:abstractNum>'
+    )
+    numbering.findall(qn('w:num'))[0].addprevious(abstract)
+    numbering.append(parse_xml(
+        f'<w:num {nsdecls("w")} w:numId="{num_id}"><w:abstractNumId w:val="{abstract_id}"/></w:num>'
+    ))
+    for item in items:
+        paragraph = document.add_paragraph(item)
+        paragraph._p.get_or_add_pPr().append(parse_xml(
+            f'<w:numPr {nsdecls("w")}><w:ilvl w:val="0"/><w:numId w:val="{num_id}"/></w:numPr>'
+        ))
+    return num_id
+
+
+def add_footnote(document, paragraph, text, note_id=1):
+    """Nota de rodapé (cria word/footnotes.xml se necessário) referenciada ao fim do parágrafo"""
+    try:
+        part = document.part.part_related_by(RT.FOOTNOTES)
+    except KeyError:
+        element = parse_xml(
+            f'<w:footnotes {nsdecls("w")}>'
+            '<w:footnote w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></w:footnote>'
+            '<w:footnote w:type="continuationSeparator" w:id="0"><w:p><w:r><w:continuationSeparator/></w:r></w:p></w:footnote>'
+            '</w:footnotes>'
+        )
+        part = XmlPart(PackURI('/word/footnotes.xml'), CT.WML_FOOTNOTES, element, document.part.package)
+        document.part.relate_to(part, RT.FOOTNOTES)
+    part.element.append(parse_xml(
+        f'<w:footnote {nsdecls("w")} w:id="{note_id}"><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:footnote>'
+    ))
+    paragraph._p.append(parse_xml(f'<w:r {nsdecls("w")}><w:footnoteReference w:id="{note_id}"/></w:r>'))
+
+
+def add_bookmark(paragraph, name, bookmark_id=0):
+    """Marcador em volta do parágrafo e um campo REF que aponta para ele"""
+    paragraph._p.insert(0, parse_xml(f'<w:bookmarkStart {nsdecls("w")} w:id="{bookmark_id}" w:name="{name}"/>'))
+    paragraph._p.append(parse_xml(f'<w:bookmarkEnd {nsdecls("w")} w:id="{bookmark_id}"/>'))
+    paragraph._p.append(parse_xml(
+        f'<w:fldSimple {nsdecls("w")} w:instr=" REF {name} \\h "><w:r><w:t>ref</w:t></w:r></w:fldSimple>'
+    ))
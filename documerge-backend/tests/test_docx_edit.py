@@ -0,0 +1,183 @@
+import io
+import zipfile
+
+import pytest
+from docx.enum.section import WD_SECTION
+from docx.oxml.ns import qn
+from docx_samples import add_tab_and_break, add_text_box, docx_bytes, open_document, save
+from docx import Document
+from src.services.docx_edit import DocxParagraphEditor, diff_lines, normalize_edits
+from src.services.docx_fragments import compile_fragment, extract_text
+from src.services.docx_text import extract_document_text
+
+
+def edit(data, edits):
+    with DocxParagraphEditor(io.BytesIO(data)) as editor:
+        editor.apply(normalize_edits(edits, len(editor.paragraphs)))
+        output = io.BytesIO()
+        editor.save(output)
+        text = editor.text()
+    return output.getvalue(), text
+
+
+def formatted_document():
+    document = Document()
+    paragraph = document.add_paragraph(style='Heading 1')
+    paragraph.add_run('Negrito ').bold = True
+    paragraph.add_run('meio')
+    paragraph.add_run(' itálico').italic = True
+    document.add_paragraph('segundo')
+    document.add_paragraph('terceiro')
+    return save(document)
+
+
+def table_document():
+    document = Document()
+    document.add_paragraph('antes')
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).paragraphs[0].add_run('celula')
+    add_text_box(table.cell(0, 0).paragraphs[0], 'caixa')
+    table.cell(0, 1).paragraphs[0].add_run('unica')
+    document.add_paragraph('depois')
+    return save(document)
+
+
+def test_text_box_inside_table_cell_is_part_of_the_cell_paragraph():
+    data = table_document()
+
+    with DocxParagraphEditor(io.BytesIO(data)) as editor:
+        assert editor.text() == 'antes\ncelulacaixa\nunica\ndepois'
+        assert len(editor.paragraphs) == 4
+    assert extract_document_text(data) == 'antes\ncelulacaixa\nunica\ndepois'
+    body = open_document(data).element.body
+    assert extract_text(list(body)) == 'antes\ncelulacaixa\nunica\ndepois'
+
+
+def test_editing_after_a_table_with_text_box_keeps_indexes_aligned():
+    data, text = edit(table_document(), [{'start': 3, 'end': 4, 'lines': ['depois editado']}])
+
+    assert text == 'antes\ncelulacaixa\nunica\ndepois editado'
+    assert extract_document_text(data) == text
+
+
+def test_set_paragraph_text_keeps_prefix_and_suffix_runs():
+    data, text = edit(formatted_document(), [{'start': 0, 'end': 1, 'lines': ['Negrito novo itálico']}])
+
+    assert text.split('\n')[0] == 'Negrito novo itálico'
+    paragraph = open_document(data).paragraphs[0]
+    assert paragraph.style.name == 'Heading 1'
+    runs = [(run.text, bool(run.bold), bool(run.italic)) for run in paragraph.runs]
+    assert runs == [('Negrito ', True, False), ('novo', False, False), (' itálico', False, True)]
+
+
+def test_insert_and_remove_paragraphs():
+    data, text = edit(formatted_document(), [
+        {'start': 1, 'end': 1, 'lines': ['inserido']},
+        {'start': 2, 'end': 3, 'lines': []},
+    ])
+
+    assert text == 'Negrito meio itálico\ninserido\nsegundo'
+    assert [paragraph.text for paragraph in open_document(data).paragraphs] == text.split('\n')
+
+
+def test_inserted_paragraph_copies_neighbour_formatting():
+    data, _ = edit(formatted_document(), [{'start': 1, 'end': 1, 'lines': ['novo título']}])
+
+    paragraph = open_document(data).paragraphs[1]
+    assert paragraph.text == 'novo título'
+    assert paragraph.style.name == 'Heading 1'
+    assert paragraph.runs[0].bold
+
+
+def test_removing_paragraph_with_section_break_only_empties_it():
+    document = Document()
+    document.add_paragraph('primeira seção')
+    document.add_section(WD_SECTION.NEW_PAGE)
+    document.add_paragraph('segunda seção')
+    data = save(document)
+
+    output, text = edit(data, [{'start': 0, 'end': 1, 'lines': []}])
+
+    assert text == '\nsegunda seção'
+    result = open_document(output)
+    assert len(result.sections) == 2
+    assert result.paragraphs[0]._p.find(f"{qn('w:pPr')}/{qn('w:sectPr')}") is not None
+
+
+def test_removing_last_paragraph_of_a_cell_keeps_the_cell_valid():
+    output, text = edit(table_document(), [{'start': 2, 'end': 3, 'lines': []}])
+
+    assert text == 'antes\ncelulacaixa\n\ndepois'
+    cell = open_document(output).tables[0].cell(0, 1)
+    assert len(cell.paragraphs) == 1 and cell.text == ''
+
+
+def test_untouched_parts_are_copied():
+    data = formatted_document()
+    output, _ = edit(data, [{'start': 2, 'end': 3, 'lines': ['alterado']}])
+
+    with zipfile.ZipFile(io.BytesIO(data)) as before, zipfile.ZipFile(io.BytesIO(output)) as after:
+        assert before.namelist() == after.namelist()
+        for name in before.namelist():
+            if name != 'word/document.xml':
+                assert before.read(name) == after.read(name)
+
+
+@pytest.mark.parametrize('edits, message', [
+    ([{'start': 2, 'end': 1, 'lines': []}], 'Intervalo inválido'),
+    ([{'start': 0, 'end': 4, 'lines': []}], 'Intervalo inválido'),
+    ([{'end': 1}], 'start, end e lines'),
+    ([{'start': 0, 'end': 1, 'lines': ['a\nb']}], 'único parágrafo'),
+    ([{'start': 0, 'end': 2, 'lines': []}, {'start': 1, 'end': 3, 'lines': []}], 'sobrepostos'),
+])
+def test_normalize_edits_rejects_invalid_edits(edits, message):
+    with pytest.raises(Exception, match=message):
+        normalize_edits(edits, 3)
+
+
+def test_normalize_edits_sorts_by_range():
+    edits = [{'start': 2, 'end': 3, 'lines': ['c']}, {'start': 0, 'end': 1, 'lines': ['a']}]
+
+    assert normalize_edits(edits, 3) == [(0, 1, ['a']), (2, 3, ['c'])]
+
+
+def test_diff_lines_round_trip():
+    old = ['a', 'b', 'c', 'd']
+    new = ['a', 'B', 'c', 'x', 'd', 'e']
+    data = docx_bytes(*old)
+
+    output, text = edit(data, [
+        {'start': start, 'end': end, 'lines': lines} for start, end, lines in diff_lines(old, new)
+    ])
+
+    assert text.split('\n') == new
+    assert extract_document_text(output).split('\n') == new
+
+
+
+def tab_and_break_document():
+    document = Document()
+    add_tab_and_break(document.add_paragraph(), 'Art. 1º', 'caput')
+    table = document.add_table(rows=1, cols=1)
+    add_tab_and_break(table.cell(0, 0).paragraphs[0], 'celula', 'quebrada')
+    add_text_box(document.add_paragraph('fora'), 'caixa')
+    return save(document)
+
+
+def test_extractors_agree_and_ignore_tabs_and_breaks():
+    data = tab_and_break_document()
+
+    text = extract_document_text(io.BytesIO(data))
+
+    assert text == compile_fragment(data).text == 'Art. 1ºcaput\ncelulaquebrada\nforacaixa'
+    with DocxParagraphEditor(io.BytesIO(data)) as editor:
+        assert editor.text() == text
+
+
+def test_editing_keeps_tabs_and_breaks():
+    output, text = edit(tab_and_break_document(), [{'start': 0, 'end': 1, 'lines': ['Art. 2ºcaput']}])
+
+    paragraph = open_document(output).paragraphs[0]._p
+    assert text.split('\n')[0] == 'Art. 2ºcaput'
+    assert len(paragraph.findall(f"{qn('w:r')}/{qn('w:tab')}")) == 1
+    assert len(paragraph.findall(f"{qn('w:r')}/{qn('w:br')}")) == 1
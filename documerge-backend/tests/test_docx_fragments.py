@@ -0,0 +1,116 @@
+import io
+import json
+import zipfile
+
+import pytest
+from docx import Document
+from docx_samples import (
+    add_bookmark, add_custom_style, add_footnote, add_numbered_list, add_picture, docx_bytes, save
+)
+from src.models.user import db, Client, Thesis
+from src.services.document_service import DocumentService
+from src.services.docx_fragments import FRAGMENT_FORMAT_VERSION, DocxFragment, compile_fragment
+from src.services.docx_merge import merge_documents
+from src.services.storage_backends import LocalStorageBackend
+from src.services.thesis_cache import thesis_content_cache
+
+
+@pytest.fixture
+def service(app, tmp_path):
+    return DocumentService(storage_backend=LocalStorageBackend(str(tmp_path)))
+
+
+@pytest.fixture
+def client_id(app):
+    client = Client(name='Cliente')
+    db.session.add(client)
+    db.session.commit()
+    return client.id
+
+
+def thesis_docx():
+    document = Document()
+    add_custom_style(document, 'TeseCorpo', 13)
+    paragraph = document.add_paragraph('Tese corpo', style='TeseCorpo')
+    add_bookmark(paragraph, 'Fundamento')
+    add_footnote(document, paragraph, 'Tese nota')
+    add_numbered_list(document, ['item 1', 'item 2'])
+    add_picture(document)
+    return save(document)
+
+
+def word_parts(data):
+    """Partes do pacote mesclado (exceto metadados), por nome"""
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in package.namelist() if not name.startswith('docProps/')}
+
+
+def add_thesis(client_id, gcs_path, content_hash, title='Tese'):
+    thesis = Thesis(client_id=client_id, title=title, gcs_path=gcs_path, content_hash=content_hash)
+    db.session.add(thesis)
+    db.session.commit()
+    return thesis
+
+
+def store_stale_fragment(service, gcs_path):
+    with service.download_stream(gcs_path) as stream:
+        fragment = compile_fragment(stream.read())
+    fragment.version = FRAGMENT_FORMAT_VERSION - 1
+    service.write_object(service.fragment_path(gcs_path), fragment.to_json(), 'application/json')
+
+
+def stored_version(service, gcs_path):
+    with service.download_stream(service.fragment_path(gcs_path)) as stream:
+        return json.loads(stream.read())['version']
+
+
+def test_stored_fragment_merges_like_compiled_document(service):
+    data = thesis_docx()
+    gcs_path, _ = service.upload_thesis_file(io.BytesIO(data))
+
+    loaded = service.load_thesis_fragment(gcs_path)
+
+    assert loaded is not None and loaded.is_current
+    assert loaded.text == compile_fragment(data).text
+    expected = word_parts(save(merge_documents([compile_fragment(data)])))
+    assert word_parts(save(merge_documents([loaded]))) == expected
+
+
+def test_fragment_json_round_trip_keeps_parts():
+    fragment = compile_fragment(thesis_docx())
+
+    loaded = DocxFragment.from_json(fragment.to_json())
+
+    assert loaded.to_json() == fragment.to_json()
+    assert set(loaded.styles) == set(fragment.styles)
+    assert set(loaded.notes['footnotes']) == set(fragment.notes['footnotes'])
+
+
+def test_stale_fragment_is_recompiled_on_read(service, client_id):
+    gcs_path, content_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese antiga')))
+    store_stale_fragment(service, gcs_path)
+    thesis = add_thesis(client_id, gcs_path, content_hash)
+    thesis_content_cache.invalidate(thesis.id)
+
+    assert service.load_thesis_fragment(gcs_path) is None
+    content = service.get_thesis_content(thesis)
+
+    assert content.is_current
+    assert content.text == 'Tese antiga'
+    # O fragmento recompilado substitui o armazenado
+    assert stored_version(service, gcs_path) == FRAGMENT_FORMAT_VERSION
+
+
+def test_rebuild_recompiles_only_stale_fragments(service, client_id):
+    stale_path, stale_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese antiga')))
+    current_path, current_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese atual')))
+    store_stale_fragment(service, stale_path)
+    stale = add_thesis(client_id, stale_path, stale_hash, 'A')
+    add_thesis(client_id, current_path, current_hash, 'B')
+    add_thesis(client_id, stale_path, stale_hash, 'C')
+
+    result = service.rebuild_thesis_fragments()
+
+    assert result == {'rebuilt': [stale.id], 'skipped': 2, 'failed': []}
+    assert stored_version(service, stale_path) == FRAGMENT_FORMAT_VERSION
+    assert service.rebuild_thesis_fragments() == {'rebuilt': [], 'skipped': 3, 'failed': []}
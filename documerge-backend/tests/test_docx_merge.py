@@ -0,0 +1,126 @@
+import hashlib
+
+from docx import Document
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx_samples import (
+    add_bookmark, add_custom_style, add_footnote, add_numbered_list, add_picture, open_document, save
+)
+from src.services.docx_fragments import compile_fragment
+from src.services.docx_merge import WP_DOCPR, merge_documents
+
+
+def thesis(name, style_size, rgb):
+    """Tese com estilo próprio (mesmo styleId em todas), lista numerada, nota, imagem e marcador"""
+    document = Document()
+    add_custom_style(document, 'TeseCorpo', style_size)
+    paragraph = document.add_paragraph(f'{name} corpo', style='TeseCorpo')
+    add_bookmark(paragraph, 'Fundamento')
+    add_footnote(document, paragraph, f'{name} nota')
+    add_numbered_list(document, [f'{name} item 1', f'{name} item 2'])
+    add_picture(document, rgb)
+    return save(document)
+
+
+def merged(*sources):
+    return open_document(save(merge_documents([compile_fragment(source) for source in sources])))
+
+
+def numbering_of(document):
+    numbering = document.part.numbering_part.element
+    return numbering, {
+        paragraph.text: paragraph._p.find(f"{qn('w:pPr')}/{qn('w:numPr')}/{qn('w:numId')}").get(qn('w:val'))
+        for paragraph in document.paragraphs if 'item' in paragraph.text
+    }
+
+
+def test_merged_document_keeps_text_in_order():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)))
+
+    texts = [paragraph.text for paragraph in document.paragraphs if paragraph.text]
+    assert texts == ['A corpo', 'A item 1', 'A item 2', 'B corpo', 'B item 1', 'B item 2']
+
+
+def test_clashing_style_ids_are_defined_once():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)))
+
+    style_ids = [style.get(qn('w:styleId')) for style in document.styles.element.iter(qn('w:style'))]
+    assert style_ids.count('TeseCorpo') == 1
+    assert len(style_ids) == len(set(style_ids))
+    assert document.paragraphs[0].style.style_id == 'TeseCorpo'
+
+
+def test_list_numbering_is_remapped_per_fragment():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)))
+
+    numbering, num_ids = numbering_of(document)
+    assert num_ids['A item 1'] == num_ids['A item 2']
+    assert num_ids['B item 1'] == num_ids['B item 2']
+    assert num_ids['A item 1'] != num_ids['B item 1']
+
+    nums = {num.get(qn('w:numId')): num for num in numbering.findall(qn('w:num'))}
+    abstract_ids = [abstract.get(qn('w:abstractNumId')) for abstract in numbering.findall(qn('w:abstractNum'))]
+    assert len(nums) == len(numbering.findall(qn('w:num')))
+    assert len(abstract_ids) == len(set(abstract_ids))
+    for item in ('A item 1', 'B item 1'):
+        abstract_id = nums[num_ids[item]].find(qn('w:abstractNumId')).get(qn('w:val'))
+        assert abstract_id in abstract_ids
+    assert num_ids['A item 1'] not in {num.get(qn('w:numId')) for num in Document().part.numbering_part.element.findall(qn('w:num'))}
+
+    # Todos os abstractNum antes do primeiro w:num, e sem nsid repetido
+    children = [child.tag for child in numbering]
+    assert max(i for i, tag in enumerate(children) if tag == qn('w:abstractNum')) < children.index(qn('w:num'))
+    nsids = [nsid.get(qn('w:val')) for nsid in numbering.iter(qn('w:nsid'))]
+    assert len(nsids) == len(set(nsids))
+
+
+def test_footnotes_are_copied_with_new_ids():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)))
+
+    notes = etree.fromstring(document.part.part_related_by(RT.FOOTNOTES).blob)
+    texts = {
+        note.get(qn('w:id')): ''.join(node.text for node in note.iter(qn('w:t')))
+        for note in notes.iter(qn('w:footnote')) if int(note.get(qn('w:id'))) > 0
+    }
+    references = [ref.get(qn('w:id')) for ref in document.element.body.iter(qn('w:footnoteReference'))]
+    assert [texts[ref] for ref in references] == ['A nota', 'B nota']
+
+
+def test_images_are_copied_and_docpr_ids_are_unique():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)), thesis('C', 12, (255, 0, 0)))
+
+    blobs = [document.part.related_parts[blip.get(qn('r:embed'))].blob for blip in document.element.body.iter(qn('a:blip'))]
+    assert len(blobs) == 3
+    # Imagens idênticas (A e C) compartilham a mesma parte
+    assert len({hashlib.sha1(blob).hexdigest() for blob in blobs}) == 2
+    image_parts = {part.partname for part in document.part.package.iter_parts() if part.content_type == 'image/png'}
+    assert len(image_parts) == 2
+    docpr_ids = [element.get('id') for element in document.element.body.iter(WP_DOCPR)]
+    assert len(docpr_ids) == len(set(docpr_ids)) == 3
+    assert len(document.inline_shapes) == 3
+
+
+def test_bookmarks_are_renamed_with_their_references():
+    document = merged(thesis('A', 11, (255, 0, 0)), thesis('B', 14, (0, 0, 255)))
+
+    body = document.element.body
+    names = [element.get(qn('w:name')) for element in body.iter(qn('w:bookmarkStart'))]
+    ids = [element.get(qn('w:id')) for element in body.iter(qn('w:bookmarkStart'))]
+    fields = [element.get(qn('w:instr')).split()[1] for element in body.iter(qn('w:fldSimple'))]
+    assert names == ['Fundamento', 'Fundamento_2']
+    assert fields == names
+    assert len(set(ids)) == 2
+    assert sorted(ids) == sorted(element.get(qn('w:id')) for element in body.iter(qn('w:bookmarkEnd')))
+
+
+def test_merging_into_a_base_document_appends_before_the_section():
+    base = Document()
+    base.add_paragraph('cabeçalho da petição')
+    document = merge_documents([compile_fragment(thesis('A', 11, (255, 0, 0)))], base=base)
+
+    body = document.element.body
+    assert body[-1].tag == qn('w:sectPr')
+    output = open_document(save(document))
+    assert output.paragraphs[0].text == 'cabeçalho da petição'
+    assert output.paragraphs[1].text == 'A corpo'
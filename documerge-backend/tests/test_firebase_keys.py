@@ -0,0 +1,77 @@
+import time
+
+import pytest
+from firebase_admin import auth
+from loadtest.signing_keys import FirebaseTestKeys
+from src.services.firebase_keys import FirebaseKeyManager
+
+PROJECT_ID = 'projeto-dos-testes'
+
+
+@pytest.fixture(scope='module')
+def keys():
+    return FirebaseTestKeys(PROJECT_ID)
+
+
+@pytest.fixture
+def manager(keys, tmp_path):
+    manager = FirebaseKeyManager(project_id=PROJECT_ID, keys_file=keys.write_keys_file(str(tmp_path / 'keys.json')))
+    manager.refresh()
+    return manager
+
+
+def test_valid_token_returns_claims_with_uid(manager, keys):
+    claims = manager.verify(keys.issue('user-1', email='a@b.com'))
+
+    assert claims['uid'] == 'user-1'
+    assert claims['email'] == 'a@b.com'
+
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'aud': 'outro-projeto'}, 'aud'),
+    ({'iss': 'https://securetoken.google.com/outro-projeto'}, 'iss'),
+    ({'sub': ''}, 'sub'),
+    ({'iat': int(time.time()) + 3600}, 'iat'),
+    ({'iat': None}, 'iat'),
+    ({'auth_time': int(time.time()) + 3600}, 'auth_time'),
+    ({'auth_time': None}, 'auth_time'),
+    ({'exp': None}, 'exp'),
+])
+def test_invalid_claims_are_rejected(manager, keys, overrides, message):
+    with pytest.raises(auth.InvalidIdTokenError, match=message):
+        manager.verify(keys.issue('user-1', **overrides))
+
+
+def test_expired_token_is_rejected(manager, keys):
+    now = int(time.time())
+    with pytest.raises(auth.ExpiredIdTokenError):
+        manager.verify(keys.issue('user-1', iat=now - 7200, auth_time=now - 7200, exp=now - 3600))
+
+
+def test_token_signed_by_other_key_with_same_kid_is_rejected(manager, keys):
+    impostor = FirebaseTestKeys(PROJECT_ID)
+    impostor.kid = keys.kid
+
+    with pytest.raises(auth.InvalidIdTokenError, match='Assinatura'):
+        manager.verify(impostor.issue('user-1'))
+
+
+def test_token_with_unknown_kid_is_rejected(manager):
+    with pytest.raises(auth.InvalidIdTokenError, match='Assinatura'):
+        manager.verify(FirebaseTestKeys(PROJECT_ID).issue('user-1'))
+
+
+def test_tampered_payload_is_rejected(manager, keys):
+    header, _, signature = keys.issue('user-1').split('.')
+    _, payload, _ = keys.issue('admin').split('.')
+
+    with pytest.raises(auth.InvalidIdTokenError, match='Assinatura'):
+        manager.verify(f"{header}.{payload}.{signature}")
+
+
+def test_sdk_verifies_while_no_keys_are_available(keys, tmp_path, monkeypatch):
+    manager = FirebaseKeyManager(project_id=PROJECT_ID, keys_file=str(tmp_path / 'ausente.json'))
+    monkeypatch.setattr(auth, 'verify_id_token', lambda token: {'uid': 'via-sdk'})
+
+    assert manager.verify(keys.issue('user-1')) == {'uid': 'via-sdk'}
+    assert manager.stats()['sdk_verifications'] == 1
@@ -0,0 +1,148 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from docx_samples import docx_bytes
+from src.models.user import db, Client, GeneratedPetition, PetitionModel, Question, Thesis, ThesisQuestionLink
+from src.services.document_service import DocumentService
+from src.services.petition_revisions import petition_revision_store
+from src.services.storage_backends import LocalStorageBackend
+from src.services.thesis_cache import thesis_content_cache
+from src.services.thesis_selection import selection_index_cache
+
+
+@pytest.fixture
+def service(app, tmp_path, monkeypatch):
+    service = DocumentService(storage_backend=LocalStorageBackend(str(tmp_path)))
+    monkeypatch.setattr(petition_revision_store, '_documents', service)
+    calls = {'render': 0, 'copy': 0}
+    render_petition, copy_object = service.render_petition, service.copy_object
+
+    def counting_render(*args, **kwargs):
+        calls['render'] += 1
+        return render_petition(*args, **kwargs)
+
+    def counting_copy(*args, **kwargs):
+        calls['copy'] += 1
+        return copy_object(*args, **kwargs)
+
+    monkeypatch.setattr(service, 'render_petition', counting_render)
+    monkeypatch.setattr(service, 'copy_object', counting_copy)
+    service.calls = calls
+    return service
+
+
+@pytest.fixture
+def model(service):
+    """Modelo com duas perguntas: 'sim' na 1 seleciona a tese A, 'sim' na 2 seleciona a B"""
+    client = Client(name='Cliente')
+    db.session.add(client)
+    db.session.flush()
+    model = PetitionModel(client_id=client.id, name='Modelo')
+    db.session.add(model)
+    db.session.flush()
+    for order, name in enumerate('AB', start=1):
+        gcs_path, content_hash = service.upload_thesis_file(io.BytesIO(docx_bytes(f'Tese {name}')))
+        thesis = Thesis(client_id=client.id, title=f'Tese {name}', gcs_path=gcs_path, content_hash=content_hash)
+        question = Question(petition_model_id=model.id, text=f'Pergunta {name}', order=order)
+        db.session.add_all([thesis, question])
+        db.session.flush()
+        db.session.add(ThesisQuestionLink(question_id=question.id, thesis_id=thesis.id, answer='sim'))
+    db.session.commit()
+    selection_index_cache.clear()
+    thesis_content_cache.clear()
+    return model
+
+
+def answers(model, *names):
+    questions = Question.query.filter_by(petition_model_id=model.id).order_by(Question.order).all()
+    return {str(question.id): question.text[-1] in names for question in questions}
+
+
+def generate(service, model, form_answers, title='Petição'):
+    return service.generate_petition(model.id, form_answers, user_id=1, client_id=model.client_id, title=title)
+
+
+def read_object(service, gcs_path):
+    with service.download_stream(gcs_path) as stream:
+        return stream.read()
+
+
+def thesis(name):
+    return Thesis.query.filter_by(title=f'Tese {name}').one()
+
+
+def test_identical_generation_copies_existing_petition(service, model):
+    first = generate(service, model, answers(model, 'A'))
+    second = generate(service, model, answers(model, 'A'))
+
+    assert service.calls == {'render': 1, 'copy': 1}
+    assert second.generation_key == first.generation_key
+    assert second.gcs_path != first.gcs_path
+    assert read_object(service, second.gcs_path) == read_object(service, first.gcs_path)
+    assert second.content_text == first.content_text
+
+
+def test_same_selection_from_different_answers_is_reused(service, model):
+    first = generate(service, model, answers(model, 'A'))
+    # Respostas que não alteram a seleção de teses geram a mesma chave
+    second = generate(service, model, {**answers(model, 'A'), 'extra': True})
+
+    assert second.generation_key == first.generation_key
+    assert service.calls == {'render': 1, 'copy': 1}
+
+
+def test_different_selection_is_rendered(service, model):
+    first = generate(service, model, answers(model, 'A'))
+    second = generate(service, model, answers(model, 'A', 'B'))
+
+    assert second.generation_key != first.generation_key
+    assert service.calls == {'render': 2, 'copy': 0}
+
+
+def test_updated_thesis_changes_key(service, model):
+    first = generate(service, model, answers(model, 'A'))
+
+    updated = thesis('A')
+    updated.updated_at = datetime.utcnow() + timedelta(seconds=1)
+    db.session.commit()
+    selection_index_cache.invalidate_thesis(updated.id)
+    second = generate(service, model, answers(model, 'A'))
+
+    assert second.generation_key != first.generation_key
+    assert service.calls == {'render': 2, 'copy': 0}
+
+
+def test_replaced_thesis_content_changes_key(service, model):
+    first = generate(service, model, answers(model, 'A'))
+
+    replaced = thesis('A')
+    gcs_path, content_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese A revisada')), replaced.id)
+    replaced.gcs_path, replaced.content_hash = gcs_path, content_hash
+    db.session.commit()
+    selection_index_cache.invalidate_thesis(replaced.id)
+    second = generate(service, model, answers(model, 'A'))
+
+    assert second.generation_key != first.generation_key
+    assert 'Tese A revisada' in second.content_text
+
+
+def test_key_depends_on_model_and_header(model):
+    theses = [thesis('A')]
+    key = DocumentService.compute_generation_key(model.id, theses, 'Petição')
+
+    assert DocumentService.compute_generation_key(model.id, theses, 'Petição') == key
+    assert DocumentService.compute_generation_key(model.id + 1, theses, 'Petição') != key
+    assert DocumentService.compute_generation_key(model.id, theses, 'Outra') != key
+    assert DocumentService.compute_generation_key(model.id, theses, 'Petição', '123') != key
+
+
+def test_edited_petition_is_not_reused(service, model):
+    first = generate(service, model, answers(model, 'A'))
+    service.update_petition_content(first.id, edits=[{'start': 0, 'end': 1, 'lines': ['Petição editada']}])
+    assert db.session.get(GeneratedPetition, first.id).generation_key is None
+
+    second = generate(service, model, answers(model, 'A'))
+
+    assert service.calls == {'render': 2, 'copy': 0}
+    assert second.content_text.split('\n')[0] == 'Petição'
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import update
+from src.models.user import db, User
+from src.services.auth_service import AuthService
+from src.services.identity_cache import UserIdentityCache
+
+
+@pytest.fixture
+def cache(app):
+    return UserIdentityCache(ttl=60)
+
+
+def add_user(uid, role):
+    user = User(firebase_uid=uid, email=f"{uid}@teste.com", role=role)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def change_in_other_worker(uid, **values):
+    # Alteração sem invalidar o cache deste processo; a requisição seguinte usa outra sessão
+    db.session.execute(update(User).where(User.firebase_uid == uid).values(**values))
+    db.session.commit()
+    db.session.remove()
+
+
+def load(uid):
+    return User.query.filter_by(firebase_uid=uid).first()
+
+
+def test_admin_role_and_activation_are_read_from_database(cache):
+    add_user('admin', 'advogado_administrador')
+    cache.get_user('admin', load)
+
+    change_in_other_worker('admin', role='advogado_redator')
+    user = cache.get_user('admin', load)
+    assert cache.stats()['hits'] == 1
+    assert user.role == 'advogado_redator'
+    assert not AuthService().check_user_permission(user, 'advogado_administrador')
+
+    change_in_other_worker('admin', role='dev', is_active=False)
+    user = cache.get_user('admin', load)
+    assert user.is_active is False
+    assert not AuthService().check_user_permission(user, 'advogado_redator')
+
+
+def test_regular_identity_is_served_from_cache_until_ttl(cache):
+    add_user('redator', 'advogado_redator')
+    cache.get_user('redator', load)
+
+    change_in_other_worker('redator', role='advogado_administrador')
+    user = cache.get_user('redator', load)
+
+    # Defasagem documentada: até USER_IDENTITY_CACHE_TTL, nunca a favor de mais acesso
+    assert user.role == 'advogado_redator'
+    assert user._user is None
+
+    cache.invalidate('redator')
+    assert cache.get_user('redator', load).role == 'advogado_administrador'
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+from src.services.storage_backends import GenerationMismatch, LocalStorageBackend, ObjectNotFound
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path))
+
+
+def read(storage, key):
+    with storage.open_reader(key) as stream:
+        return stream.read()
+
+
+def files_under(root):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+        for directory, _, names in os.walk(root) for name in names
+    )
+
+
+def test_object_is_published_only_when_writer_closes(storage, tmp_path):
+    storage.write('client_1/a.docx', b'original')
+
+    with storage.open_writer('client_1/a.docx') as writer:
+        writer.write(b'nova')
+        # Leitores continuam vendo a geração anterior até a publicação
+        assert read(storage, 'client_1/a.docx') == b'original'
+        assert [info.key for info in storage.list('client_1/')] == ['client_1/a.docx']
+
+    assert read(storage, 'client_1/a.docx') == b'nova'
+    assert writer.generation == storage.stat('client_1/a.docx').generation
+    assert not [name for name in files_under(tmp_path) if name.endswith('.tmp')]
+
+
+def test_failed_write_leaves_previous_generation(storage, tmp_path):
+    generation = storage.write('client_1/a.docx', b'original')
+
+    with pytest.raises(RuntimeError):
+        with storage.open_writer('client_1/a.docx') as writer:
+            writer.write(b'parcial')
+            raise RuntimeError('falha no meio da escrita')
+
+    assert read(storage, 'client_1/a.docx') == b'original'
+    assert storage.stat('client_1/a.docx').generation == generation
+    assert not [name for name in files_under(tmp_path) if name.endswith('.tmp')]
+
+
+def test_generations_increase_and_guard_conditional_writes(storage):
+    assert storage.write('a.docx', b'1', if_generation_match=0) is not None
+    with pytest.raises(GenerationMismatch):
+        storage.write('a.docx', b'2', if_generation_match=0)
+
+    first = storage.stat('a.docx').generation
+    second = storage.write('a.docx', b'2', if_generation_match=first)
+    assert second > first
+
+    with pytest.raises(GenerationMismatch):
+        storage.write('a.docx', b'3', if_generation_match=first)
+    with pytest.raises(GenerationMismatch):
+        storage.delete('a.docx', if_generation_match=first)
+    assert read(storage, 'a.docx') == b'2'
+
+    assert storage.delete('a.docx', if_generation_match=second) is True
+    assert storage.delete('a.docx') is False
+
+
+def test_objects_are_sharded_by_name(storage, tmp_path):
+    storage.write('client_1/petitions/a.docx', b'a')
+    storage.write('client_1/petitions/b.docx', b'b')
+
+    stored = [name for name in files_under(tmp_path) if not name.endswith('.lock')]
+    assert len(stored) == 2
+    for name in stored:
+        directory, shard, _ = name.rsplit('/', 2)
+        assert directory == 'client_1/petitions'
+        assert shard.startswith('@') and len(shard) == 3
+    assert [info.key for info in storage.list('client_1/petitions/')] == [
+        'client_1/petitions/a.docx', 'client_1/petitions/b.docx'
+    ]
+    assert [info.key for info in storage.list('client_1/petitions/a')] == ['client_1/petitions/a.docx']
+
+
+def test_unsharded_legacy_files_stay_readable(storage, tmp_path):
+    (tmp_path / 'theses').mkdir()
+    (tmp_path / 'theses' / 'antiga.docx').write_bytes(b'antiga')
+
+    assert read(storage, 'theses/antiga.docx') == b'antiga'
+    assert [info.key for info in storage.list('theses/')] == ['theses/antiga.docx']
+
+    # A nova geração (com shard) prevalece sobre o arquivo antigo
+    storage.write('theses/antiga.docx', b'nova')
+    assert read(storage, 'theses/antiga.docx') == b'nova'
+    assert [info.size for info in storage.list('theses/')] == [4]
+
+
+def test_range_reads(storage):
+    generation = storage.write('a.bin', bytes(range(10)))
+
+    assert storage.read_range('a.bin', 2, 5) == bytes([2, 3, 4])
+    assert storage.read_range('a.bin', 7) == bytes([7, 8, 9])
+    assert storage.read_range('a.bin', 5, 5) == b''
+    assert storage.read_range('a.bin', 0, 3, generation=generation) == bytes([0, 1, 2])
+
+    storage.write('a.bin', b'outra')
+    with pytest.raises(GenerationMismatch):
+        storage.read_range('a.bin', 0, 3, generation=generation)
+    with pytest.raises(ObjectNotFound):
+        storage.read_range('ausente.bin', 0, 3)
+
+
+def test_uri_mapping(storage, tmp_path):
+    uri = storage.uri('client_1/a.docx')
+
+    assert uri == 'local://client_1/a.docx'
+    assert storage.owns(uri) and storage.key_for(uri) == 'client_1/a.docx'
+    # Caminhos absolutos antigos dentro da raiz continuam mapeados para a chave
+    legacy = str(tmp_path / 'client_1' / 'a.docx')
+    assert storage.owns(legacy) and storage.key_for(legacy) == 'client_1/a.docx'
+    assert not storage.owns('gs://bucket/client_1/a.docx')
+    assert not storage.owns(str(tmp_path.parent / 'fora.docx'))
+
+
+@pytest.mark.parametrize('key', ['', '/a.docx', 'a/../b.docx', 'a//b.docx', '@3f/a.docx', 'a/.oculto', 'a/./b.docx'])
+def test_invalid_keys_are_rejected(storage, key):
+    with pytest.raises(Exception, match='Chave de objeto inválida'):
+        storage.write(key, b'x')
+    with pytest.raises(Exception, match='Chave de objeto inválida'):
+        storage.key_for(f'local://{key}')
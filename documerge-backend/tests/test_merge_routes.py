@@ -0,0 +1,64 @@
+import pytest
+from docx_samples import docx_bytes, open_document
+from src.services import document_service as document_service_module
+from src.services.document_service import DOCX_CONTENT_TYPE, document_service
+
+
+@pytest.fixture
+def user(login):
+    user, headers = login()
+    storage = document_service.storage
+    paths = []
+    for name in ('a', 'b'):
+        path = f'users/{user.firebase_uid}/{name}.docx'
+        storage.write(path, docx_bytes(f'Documento {name}'), DOCX_CONTENT_TYPE)
+        paths.append(path)
+    yield user, headers, paths
+    for info in list(storage.list(f'users/{user.firebase_uid}/')):
+        storage.delete(info.key)
+
+
+def merge(client, headers, paths):
+    return client.post('/api/documents/merge', json={'document_paths': paths}, headers=headers)
+
+
+def merged_keys(user):
+    return sorted(info.key for info in document_service.storage.list(f'users/{user.firebase_uid}/merged_'))
+
+
+def test_merge_writes_documents_in_order(client, user):
+    user, headers, paths = user
+
+    response = merge(client, headers, list(reversed(paths)))
+
+    assert response.status_code == 200
+    blob_path = response.get_json()['merged_blob_path']
+    assert merged_keys(user) == [blob_path]
+    with document_service.storage.open_reader(blob_path) as stream:
+        document = open_document(stream.read())
+    assert [paragraph.text for paragraph in document.paragraphs if paragraph.text] == ['Documento b', 'Documento a']
+
+
+@pytest.mark.parametrize('foreign', ['users/outro/a.docx', 'users/{uid}/../outro/a.docx', 'theses/a.docx', 7])
+def test_merge_rejects_paths_of_other_users(client, user, foreign):
+    user, headers, paths = user
+    if isinstance(foreign, str):
+        foreign = foreign.format(uid=user.firebase_uid)
+
+    response = merge(client, headers, [paths[0], foreign])
+
+    assert response.status_code == 403
+    assert merged_keys(user) == []
+
+
+def test_merge_over_memory_budget_is_rejected_before_download(client, user, monkeypatch):
+    user, headers, paths = user
+    size = document_service.storage.stat(paths[0]).size
+    monkeypatch.setattr(document_service_module, 'MERGE_MEMORY_BUDGET_BYTES', size)
+    monkeypatch.setattr(document_service, '_fetch_merge_fragment', pytest.fail)
+
+    response = merge(client, headers, paths)
+
+    assert response.status_code == 500
+    assert 'orçamento de memória' in response.get_json()['error']
+    assert merged_keys(user) == []
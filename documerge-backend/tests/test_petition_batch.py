@@ -0,0 +1,16 @@
+from src.services.document_service import document_service
+
+
+def test_batch_reports_malformed_rows_individually(app):
+    rows = [1, 'x', {'form_answers': ['1'], 'title': 'Petição'}, {'form_answers': {'1': True}, 'title': 7}, {}]
+
+    results = document_service.generate_petitions_batch(
+        petition_model_id=1, rows=rows, user_id=1, client_id=1
+    )
+
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert all(result['status'] == 'error' for result in results)
+    assert results[0]['error'] == results[1]['error'] == 'Cada linha deve ser um objeto'
+    assert 'form_answers deve ser um objeto' in results[2]['error']
+    assert 'form_answers deve ser um objeto' in results[3]['error']
+    assert results[4]['error'] == 'form_answers e title são obrigatórios'
@@ -0,0 +1,125 @@
+import uuid
+
+import pytest
+from docx_samples import docx_bytes
+from src.models.user import db, GeneratedPetition
+from src.services import document_service as document_service_module
+from src.services.document_service import DOCX_CONTENT_TYPE, DocumentService, document_service
+
+
+@pytest.fixture
+def petition(login):
+    user, headers = login()
+    gcs_path = document_service.object_path(f'petitions/{uuid.uuid4().hex}.docx')
+    document_service.write_object(gcs_path, docx_bytes('Petição', 'Fatos', 'Pedido'), DOCX_CONTENT_TYPE)
+    petition = GeneratedPetition(user_id=user.id, client_id=1, title='Petição', gcs_path=gcs_path)
+    db.session.add(petition)
+    db.session.commit()
+    yield petition, headers
+    document_service.delete_file(gcs_path)
+
+
+def no_storage(*args, **kwargs):
+    pytest.fail('o texto armazenado deveria ser usado')
+
+
+def test_stored_text_is_served_without_storage(client, petition, monkeypatch):
+    petition, headers = petition
+    DocumentService.set_petition_text(petition, 'Texto\narmazenado')
+    db.session.commit()
+    monkeypatch.setattr(document_service, 'extract_petition_text', no_storage)
+
+    response = client.get(f'/api/petitions/{petition.id}/content', headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['content'] == 'Texto\narmazenado'
+
+
+def test_missing_text_is_extracted_and_backfilled(client, petition, monkeypatch):
+    petition, headers = petition
+
+    response = client.get(f'/api/petitions/{petition.id}/content', headers=headers)
+
+    assert response.get_json()['content'] == 'Petição\nFatos\nPedido'
+    stored = db.session.get(GeneratedPetition, petition.id, populate_existing=True)
+    assert stored.content_text_path == stored.gcs_path
+    monkeypatch.setattr(document_service, 'extract_petition_text', no_storage)
+    assert document_service.get_petition_content(petition.id)['content'] == 'Petição\nFatos\nPedido'
+
+
+def test_text_of_another_file_is_not_served(client, petition):
+    petition, headers = petition
+    # Texto extraído de um arquivo anterior (ex.: gravado antes de a petição trocar de arquivo)
+    petition.content_text = 'Versão antiga'
+    petition.content_text_path = document_service.object_path('petitions/antiga.docx')
+    db.session.commit()
+
+    assert DocumentService.stored_petition_text(petition) is None
+    response = client.get(f'/api/petitions/{petition.id}/content', headers=headers)
+
+    assert response.get_json()['content'] == 'Petição\nFatos\nPedido'
+    stored = db.session.get(GeneratedPetition, petition.id, populate_existing=True)
+    assert (stored.content_text, stored.content_text_path) == ('Petição\nFatos\nPedido', stored.gcs_path)
+
+
+def paragraphs(client, headers, petition_id, **params):
+    response = client.get(f'/api/petitions/{petition_id}/paragraphs', query_string=params, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_paragraph_pages_cover_document(client, petition):
+    petition, headers = petition
+
+    status, first = paragraphs(client, headers, petition.id, limit=2)
+    _, second = paragraphs(client, headers, petition.id, offset=first['next_offset'], limit=2)
+
+    assert status == 200
+    assert first['total'] == second['total'] == 3
+    assert first['paragraphs'] == [{'id': 0, 'text': 'Petição'}, {'id': 1, 'text': 'Fatos'}]
+    assert second['paragraphs'] == [{'id': 2, 'text': 'Pedido'}]
+    assert (first['next_offset'], second['next_offset']) == (2, None)
+
+
+def test_paragraph_range_bounds(client, petition, monkeypatch):
+    petition, headers = petition
+    monkeypatch.setattr(document_service_module, 'PETITION_PARAGRAPHS_MAX_LIMIT', 2)
+
+    _, past_end = paragraphs(client, headers, petition.id, offset=10)
+    _, capped = paragraphs(client, headers, petition.id, limit=1000)
+    _, clamped = paragraphs(client, headers, petition.id, offset=-5, limit=0)
+
+    assert (past_end['offset'], past_end['paragraphs'], past_end['next_offset']) == (10, [], None)
+    assert past_end['total'] == 3
+    assert (capped['limit'], len(capped['paragraphs']), capped['next_offset']) == (2, 2, 2)
+    assert (clamped['offset'], clamped['limit']) == (0, 1)
+    assert clamped['paragraphs'] == [{'id': 0, 'text': 'Petição'}]
+
+
+def test_paragraph_version_changes_with_edits(client, petition):
+    petition, headers = petition
+    _, before = paragraphs(client, headers, petition.id)
+
+    document_service.update_petition_content(petition.id, edits=[{'start': 1, 'end': 2, 'lines': ['Fatos novos']}])
+    _, after = paragraphs(client, headers, petition.id)
+
+    assert before['version'] != after['version']
+    assert after['paragraphs'][1] == {'id': 1, 'text': 'Fatos novos'}
+
+
+@pytest.mark.parametrize('params', [{'offset': 'x'}, {'limit': '1.5'}])
+def test_invalid_paragraph_range_returns_400(client, petition, params):
+    petition, headers = petition
+
+    status, body = paragraphs(client, headers, petition.id, **params)
+
+    assert status == 400
+    assert 'error' in body
+
+
+def test_paragraphs_of_other_users_are_forbidden(client, petition, login):
+    petition, _ = petition
+    _, headers = login()
+
+    status, _ = paragraphs(client, headers, petition.id)
+
+    assert status == 403
@@ -0,0 +1,149 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from src.models.user import db, GeneratedPetition, PetitionJob
+from src.services import petition_jobs
+from src.services.document_service import DOCX_CONTENT_TYPE, document_service
+from src.services.petition_jobs import PetitionJobQueue
+
+
+@pytest.fixture
+def queue(app, monkeypatch):
+    generated = []
+
+    def fake_generate_petition(commit=True, **kwargs):
+        gcs_path = document_service.object_path(f"petitions/{uuid.uuid4().hex}.docx")
+        document_service.write_object(gcs_path, b'docx', DOCX_CONTENT_TYPE)
+        petition = GeneratedPetition(
+            user_id=kwargs['user_id'], client_id=kwargs['client_id'], title=kwargs['title'], gcs_path=gcs_path
+        )
+        db.session.add(petition)
+        db.session.flush()
+        if commit:
+            db.session.commit()
+        generated.append((petition.id, gcs_path))
+        return petition
+
+    monkeypatch.setattr(petition_jobs.document_service, 'generate_petition', fake_generate_petition)
+    queue = PetitionJobQueue()
+    queue.generated = generated
+    return queue
+
+
+def enqueue(queue):
+    return queue.enqueue(1, {'1': True}, user_id=1, client_id=1, title='Petição')
+
+
+def expire_lease(job_id):
+    db.session.get(PetitionJob, job_id).locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_run_job_records_result_while_holding_lease(queue):
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+
+    assert queue.run_job(job, 'worker-a') is True
+
+    job = db.session.get(PetitionJob, job.id, populate_existing=True)
+    assert job.status == 'done'
+    assert job.petition_id == queue.generated[0][0]
+    assert GeneratedPetition.query.count() == 1
+    assert job.locked_until is None
+
+
+def test_run_job_drops_result_after_another_worker_reclaims(queue):
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+    expire_lease(job.id)
+    assert queue.claim_next('worker-b').id == job.id
+
+    assert queue.run_job(job, 'worker-a') is False
+
+    job = db.session.get(PetitionJob, job.id, populate_existing=True)
+    assert job.status == 'running'
+    assert job.locked_by == 'worker-b'
+    assert job.petition_id is None
+    # A petição do worker que perdeu a reserva não fica órfã (nem no banco, nem no storage)
+    petition_id, gcs_path = queue.generated[0]
+    assert db.session.get(GeneratedPetition, petition_id) is None
+    assert not document_service.object_exists(gcs_path)
+
+
+def test_run_job_drops_result_when_heartbeat_reports_lost_lease(queue):
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+    lease_lost = threading.Event()
+    lease_lost.set()
+
+    assert queue.run_job(job, 'worker-a', lease_lost) is False
+
+    assert db.session.get(PetitionJob, job.id, populate_existing=True).status == 'running'
+    assert GeneratedPetition.query.count() == 0
+
+
+def test_retry_after_lost_lease_records_a_single_petition(queue):
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+    expire_lease(job.id)
+    retry = queue.claim_next('worker-b')
+
+    assert queue.run_job(retry, 'worker-b') is True
+    assert queue.run_job(job, 'worker-a') is False
+
+    job = db.session.get(PetitionJob, job.id, populate_existing=True)
+    (kept_id, kept_path), (_, dropped_path) = queue.generated
+    assert (job.status, job.petition_id, job.attempts) == ('done', kept_id, 2)
+    assert [petition.id for petition in GeneratedPetition.query.all()] == [kept_id]
+    assert document_service.object_exists(kept_path)
+    assert not document_service.object_exists(dropped_path)
+
+
+def test_worker_crash_before_commit_leaves_no_petition(queue, monkeypatch):
+    job_id = enqueue(queue).id
+    job = queue.claim_next('worker-a')
+
+    # O worker morre depois de gerar a petição e antes de gravar o resultado
+    def crash(*args, **kwargs):
+        raise SystemExit()
+
+    with monkeypatch.context() as patch, pytest.raises(SystemExit):
+        patch.setattr(db.session, 'commit', crash)
+        queue.run_job(job, 'worker-a')
+    db.session.remove()
+
+    assert GeneratedPetition.query.count() == 0
+    expire_lease(job_id)
+    retry = queue.claim_next('worker-b')
+    assert queue.run_job(retry, 'worker-b') is True
+    assert GeneratedPetition.query.count() == 1
+    assert db.session.get(PetitionJob, job_id).petition_id == queue.generated[-1][0]
+
+
+def test_renew_lease_fails_after_reclaim(queue):
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+    expire_lease(job.id)
+    queue.claim_next('worker-b')
+
+    assert queue.renew_lease(job.id, 'worker-a') is False
+    assert queue.renew_lease(job.id, 'worker-b') is True
+
+
+def test_failed_generation_is_recorded_only_by_lease_holder(queue, monkeypatch):
+    def failing_generate_petition(**kwargs):
+        raise Exception("Nenhuma tese foi selecionada")
+
+    monkeypatch.setattr(petition_jobs.document_service, 'generate_petition', failing_generate_petition)
+    enqueue(queue)
+    job = queue.claim_next('worker-a')
+
+    assert queue.run_job(job, 'worker-a') is True
+
+    job = db.session.get(PetitionJob, job.id, populate_existing=True)
+    assert job.status == 'failed'
+    assert 'Nenhuma tese' in job.error
+    assert json.loads(job.form_data) == {'1': True}
@@ -0,0 +1,93 @@
+import pytest
+from src.models.user import db, GeneratedPetition, PetitionRevision
+from src.services import petition_revisions
+from src.services.document_service import DOCX_CONTENT_TYPE, document_service
+from src.services.docx_text import extract_document_text
+from src.services.petition_revisions import petition_revision_store
+from src.services.search_index import search_index
+
+from docx_samples import docx_bytes
+
+
+@pytest.fixture
+def petition(app):
+    gcs_path = document_service.object_path('petitions/revisoes.docx')
+    document_service.write_object(gcs_path, docx_bytes('Petição', 'Fatos', 'Pedido'), DOCX_CONTENT_TYPE)
+    petition = GeneratedPetition(user_id=1, client_id=1, title='Petição', gcs_path=gcs_path)
+    db.session.add(petition)
+    db.session.commit()
+    yield petition
+    document_service.delete_file(gcs_path)
+    for number in range(1, 10):
+        document_service.delete_file(gcs_path.replace('.docx', f'.rev{number}.docx'))
+
+
+def read_object(gcs_path):
+    with document_service.download_stream(gcs_path) as stream:
+        return stream.read()
+
+
+def base_path(petition, number):
+    return petition.gcs_path.replace('.docx', f'.rev{number}.docx')
+
+
+def test_revisions_rebuild_across_rebase(petition, monkeypatch):
+    monkeypatch.setattr(petition_revisions, 'PETITION_REVISION_REBASE_EVERY', 2)
+    versions = {1: 'Petição\nFatos\nPedido'}
+    files = {1: read_object(petition.gcs_path)}
+
+    for number in range(2, 7):
+        document_service.update_petition_content(
+            petition.id, edits=[{'start': 1, 'end': 2, 'lines': [f'Fatos v{number}']}], user_id=1
+        )
+        versions[number] = f'Petição\nFatos v{number}\nPedido'
+        files[number] = read_object(petition.gcs_path)
+
+    revisions = petition_revision_store.list_revisions(petition.id)
+    assert [revision.kind for revision in revisions] == ['base', 'delta', 'delta', 'base', 'delta', 'delta']
+    # A primeira base é o arquivo substituído; a do rebase, o arquivo editado daquela revisão
+    assert read_object(revisions[0].gcs_path) == files[1]
+    assert read_object(revisions[3].gcs_path) == files[4]
+
+    for number, text in versions.items():
+        assert petition_revision_store.revision_text(petition.id, number) == text
+        with petition_revision_store.revision_document(petition.id, number) as stream:
+            assert extract_document_text(stream) == text
+
+
+def test_base_is_written_from_replaced_generation(petition):
+    original = read_object(petition.gcs_path)
+
+    document_service.update_petition_content(petition.id, edits=[{'start': 2, 'end': 3, 'lines': ['Pedidos']}])
+
+    revision = petition_revision_store.get_revision(petition.id, 1)
+    assert revision.gcs_path == base_path(petition, 1)
+    assert read_object(revision.gcs_path) == original
+
+
+def test_concurrent_edit_leaves_no_base(petition, monkeypatch):
+    current = document_service.stat_object(petition.gcs_path)
+    stale = current._replace(generation=current.generation + 1)
+    monkeypatch.setattr(document_service, 'stat_object', lambda path: stale)
+
+    with pytest.raises(Exception, match='alterada por outra edição'):
+        document_service.update_petition_content(petition.id, edits=[{'start': 1, 'end': 2, 'lines': ['Outros']}])
+
+    assert PetitionRevision.query.filter_by(petition_id=petition.id).count() == 0
+    assert not document_service.object_exists(base_path(petition, 1))
+
+
+def test_rollback_removes_written_bases(petition, monkeypatch):
+    monkeypatch.setattr(petition_revisions, 'PETITION_REVISION_REBASE_EVERY', 0)
+
+    def fail(*args, **kwargs):
+        raise Exception('índice indisponível')
+
+    monkeypatch.setattr(search_index, 'index_petition', fail)
+
+    with pytest.raises(Exception, match='índice indisponível'):
+        document_service.update_petition_content(petition.id, edits=[{'start': 1, 'end': 2, 'lines': ['Outros']}])
+
+    assert PetitionRevision.query.filter_by(petition_id=petition.id).count() == 0
+    assert not document_service.object_exists(base_path(petition, 1))
+    assert not document_service.object_exists(base_path(petition, 2))
@@ -0,0 +1,113 @@
+import io
+import os
+
+import pytest
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from lxml import etree
+from docx_samples import add_custom_style, add_footnote, add_numbered_list, add_picture, open_document, save
+from src.models.user import db, Client, Thesis
+from src.services import document_service as document_service_module
+from src.services.document_service import DocumentService
+from src.services.docx_fragments import compile_fragment
+from src.services.docx_text import extract_document_text
+from src.services.storage_backends import LocalStorageBackend
+
+
+@pytest.fixture
+def service(app, tmp_path):
+    return DocumentService(storage_backend=LocalStorageBackend(str(tmp_path)))
+
+
+@pytest.fixture
+def theses(app):
+    client = Client(name='Cliente')
+    db.session.add(client)
+    db.session.commit()
+    theses = [Thesis(client_id=client.id, title=f'Tese {name}', gcs_path=f'local://theses/{name}.docx')
+              for name in 'ABC']
+    db.session.add_all(theses)
+    db.session.commit()
+    return theses
+
+
+def thesis_docx(name, rgb):
+    document = Document()
+    add_custom_style(document, 'TeseCorpo', 12)
+    paragraph = document.add_paragraph(f'{name} corpo', style='TeseCorpo')
+    add_footnote(document, paragraph, f'{name} nota')
+    add_numbered_list(document, [f'{name} item 1', f'{name} item 2'])
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = f'{name} célula'
+    add_picture(document, rgb)
+    return save(document)
+
+
+def contents():
+    return [compile_fragment(thesis_docx(name, rgb))
+            for name, rgb in (('A', (255, 0, 0)), ('B', (0, 255, 0)), ('C', (0, 0, 255)))]
+
+
+def read_object(service, gcs_path):
+    with service.download_stream(gcs_path) as stream:
+        return stream.read()
+
+
+def summary(data):
+    """Estrutura visível da petição: parágrafos (estilo e texto), tabelas, imagens e notas"""
+    document = open_document(data)
+    footnotes = [rel.target_part for rel in document.part.rels.values() if rel.reltype == RT.FOOTNOTES]
+    return {
+        'paragraphs': [(paragraph.style.name, paragraph.text) for paragraph in document.paragraphs],
+        'tables': [[cell.text for cell in table._cells] for table in document.tables],
+        'images': sorted(len(part.blob) for part in document.part.package.iter_parts()
+                         if part.partname.startswith('/word/media/')),
+        'footnotes': [node.text for part in footnotes for node in etree.fromstring(part.blob).iter(qn('w:t'))],
+    }
+
+
+def test_streamed_petition_matches_in_memory_merge(service, theses):
+    streamed_path, streamed_text = service.render_petition(
+        theses, 1, 1, 'Petição', process_number='123', streaming=True, theses_content=contents()
+    )
+    merged_path, merged_text = service.render_petition(
+        theses, 1, 1, 'Petição', process_number='123', streaming=False, theses_content=contents()
+    )
+
+    streamed = read_object(service, streamed_path)
+    merged = read_object(service, merged_path)
+    assert streamed_text == merged_text
+    assert extract_document_text(io.BytesIO(streamed)) == extract_document_text(io.BytesIO(merged))
+    assert summary(streamed) == summary(merged)
+    assert len(summary(streamed)['images']) == 3
+    assert summary(streamed)['footnotes'] == ['A nota', 'B nota', 'C nota']
+
+
+def test_streaming_is_chosen_from_thesis_count(service, theses, monkeypatch):
+    monkeypatch.setattr(document_service_module, 'PETITION_STREAMING_MIN_THESES', len(theses))
+    uploads = []
+    upload_petition_file = service.upload_petition_file
+
+    def record_upload(content, *args):
+        uploads.append(callable(content))
+        return upload_petition_file(content, *args)
+
+    monkeypatch.setattr(service, 'upload_petition_file', record_upload)
+
+    service.render_petition(theses, 1, 1, 'Petição', theses_content=contents())
+    service.render_petition(theses[:-1], 1, 1, 'Petição', theses_content=contents()[:-1])
+
+    assert uploads == [True, False]
+
+
+def test_error_mid_stream_publishes_nothing(service, theses, tmp_path):
+    def failing_contents():
+        yield from contents()[:1]
+        raise Exception('tese indisponível')
+
+    with pytest.raises(Exception, match='tese indisponível'):
+        service.render_petition(theses, 1, 1, 'Petição', streaming=True, theses_content=failing_contents())
+
+    assert list(service.storage.list('client_1/')) == []
+    assert [files for _, _, files in os.walk(tmp_path) if files] == []
@@ -0,0 +1,58 @@
+import pytest
+from src.models.user import db, Client, Thesis
+from src.services.search_index import SEARCH_MAX_LIMIT, search_index
+
+
+@pytest.fixture
+def client_id(app):
+    client = Client(name='Cliente')
+    db.session.add(client)
+    db.session.flush()
+    thesis = Thesis(client_id=client.id, title='Dano moral', description='', gcs_path='local://theses/a.docx')
+    db.session.add(thesis)
+    db.session.flush()
+    search_index.index_thesis(thesis, body='Indenização por dano moral')
+    db.session.commit()
+    return client.id
+
+
+def search(client, headers, client_id, **params):
+    return client.get(f'/api/legal/clients/{client_id}/search', query_string=params, headers=headers)
+
+
+def test_search_returns_ranked_theses(client, login, client_id):
+    _, headers = login()
+
+    response = search(client, headers, client_id, q='indenizacao', type='theses')
+
+    assert response.status_code == 200
+    results = response.get_json()['theses']['results']
+    assert [result['thesis']['title'] for result in results] == ['Dano moral']
+    assert '<mark>' in results[0]['snippet']
+
+
+@pytest.mark.parametrize('params', [
+    {'q': '!!!'},
+    {'q': 'dano', 'limit': 0},
+    {'q': 'dano', 'limit': SEARCH_MAX_LIMIT + 1},
+    {'q': 'dano', 'offset': -1},
+    {'q': 'dano', 'limit': 'x'},
+    {'q': 'dano', 'type': 'outros'},
+    {},
+])
+def test_invalid_search_parameters_return_400(client, login, client_id, params):
+    _, headers = login()
+
+    response = search(client, headers, client_id, **params)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unavailable_index_returns_503(client, login, client_id, monkeypatch):
+    _, headers = login()
+    monkeypatch.setattr(search_index, 'available', lambda: False)
+
+    response = search(client, headers, client_id, q='dano')
+
+    assert response.status_code == 503
@@ -0,0 +1,95 @@
+import io
+
+import pytest
+from docx_samples import docx_bytes
+from src.models.user import db, Client, Thesis
+from src.services.document_service import DocumentService
+from src.services.storage_backends import LocalStorageBackend
+
+
+@pytest.fixture
+def service(app, tmp_path):
+    return DocumentService(storage_backend=LocalStorageBackend(str(tmp_path)))
+
+
+@pytest.fixture
+def client_id(app):
+    client = Client(name='Cliente')
+    db.session.add(client)
+    db.session.commit()
+    return client.id
+
+
+def add_thesis(client_id, gcs_path, content_hash, title='Tese'):
+    thesis = Thesis(client_id=client_id, title=title, gcs_path=gcs_path, content_hash=content_hash)
+    db.session.add(thesis)
+    db.session.commit()
+    return thesis
+
+
+def stored_keys(service):
+    return sorted(info.key for info in service.storage.list('theses/'))
+
+
+def test_identical_content_is_stored_once(service, client_id):
+    data = docx_bytes('Tese compartilhada')
+    first = service.upload_thesis_file(io.BytesIO(data))
+    second = service.upload_thesis_file(io.BytesIO(data))
+
+    assert first == second
+    assert service.find_thesis_blob(first[1]) == first[0]
+    assert len([key for key in stored_keys(service) if key.endswith('.docx')]) == 1
+
+
+def test_shared_content_is_kept_until_last_reference(service, client_id):
+    gcs_path, content_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese')))
+    first = add_thesis(client_id, gcs_path, content_hash, 'A')
+    second = add_thesis(client_id, gcs_path, content_hash, 'B')
+
+    db.session.delete(first)
+    db.session.commit()
+    assert service.release_thesis_file(gcs_path, content_hash) is False
+    assert service.object_exists(gcs_path)
+
+    db.session.delete(second)
+    db.session.commit()
+    assert service.release_thesis_file(gcs_path, content_hash) is True
+    assert not service.object_exists(gcs_path)
+    assert stored_keys(service) == []
+
+
+def test_release_restores_content_reused_during_delete(service, client_id, monkeypatch):
+    gcs_path, content_hash = service.upload_thesis_file(io.BytesIO(docx_bytes('Tese')))
+    delete_file = service.delete_file
+    reused = []
+
+    def delete_then_reuse(path):
+        delete_file(path)
+        if path == gcs_path and not reused:
+            # Outra requisição cria uma tese com o mesmo conteúdo entre a contagem e a remoção
+            reused.append(add_thesis(client_id, gcs_path, content_hash))
+
+    monkeypatch.setattr(service, 'delete_file', delete_then_reuse)
+
+    assert service.release_thesis_file(gcs_path, content_hash) is False
+    assert reused
+    assert service.object_exists(gcs_path)
+    assert not [key for key in stored_keys(service) if '.deleting-' in key]
+
+
+def test_ensure_thesis_file_rewrites_content_removed_after_commit(service, client_id):
+    data = docx_bytes('Tese')
+    upload = io.BytesIO(data)
+    gcs_path, content_hash = service.upload_thesis_file(upload)
+    add_thesis(client_id, gcs_path, content_hash)
+    service.delete_file(gcs_path)
+
+    assert service.ensure_thesis_file(gcs_path) is False
+    assert service.ensure_thesis_file(gcs_path, upload) is True
+    with service.download_stream(gcs_path) as stream:
+        assert stream.read() == data
+
+
+def test_find_thesis_blob_rejects_malformed_hash(service):
+    with pytest.raises(Exception, match='SHA-256'):
+        service.find_thesis_blob('../../etc/passwd')
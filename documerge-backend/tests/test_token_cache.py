@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+from firebase_admin import auth
+from src.services.token_verifier import LocalTokenVerifier, VerifiedTokenCache
+
+SECRET = 'segredo-do-cache-de-tokens-com-32-caracteres'
+
+
+class CountingVerifier(LocalTokenVerifier):
+    """Verificador local que conta as verificações e pode pausar no meio de uma"""
+
+    def __init__(self):
+        super().__init__(SECRET)
+        self.calls = 0
+        self.started = threading.Event()
+        self.resume = threading.Event()
+        self.resume.set()
+
+    def verify(self, token):
+        self.calls += 1
+        self.started.set()
+        self.resume.wait(5)
+        return super().verify(token)
+
+
+@pytest.fixture
+def verifier():
+    return CountingVerifier()
+
+
+def test_verified_claims_are_reused_until_invalidated(verifier):
+    cache = VerifiedTokenCache(verifier, skew=0)
+    token = verifier.issue('usuario-1')
+
+    assert cache.verify(token)['uid'] == 'usuario-1'
+    assert cache.verify(token)['uid'] == 'usuario-1'
+    assert (verifier.calls, cache.stats()['hits']) == (1, 1)
+
+    cache.invalidate_user('usuario-1')
+    cache.verify(token)
+    assert verifier.calls == 2
+
+
+def test_invalidation_during_verification_does_not_store_claims(verifier):
+    cache = VerifiedTokenCache(verifier, skew=0)
+    token = verifier.issue('usuario-1')
+    verifier.resume.clear()
+
+    thread = threading.Thread(target=cache.verify, args=(token,))
+    thread.start()
+    assert verifier.started.wait(5)
+    # Conta desativada enquanto o token ainda está sendo verificado
+    cache.invalidate_user('usuario-1')
+    verifier.resume.set()
+    thread.join(5)
+
+    assert cache.stats()['entries'] == 0
+    cache.verify(token)
+    assert verifier.calls == 2
+
+
+def test_entry_expires_with_the_token(verifier, monkeypatch):
+    cache = VerifiedTokenCache(verifier, skew=10)
+    token = verifier.issue('usuario-1', ttl=60)
+    now = time.time()
+
+    cache.verify(token)
+    # Ainda dentro da validade, descontada a margem
+    monkeypatch.setattr(time, 'time', lambda: now + 45)
+    cache.verify(token)
+    assert verifier.calls == 1
+
+    # Dentro da margem antes de exp: a entrada expira e o token é verificado de novo
+    monkeypatch.setattr(time, 'time', lambda: now + 55)
+    cache.verify(token)
+    assert verifier.calls == 2
+    assert cache.stats()['expired'] == 1
+
+    # Depois de exp o verificador rejeita o token, que não volta ao cache
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    with pytest.raises(auth.ExpiredIdTokenError):
+        cache.verify(token)
+
+
+def test_token_closer_to_exp_than_skew_is_not_cached(verifier):
+    cache = VerifiedTokenCache(verifier, skew=30)
+    token = verifier.issue('usuario-1', ttl=20)
+
+    cache.verify(token)
+    cache.verify(token)
+
+    assert verifier.calls == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_is_bounded(verifier):
+    cache = VerifiedTokenCache(verifier, max_entries=2, skew=0)
+    tokens = [verifier.issue(f'usuario-{index}') for index in range(3)]
+
+    for token in tokens:
+        cache.verify(token)
+    cache.verify(tokens[0])
+
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['evictions'] == 2
+    assert verifier.calls == 4
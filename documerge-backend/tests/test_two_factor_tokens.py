@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from src.services import two_factor_tokens
+from src.services.two_factor_tokens import TwoFactorSessionTokens
+
+SECRET = 'segredo-2fa-dos-testes-com-mais-de-32-caracteres'
+
+
+@pytest.fixture
+def tokens(app, monkeypatch):
+    # Revogações lidas do banco a cada verificação
+    monkeypatch.setattr(two_factor_tokens, 'TWO_FACTOR_REVOCATION_REFRESH', 0)
+    return TwoFactorSessionTokens(secret=SECRET)
+
+
+def test_issued_token_is_valid_for_its_user_only(tokens):
+    token, valid_until = tokens.issue(1)
+
+    assert tokens.verify(token, 1)
+    assert not tokens.verify(token, 2)
+    assert valid_until.timestamp() > time.time()
+
+
+def test_tampered_or_foreign_tokens_are_rejected(tokens):
+    token, _ = tokens.issue(1)
+    payload_part, signature_part = token.split('.')
+    other_payload, _ = tokens.issue(2)[0].split('.')
+
+    assert not tokens.verify(f"{other_payload}.{signature_part}", 2)
+    assert not tokens.verify(payload_part, 1)
+    assert not tokens.verify('lixo', 1)
+    assert not tokens.verify(None, 1)
+    assert not TwoFactorSessionTokens(secret='outro-' + SECRET).verify(token, 1)
+
+
+def test_expired_token_is_rejected(app):
+    tokens = TwoFactorSessionTokens(secret=SECRET, ttl=-1)
+    token, _ = tokens.issue(1)
+
+    assert not tokens.verify(token, 1)
+
+
+def test_revoked_session_is_rejected_by_other_processes(tokens):
+    token, _ = tokens.issue(1)
+    other_token, _ = tokens.issue(1)
+    other_process = TwoFactorSessionTokens(secret=SECRET)
+
+    assert tokens.revoke_session(token, 1)
+
+    assert not tokens.verify(token, 1)
+    assert not other_process.verify(token, 1)
+    assert other_process.verify(other_token, 1)
+
+
+def test_revoke_session_requires_the_owner(tokens):
+    token, _ = tokens.issue(1)
+
+    assert not tokens.revoke_session(token, 2)
+    assert tokens.verify(token, 1)
+
+
+def test_revoke_user_invalidates_sessions_issued_before(tokens):
+    old_token, _ = tokens.issue(1)
+    other_user_token, _ = tokens.issue(2)
+    time.sleep(0.01)
+
+    tokens.revoke_user(1)
+    time.sleep(0.01)
+    new_token, _ = tokens.issue(1)
+
+    assert not tokens.verify(old_token, 1)
+    assert tokens.verify(other_user_token, 2)
+    assert tokens.verify(new_token, 1)
+
+
+@pytest.mark.parametrize('secret', [None, '', 'curto'])
+def test_missing_or_short_secret_fails_closed(app, secret):
+    token, _ = TwoFactorSessionTokens(secret=SECRET).issue(1)
+    tokens = TwoFactorSessionTokens(secret=secret)
+    # A SECRET_KEY do Flask não é usada no lugar do segredo
+    app.config['SECRET_KEY'] = SECRET
+
+    assert not tokens.configured()
+    with pytest.raises(Exception, match='TWO_FACTOR_SESSION_SECRET'):
+        tokens.issue(1)
+    with pytest.raises(Exception, match='TWO_FACTOR_SESSION_SECRET'):
+        tokens.verify(token, 1)